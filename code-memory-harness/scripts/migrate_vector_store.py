@@ -0,0 +1,42 @@
+"""Rebuild an existing vector store under a different metric or index type.
+
+Run from the repository root:
+
+    python scripts/migrate_vector_store.py vector_store.index --dimension 1536 --metric cosine
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.core.vector_store import INDEX_TYPES, METRICS, SimpleVectorStore
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("index_path", help="path to the .index file")
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--metric", choices=sorted(METRICS), default=None)
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default=None)
+    parser.add_argument("--nlist", type=int, default=None)
+    args = parser.parse_args()
+
+    store = SimpleVectorStore(dimension=args.dimension, index_path=args.index_path)
+    if not store.load():
+        print(f"No vector store found at {args.index_path}")
+        return 1
+
+    before = store.metric
+    params = {"nlist": args.nlist} if args.nlist else {}
+    # The loaded store keeps its layout unless a new one is requested
+    store.rebuild(index_type=args.index_type, metric=args.metric, **params)
+    store.save()
+
+    print(f"Rebuilt {store.ntotal} vectors: metric {before} -> {store.metric}, index {store.index_type}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
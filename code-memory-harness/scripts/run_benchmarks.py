@@ -0,0 +1,112 @@
+"""Benchmark every indexing and retrieval stage on synthetic codebases, offline.
+
+Run from the repository root:
+
+    python scripts/run_benchmarks.py --files 1000 10000 --output bench.json
+    python scripts/run_benchmarks.py --files 1000 --baseline bench.json
+    python scripts/run_benchmarks.py --files 1000 --shared-workers 4
+    python scripts/run_benchmarks.py --files 1000 --quantization-vectors 100000
+    python scripts/run_benchmarks.py --files 1000 --segment-files 10000
+    python scripts/run_benchmarks.py --files 1000 --shard-vectors 200000
+    python scripts/run_benchmarks.py --files 1000 --legacy-check
+
+Generated codebases are kept in --workdir and reused by later runs.
+Token counts use tiktoken's cl100k_base, downloaded on first use; offline,
+point TIKTOKEN_CACHE_DIR at a directory holding a cached copy, or these runs
+(only) fall back to counting bytes, reported as the "tokenizer" environment
+field.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.core.tokenizer import allow_byte_fallback
+from src.validation.legacy_store_check import LegacyStoreCheck
+from src.validation.pipeline_benchmark import PipelineBenchmark
+from src.validation.quantization_benchmark import QuantizationBenchmark, clustered_vectors
+from src.validation.segment_benchmark import SegmentBenchmark
+from src.validation.shard_benchmark import ShardBenchmark
+from src.validation.shared_index_benchmark import SharedIndexBenchmark, build_store
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, nargs="+", default=[1000],
+                        help="codebase sizes in files, e.g. 1000 10000 100000")
+    parser.add_argument("--workdir", default=".benchmarks", help="where codebases and indexes are written")
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="JSON report from an earlier run to compare stage times against")
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--embed-batch-size", type=int, default=64)
+    parser.add_argument("--embed-latency", type=float, default=0.0,
+                        help="simulated seconds per embedding request")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--errors", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--shared-workers", type=int, default=0,
+                        help="also compare per-worker memory of this many processes serving one index")
+    parser.add_argument("--shared-vectors", type=int, default=100_000,
+                        help="size of the index served by --shared-workers")
+    parser.add_argument("--quantization-vectors", type=int, default=0,
+                        help="also compare float32/float16/int8 storage and re-ranking on this many vectors")
+    parser.add_argument("--segment-files", type=int, default=0,
+                        help="also time saves after single-file edits, whole-file vs segmented, at this many files")
+    parser.add_argument("--shard-vectors", type=int, default=0,
+                        help="also time sharded search by shard and thread count on this many vectors")
+    parser.add_argument("--legacy-check", action="store_true",
+                        help="also check that baseline-format L2 stores reload with identical results")
+    args = parser.parse_args()
+    allow_byte_fallback()
+
+    benchmark = PipelineBenchmark(
+        args.workdir,
+        dimension=args.dimension,
+        embed_batch_size=args.embed_batch_size,
+        embed_latency=args.embed_latency,
+        num_queries=args.queries,
+        num_errors=args.errors,
+        k=args.k,
+        seed=args.seed
+    )
+    report = benchmark.run(args.files)
+    if args.shared_workers:
+        index_path = str(Path(args.workdir) / f"shared_{args.shared_vectors}" / 'vector_store.index')
+        build_store(index_path, args.shared_vectors, args.dimension, seed=args.seed)
+        report['shared_index'] = SharedIndexBenchmark(args.shared_workers, seed=args.seed).run(index_path, args.dimension)
+    if args.quantization_vectors:
+        vectors = clustered_vectors(args.quantization_vectors, args.dimension, seed=args.seed)
+        report['quantization'] = QuantizationBenchmark(args.k, args.queries, args.seed).run(vectors)
+    if args.segment_files:
+        report['segments'] = SegmentBenchmark(args.segment_files, args.dimension, k=args.k, seed=args.seed).run()
+    if args.shard_vectors:
+        report['shards'] = ShardBenchmark(args.shard_vectors, args.dimension, num_queries=args.queries,
+                                          k=args.k, seed=args.seed).run()
+    if args.legacy_check:
+        report['legacy_store'] = LegacyStoreCheck(k=args.k, seed=args.seed).run()
+
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    print(PipelineBenchmark.format_report(report, baseline))
+    if 'shared_index' in report:
+        print(SharedIndexBenchmark.format_report(report['shared_index']))
+    if 'quantization' in report:
+        print(QuantizationBenchmark.format_report(report['quantization']))
+    if 'segments' in report:
+        print(SegmentBenchmark.format_report(report['segments']))
+    if 'shards' in report:
+        print(ShardBenchmark.format_report(report['shards']))
+    if 'legacy_store' in report:
+        print(LegacyStoreCheck.format_report(report['legacy_store']))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+        print(f"Wrote {args.output}")
+    return 0 if all(row['passed'] for row in report.get('legacy_store', [])) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.core.memory_engine import MemoryEngine
+from src.indexing.async_embedding_client import AsyncEmbeddingClient
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncMemoryEngine:
+    """Async facade over MemoryEngine for use on an event loop
+
+    Query embeddings go through an AsyncEmbeddingClient (bounded concurrency,
+    token-bucket rate limiting) and FAISS searches run on a dedicated thread
+    pool, so many retrievals can be in flight at once without blocking the
+    loop. Indexing runs in a worker thread and waits for in-flight searches;
+    searches started during indexing wait for it to finish.
+    """
+
+    def __init__(self,
+                 engine: MemoryEngine,
+                 max_concurrency: int = 4,
+                 requests_per_second: float = 10.0,
+                 search_workers: int = 4):
+        self.engine = engine
+        self.embedding_client = AsyncEmbeddingClient(
+            engine.embedding_generator,
+            max_concurrency=max_concurrency,
+            requests_per_second=requests_per_second
+        )
+        # FAISS releases the GIL while searching, so searches run in parallel
+        self._search_executor = ThreadPoolExecutor(max_workers=search_workers,
+                                                   thread_name_prefix="faiss-search")
+        self._searches = 0
+        self._writing = False
+        self._state: Optional[asyncio.Condition] = None
+
+    @classmethod
+    def create(cls, codebase_path: str, **engine_kwargs) -> "AsyncMemoryEngine":
+        """Build the underlying MemoryEngine with the given arguments"""
+        return cls(MemoryEngine(codebase_path, **engine_kwargs))
+
+    @property
+    def vector_store(self):
+        return self.engine.vector_store
+
+    @property
+    def context_compressor(self):
+        return self.engine.context_compressor
+
+    def _condition(self) -> asyncio.Condition:
+        # Created lazily so it binds to the running loop
+        if self._state is None:
+            self._state = asyncio.Condition()
+        return self._state
+
+    @asynccontextmanager
+    async def _reading(self):
+        state = self._condition()
+        async with state:
+            await state.wait_for(lambda: not self._writing)
+            self._searches += 1
+        try:
+            yield
+        finally:
+            async with state:
+                self._searches -= 1
+                state.notify_all()
+
+    @asynccontextmanager
+    async def _exclusive(self):
+        state = self._condition()
+        async with state:
+            await state.wait_for(lambda: not self._writing and self._searches == 0)
+            self._writing = True
+        try:
+            yield
+        finally:
+            async with state:
+                self._writing = False
+                state.notify_all()
+
+    async def index_codebase(self, **kwargs) -> int:
+        """Run MemoryEngine.index_codebase in a worker thread"""
+        async with self._exclusive():
+            return await asyncio.to_thread(partial(self.engine.index_codebase, **kwargs))
+
+    async def update_index(self, file_extensions: Optional[List[str]] = None) -> Dict[str, int]:
+        """Run MemoryEngine.update_index in a worker thread"""
+        async with self._exclusive():
+            return await asyncio.to_thread(self.engine.update_index, file_extensions)
+
+    async def retrieve(self,
+                       query: str,
+                       k: int = 5,
+                       file_filter: Optional[List[str]] = None,
+                       min_similarity: float = 0.3,
+                       languages: Optional[List[str]] = None,
+                       chunk_types: Optional[List[str]] = None) -> List[Dict]:
+        """Retrieve relevant code chunks for a query"""
+        results = await self.retrieve_many([query], k, file_filter, min_similarity, languages, chunk_types)
+        return results[0]
+
+    async def retrieve_many(self,
+                            queries: List[str],
+                            k: int = 5,
+                            file_filter: Optional[List[str]] = None,
+                            min_similarity: float = 0.3,
+                            languages: Optional[List[str]] = None,
+                            chunk_types: Optional[List[str]] = None) -> List[List[Dict]]:
+        """Retrieve relevant code chunks for many queries with one search call"""
+        if not queries:
+            return []
+
+        query_embeddings = await self._embed_queries(queries)
+
+        search = partial(self.engine._search_and_filter, query_embeddings, k, min_similarity,
+                         file_filter, languages, chunk_types)
+        async with self._reading():
+            return await asyncio.get_running_loop().run_in_executor(self._search_executor, search)
+
+    async def _embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed queries as a matrix, sharing the engine's query embedding cache"""
+        cache = self.engine.query_embedding_cache
+        embeddings = {query: cache.get(query) for query in dict.fromkeys(queries)}
+        missing = [query for query, embedding in embeddings.items() if embedding is None]
+
+        if missing:
+            for query, embedding in zip(missing, await self.embedding_client.generate_embeddings_batch(
+                    missing, persist=False)):
+                cache.put(query, embedding)
+                embeddings[query] = embedding
+
+        return np.stack([embeddings[query] for query in queries])
+
+    async def get_context_for_error(self,
+                                    error: Dict,
+                                    max_tokens: int = 3000,
+                                    k: int = 10,
+                                    file_filter: Optional[List[str]] = None,
+                                    languages: Optional[List[str]] = None,
+                                    chunk_types: Optional[List[str]] = None) -> str:
+        """Get relevant context for an error"""
+        contexts = await self.get_context_for_errors([error], max_tokens, k, file_filter, languages, chunk_types)
+        return contexts[0]
+
+    async def get_context_for_errors(self,
+                                     errors: List[Dict],
+                                     max_tokens: int = 3000,
+                                     k: int = 10,
+                                     file_filter: Optional[List[str]] = None,
+                                     languages: Optional[List[str]] = None,
+                                     chunk_types: Optional[List[str]] = None) -> List[str]:
+        """Get relevant context for a burst of errors with one batched retrieval
+
+        Shares the engine's context cache, so hot errors skip embedding,
+        search and compression until the index changes.
+        """
+        engine = self.engine
+        generation = engine.vector_store.generation
+        keys, contexts, missing = engine._cached_contexts(errors, max_tokens, k, file_filter, languages, chunk_types)
+
+        if missing:
+            all_chunks = await self.retrieve_many([key[0] for key in missing], k=k, file_filter=file_filter,
+                                                  languages=languages, chunk_types=chunk_types)
+            engine._fill_contexts(errors, keys, contexts, dict(zip(missing, all_chunks)), max_tokens, generation)
+
+        return contexts
+
+    def close(self):
+        """Shut down the search thread pool"""
+        self._search_executor.shutdown(wait=True)
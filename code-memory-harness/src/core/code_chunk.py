@@ -0,0 +1,24 @@
+import hashlib
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+@dataclass
+class CodeChunk:
+    """Represents a chunk of code with metadata"""
+    content: str
+    file_path: str
+    start_line: int
+    end_line: int
+    chunk_type: str  # 'function', 'class', 'module', 'block'
+    language: str
+    embedding: Optional[np.ndarray] = None
+    chunk_id: Optional[str] = None
+    name: Optional[str] = None  # qualified name of the class or function, if any
+    
+    def __post_init__(self):
+        if not self.chunk_id:
+            # Generate unique ID based on content and location
+            unique_str = f"{self.file_path}:{self.start_line}:{self.end_line}:{self.content[:50]}"
+            self.chunk_id = hashlib.md5(unique_str.encode()).hexdigest()
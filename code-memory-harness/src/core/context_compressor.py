@@ -1,67 +1,210 @@
-from typing import List, Dict
-import tiktoken
+import re
+from typing import List, Dict, Optional, Tuple
+
+import numpy as np
+
+from src.core.query_cache import TTLCache
+from src.core.tokenizer import get_encoding
+
+# 'head' keeps the first lines of a chunk that does not fit; 'relevant' keeps
+# its signature, docstring and the lines around the error and elides the rest
+COMPRESSION_MODES = ('head', 'relevant')
+
+# Leading lines that belong to a definition's header
+_DECORATOR = re.compile(r'\s*@')
+_SIGNATURE_END = re.compile(r'(:|\{|=>)\s*(#.*|//.*)?$')
+_COMMENT = re.compile(r'\s*(#|//|/\*|\*)')
+_DOCSTRING_QUOTES = ('"""', "'''")
 
 class ContextCompressor:
     """Compress retrieved chunks to fit within token limits"""
-    
-    def __init__(self, model: str = "gpt-4"):
-        self.encoding = tiktoken.encoding_for_model(model)
-        
+
+    def __init__(self, model: str = "gpt-4", mode: str = "head", focus_lines: int = 5, cache_size: int = 4096):
+        if mode not in COMPRESSION_MODES:
+            raise ValueError(f"Unknown compression mode: {mode}")
+        self.model = model
+        self.mode = mode
+        # Lines kept on each side of the error line in 'relevant' mode
+        self.focus_lines = focus_lines
+        # chunk -> (content tokens, token index where each line starts); each
+        # chunk is encoded once no matter how often it is retrieved
+        self._token_cache = TTLCache(cache_size, ttl=None)
+        self._fence_token_count: Optional[int] = None
+
+    @property
+    def encoding(self):
+        # Loaded on first compression rather than when the engine is built
+        return get_encoding(self.model)
+
+    @property
+    def _fence_tokens(self) -> int:
+        if self._fence_token_count is None:
+            self._fence_token_count = self.count_tokens("\n```\n") + self.count_tokens("\n```")
+        return self._fence_token_count
+
     def count_tokens(self, text: str) -> int:
         """Count tokens in text"""
-        return len(self.encoding.encode(text))
-    
-    def compress_chunks(self, chunks: List[Dict], max_tokens: int = 3000) -> str:
-        """Compress chunks to fit within token limit while preserving information"""
-        
+        return len(self.encoding.encode_ordinary(text))
+
+    def compress_chunks(self,
+                        chunks: List[Dict],
+                        max_tokens: int = 3000,
+                        error_file: Optional[str] = None,
+                        error_line: Optional[int] = None) -> str:
+        """Compress chunks to fit within token limit while preserving information
+
+        error_file/error_line locate the failing line; in 'relevant' mode the
+        lines around it are kept when its chunk has to be compressed.
+        """
+
         # Sort chunks by relevance
         chunks_sorted = sorted(chunks, key=lambda x: x['similarity'], reverse=True)
-        
+
         compressed_context = []
         total_tokens = 0
-        
+
         for chunk in chunks_sorted:
             # Format chunk with metadata
-            chunk_text = self._format_chunk(chunk)
-            chunk_tokens = self.count_tokens(chunk_text)
-            
+            header = self._header(chunk)
+            header_tokens = self.count_tokens(header)
+            tokens, _ = self._content_tokens(chunk)
+            chunk_tokens = header_tokens + len(tokens) + self._fence_tokens
+
             # Check if adding this chunk would exceed limit
             if total_tokens + chunk_tokens > max_tokens:
                 # Try to add a compressed version
-                compressed_chunk = self._compress_single_chunk(chunk, max_tokens - total_tokens)
+                compressed_chunk = self._compress_single_chunk(chunk, max_tokens - total_tokens,
+                                                               error_file, error_line)
                 if compressed_chunk:
                     compressed_context.append(compressed_chunk)
                     total_tokens += self.count_tokens(compressed_chunk)
-                break
+                if self.mode == 'head':
+                    break
             else:
-                compressed_context.append(chunk_text)
+                compressed_context.append(f"{header}\n```\n{chunk['content']}\n```")
                 total_tokens += chunk_tokens
-        
+
         return "\n\n---\n\n".join(compressed_context)
-    
+
+    def _header(self, chunk: Dict, suffix: str = "") -> str:
+        return f"File: {chunk['file_path']} (lines {chunk['start_line']}-{chunk['end_line']}){suffix}"
+
     def _format_chunk(self, chunk: Dict) -> str:
         """Format a chunk with metadata"""
-        header = f"File: {chunk['file_path']} (lines {chunk['start_line']}-{chunk['end_line']})"
-        return f"{header}\n```\n{chunk['content']}\n```"
-    
-    def _compress_single_chunk(self, chunk: Dict, available_tokens: int) -> str:
+        return f"{self._header(chunk)}\n```\n{chunk['content']}\n```"
+
+    def _content_tokens(self, chunk: Dict) -> Tuple[np.ndarray, np.ndarray]:
+        """Token ids of a chunk's content and the token index at which each line starts"""
+        content = chunk['content']
+        key = (chunk.get('chunk_id'), hash(content))
+        cached = self._token_cache.get(key)
+        if cached is None:
+            tokens = self.encoding.encode_ordinary(content)
+            _, offsets = self.encoding.decode_with_offsets(tokens)
+            line_starts = [0] + [match.end() for match in re.finditer('\n', content)]
+            # A token spanning a newline belongs to the line it starts on
+            line_bounds = np.searchsorted(np.asarray(offsets, dtype=np.int64), line_starts)
+            cached = (np.asarray(tokens, dtype=np.int64), np.append(line_bounds, len(tokens)))
+            self._token_cache.put(key, cached)
+        return cached
+
+    def _compress_single_chunk(self,
+                               chunk: Dict,
+                               available_tokens: int,
+                               error_file: Optional[str] = None,
+                               error_line: Optional[int] = None) -> Optional[str]:
         """Compress a single chunk to fit within available tokens"""
-        
-        # Simple compression: take first N lines that fit
+        header = self._header(chunk, " [TRUNCATED]")
+        budget = available_tokens - self.count_tokens(header) - self._fence_tokens
+        if budget <= 0:
+            return None
+
+        tokens, line_bounds = self._content_tokens(chunk)
+
+        if self.mode == 'relevant':
+            body = self._relevant_lines(chunk, line_bounds, budget, error_file, error_line)
+        else:
+            # Simple compression: take first N lines that fit, sliced from the encoded content
+            lines_kept = int(np.searchsorted(line_bounds[1:], budget, side='right'))
+            body = self.encoding.decode(tokens[:line_bounds[lines_kept]].tolist()).rstrip()
+
+        if body.strip():
+            return f"{header}\n```\n{body}\n```"
+
+        return None
+
+    def _relevant_lines(self,
+                        chunk: Dict,
+                        line_bounds: np.ndarray,
+                        budget: int,
+                        error_file: Optional[str],
+                        error_line: Optional[int]) -> str:
+        """Signature, docstring and lines around the error line, with elided runs marked"""
         lines = chunk['content'].split('\n')
-        compressed_lines = []
-        
-        header = f"File: {chunk['file_path']} (lines {chunk['start_line']}-{chunk['end_line']}) [TRUNCATED]"
-        current_tokens = self.count_tokens(header) + 10  # Buffer for formatting
-        
-        for line in lines:
-            line_tokens = self.count_tokens(line)
-            if current_tokens + line_tokens > available_tokens:
+        line_tokens = np.diff(line_bounds)[:len(lines)] + 1
+
+        # Priority order: header first, then the error neighbourhood outward
+        ordered = self._header_lines(lines)
+        if error_line is not None and (error_file is None or error_file in chunk['file_path']):
+            focus = error_line - chunk['start_line']
+            if 0 <= focus < len(lines):
+                for distance in range(self.focus_lines + 1):
+                    ordered.extend(line for line in (focus - distance, focus + distance) if 0 <= line < len(lines))
+
+        kept = set()
+        used = 0
+        for line in ordered:
+            if line in kept:
+                continue
+            # Reserve room for an elision marker after the line
+            cost = int(line_tokens[line]) + 8
+            if used + cost > budget:
                 break
-            compressed_lines.append(line)
-            current_tokens += line_tokens
-        
-        if compressed_lines:
-            return f"{header}\n```\n{chr(10).join(compressed_lines)}\n```"
-        
-        return None
+            kept.add(line)
+            used += cost
+
+        output = []
+        elided = 0
+        for i, line in enumerate(lines):
+            if i in kept:
+                if elided:
+                    output.append(self._elision(lines[i - elided], elided))
+                    elided = 0
+                output.append(line)
+            else:
+                elided += 1
+        if elided and output:
+            output.append(self._elision(lines[len(lines) - elided], elided))
+        return '\n'.join(output)
+
+    @staticmethod
+    def _elision(first_line: str, count: int) -> str:
+        indent = first_line[:len(first_line) - len(first_line.lstrip())]
+        return f"{indent}... ({count} lines elided)"
+
+    @staticmethod
+    def _header_lines(lines: List[str]) -> List[int]:
+        """Indices of leading comments, decorators, the signature and a docstring"""
+        header = []
+        i = 0
+        # Leading comments and decorators
+        while i < len(lines) and (not lines[i].strip() or _COMMENT.match(lines[i]) or _DECORATOR.match(lines[i])):
+            header.append(i)
+            i += 1
+        # Signature, possibly wrapped over several lines
+        while i < len(lines) and len(header) < 12:
+            header.append(i)
+            i += 1
+            if _SIGNATURE_END.search(lines[i - 1].rstrip()):
+                break
+        # Docstring right after the signature
+        if i < len(lines) and lines[i].strip().startswith(_DOCSTRING_QUOTES):
+            quote = lines[i].strip()[:3]
+            closed = lines[i].strip().count(quote) >= 2
+            header.append(i)
+            i += 1
+            while not closed and i < len(lines):
+                header.append(i)
+                closed = quote in lines[i]
+                i += 1
+        return header
@@ -0,0 +1,132 @@
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+
+from src.core.metadata_store import find_rows, live_mask
+from src.core.versioned_dir import commit_version, current_version
+
+# Rows copied per step when a save merges saved and added vectors
+_SAVE_BLOCK = 65536
+
+
+class ExactVectors:
+    """Full-precision copies of indexed vectors, used to re-rank lossy search results
+
+    Saved vectors live in a float32 side file sorted by vector id and are
+    memory-mapped on load, so re-ranking reads only the candidates' rows.
+    Like ChunkMetadataStore, vectors added since the last save are kept in
+    memory and removed saved rows are masked until save() merges them.
+    """
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._vectors = np.zeros((0, dimension), dtype=np.float32)
+        # Vectors added since the last save, keyed by vector id
+        self._added: Dict[int, np.ndarray] = {}
+        # Saved vector ids removed or replaced since the last save
+        self._deleted: set = set()
+
+    def __len__(self) -> int:
+        return len(self._ids) - len(self._deleted) + len(self._added)
+
+    def add(self, ids: np.ndarray, vectors: np.ndarray):
+        _, saved = find_rows(self._ids, ids)
+        self._deleted.update(ids[saved].tolist())
+        for idx, vector in zip(ids.tolist(), vectors):
+            self._added[idx] = np.array(vector, dtype=np.float32)
+
+    def remove(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        for idx in ids.tolist():
+            self._added.pop(idx, None)
+        _, saved = find_rows(self._ids, ids)
+        self._deleted.update(ids[saved].tolist())
+
+    def get(self, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(vectors, found) for a 1-d id array; rows of unknown ids are zero"""
+        vectors = np.zeros((len(ids), self.dimension), dtype=np.float32)
+        rows, found = find_rows(self._ids, ids, self._deleted)
+        if found.any():
+            vectors[found] = self._vectors[rows[found]]
+        if self._added:
+            for position, idx in enumerate(ids.tolist()):
+                vector = self._added.get(idx)
+                if vector is not None:
+                    vectors[position] = vector
+                    found[position] = True
+        return vectors, found
+
+    def rerank(self,
+               queries: np.ndarray,
+               distances: np.ndarray,
+               ids: np.ndarray,
+               metric: str,
+               block: int = 64) -> Tuple[np.ndarray, np.ndarray]:
+        """Re-score FAISS candidates exactly and re-sort each row
+
+        distances/ids are (n_queries, n_candidates) search results; the
+        returned distances are exact inner products ('cosine') or squared
+        L2 distances, best first. Candidates without a stored vector keep
+        their approximate distance, and empty slots (-1) stay last.
+        """
+        distances = distances.copy()
+        for start in range(0, len(queries), block):
+            rows = slice(start, start + block)
+            vectors, found = self.get(ids[rows].reshape(-1))
+            vectors = vectors.reshape(ids[rows].shape + (self.dimension,))
+            found = found.reshape(ids[rows].shape)
+            if metric == 'cosine':
+                exact = np.einsum('qcd,qd->qc', vectors, queries[rows])
+            else:
+                exact = np.square(vectors - queries[rows, np.newaxis, :]).sum(axis=2)
+            distances[rows] = np.where(found, exact, distances[rows])
+
+        worst = -np.inf if metric == 'cosine' else np.inf
+        distances[ids == -1] = worst
+        order = np.argsort(-distances if metric == 'cosine' else distances, axis=1, kind='stable')
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+    def save(self, directory: str):
+        """Write all live vectors sorted by id, committing a new version of directory atomically"""
+        self.load(str(commit_version(directory, self.write)))
+
+    def write(self, directory):
+        """Write all live vectors sorted by id into an empty directory, without committing it"""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        saved_rows = np.flatnonzero(live_mask(self._ids, self._deleted))
+        added_ids = np.fromiter(self._added.keys(), dtype=np.int64, count=len(self._added))
+        added_vectors = (np.stack(list(self._added.values())) if self._added
+                         else np.zeros((0, self.dimension), dtype=np.float32))
+
+        ids = np.concatenate([self._ids[saved_rows], added_ids])
+        order = np.argsort(ids, kind='stable')
+        np.save(directory / 'ids.npy', ids[order])
+        if len(ids) == 0:
+            np.save(directory / 'vectors.npy', added_vectors)
+            return
+        # Streamed in blocks so a save never holds every vector in memory twice
+        out = np.lib.format.open_memmap(directory / 'vectors.npy', mode='w+', dtype=np.float32,
+                                        shape=(len(ids), self.dimension))
+        for start in range(0, len(order), _SAVE_BLOCK):
+            sources = order[start:start + _SAVE_BLOCK]
+            from_saved = sources < len(saved_rows)
+            block = np.empty((len(sources), self.dimension), dtype=np.float32)
+            block[from_saved] = self._vectors[saved_rows[sources[from_saved]]]
+            block[~from_saved] = added_vectors[sources[~from_saved] - len(saved_rows)]
+            out[start:start + len(sources)] = block
+        out.flush()
+        del out
+
+    def load(self, directory: str):
+        """Memory-map a side file committed by save() or filled by write()"""
+        directory = current_version(directory) or Path(directory)
+        self._ids = np.load(directory / 'ids.npy', mmap_mode='r')
+        # An empty array cannot be memory-mapped
+        self._vectors = (np.load(directory / 'vectors.npy', mmap_mode='r') if len(self._ids)
+                         else np.zeros((0, self.dimension), dtype=np.float32))
+        self._added = {}
+        self._deleted = set()
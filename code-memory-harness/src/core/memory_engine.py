@@ -1,13 +1,22 @@
 from pathlib import Path
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Iterator, Optional, Tuple, Union
 import json
 import logging
+import numpy as np
 from datetime import datetime
 
+from src.core.segmented_store import SegmentedVectorStore
+from src.core.sharded_store import ShardedVectorStore
 from src.core.vector_store import SimpleVectorStore, CodeChunk
 from src.indexing.code_parser import CodeParser
+from src.indexing.embedding_cache import EmbeddingCache
 from src.indexing.embedding_generator import EmbeddingGenerator
+from src.indexing.file_walker import FileWalker
+from src.indexing.incremental_indexer import IncrementalIndexer
+from src.indexing.indexing_pipeline import IndexingPipeline, IndexingStats
 from src.core.context_compressor import ContextCompressor
+from src.core.query_cache import TTLCache
+from src.monitoring.metrics import metrics
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -19,113 +28,310 @@ class MemoryEngine:
                  codebase_path: str,
                  vector_store_path: Optional[str] = None,
                  embedding_provider: str = "openai",
-                 api_key: Optional[str] = None):
+                 api_key: Optional[str] = None,
+                 embedding_cache_path: Optional[str] = None,
+                 metric: str = "cosine",
+                 chunk_mode: str = "overlapping",
+                 max_chunk_tokens: Optional[int] = None,
+                 query_cache_size: int = 4096,
+                 context_cache_size: int = 512,
+                 cache_ttl: Optional[float] = 600.0,
+                 compression_mode: str = "head",
+                 embedding_generator: Optional[EmbeddingGenerator] = None,
+                 enable_metrics: bool = False,
+                 use_git_ls_files: bool = False,
+                 max_file_bytes: Optional[int] = 1_000_000,
+                 read_only: bool = False,
+                 segmented: bool = False,
+                 vector_store: Optional[Union[SimpleVectorStore, SegmentedVectorStore, ShardedVectorStore]] = None):
         
         self.codebase_path = Path(codebase_path)
-        self.vector_store = SimpleVectorStore(
-            dimension=1536 if embedding_provider == "openai" else 768,
-            index_path=vector_store_path
+        # File discovery: see FileWalker
+        self.use_git_ls_files = use_git_ls_files
+        self.max_file_bytes = max_file_bytes
+        # Stage timers and counters go to the process-wide registry; see collect_metrics()
+        if enable_metrics:
+            metrics.enable()
+        # A pre-built generator (e.g. FakeEmbeddingGenerator for offline
+        # benchmarks) replaces the provider settings and sets the dimension
+        if embedding_generator is not None:
+            dimension = embedding_generator.dimension
+        else:
+            dimension = 1536 if embedding_provider == "openai" else 768
+        # metric applies to fresh indexes only: saved stores, including
+        # baseline IndexFlatL2 pickles, keep the metric they were built with
+        # (see LegacyStoreCheck); migrate them with
+        # SimpleVectorStore.rebuild(metric="cosine"). read_only engines
+        # (e.g. one per serving worker) memory-map the saved index so the
+        # processes share its pages and cannot index or update it. segmented
+        # stores commit each update as a small new segment instead of
+        # rewriting the whole index. A pre-built store (e.g. a
+        # ShardedVectorStore) replaces all of these settings
+        store_class = SegmentedVectorStore if segmented else SimpleVectorStore
+        self.vector_store = vector_store or store_class(
+            dimension=dimension,
+            index_path=vector_store_path,
+            metric=metric,
+            mmap=read_only
         )
         
-        self.parser = CodeParser()
-        self.embedding_generator = EmbeddingGenerator(
+        # "minimal" embeds each source line once instead of two to four times
+        self.parser = CodeParser(chunk_mode=chunk_mode, max_tokens=max_chunk_tokens)
+        # Embeddings are cached next to the index unless a path is given.
+        # read_only engines open an existing cache read-only and never write
+        # to it, so workers sharing an index do not contend for its lock
+        cache_path = embedding_cache_path or self.vector_store.index_path.replace('.index', '_embeddings.sqlite')
+        cache = None
+        if read_only:
+            if Path(cache_path).exists():
+                cache = EmbeddingCache(cache_path, read_only=True)
+            cache_path = None
+        self.embedding_generator = embedding_generator or EmbeddingGenerator(
             provider=embedding_provider,
-            api_key=api_key
+            api_key=api_key,
+            cache=cache,
+            cache_path=cache_path
         )
-        self.context_compressor = ContextCompressor()
+        # "relevant" keeps signatures, docstrings and the lines around the
+        # error instead of the first lines of an oversized chunk
+        self.context_compressor = ContextCompressor(mode=compression_mode)
+        # Repeated errors skip re-embedding (query text -> embedding) and,
+        # until the index changes, re-searching and re-compressing
+        # ((query, k, filters, max_tokens) -> context, keyed to the store generation)
+        self.query_embedding_cache = TTLCache(query_cache_size, cache_ttl)
+        self.context_cache = TTLCache(context_cache_size, cache_ttl)
+        self.last_indexing_stats: Optional[IndexingStats] = None
         
         # Try to load existing index
         if self.vector_store.load():
             logger.info("Loaded existing vector store")
         
-    def index_codebase(self, file_extensions: Optional[List[str]] = None):
-        """Index the entire codebase"""
+        self.incremental_indexer = IncrementalIndexer(
+            self.parser,
+            self.embedding_generator,
+            self.vector_store
+        )
+        
+    def index_codebase(self,
+                       file_extensions: Optional[List[str]] = None,
+                       parse_workers: Optional[int] = None,
+                       embed_workers: int = 1,
+                       embed_batch_size: int = 64,
+                       queue_size: int = 8,
+                       dedupe_content: bool = False):
+        """Index the entire codebase
+
+        Parsing, embedding and insertion run as overlapping pipeline stages;
+        see IndexingPipeline for the worker and backpressure knobs.
+        """
         if file_extensions is None:
             file_extensions = ['.py', '.js', '.ts', '.java', '.go', '.rs', '.c', '.cpp']
         
-        all_chunks = []
-        files_processed = 0
-        
-        # Walk through codebase
-        for file_path in self.codebase_path.rglob('*'):
-            # Skip common non-code directories
-            if any(part in file_path.parts for part in ['.git', '__pycache__', 'node_modules', '.env']):
-                continue
-                
-            if file_path.is_file() and file_path.suffix in file_extensions:
-                logger.info(f"Processing {file_path}")
-                
-                # Parse file into chunks
-                chunks = self.parser.parse_file(str(file_path))
-                
-                if chunks:
-                    all_chunks.extend(chunks)
-                    files_processed += 1
-        
-        logger.info(f"Parsed {len(all_chunks)} chunks from {files_processed} files")
-        
-        # Generate embeddings in batches
-        logger.info("Generating embeddings...")
-        chunk_texts = [chunk.content for chunk in all_chunks]
-        embeddings = self.embedding_generator.generate_embeddings_batch(chunk_texts)
-        
-        # Assign embeddings to chunks
-        for chunk, embedding in zip(all_chunks, embeddings):
-            chunk.embedding = embedding
-        
-        # Add to vector store
-        self.vector_store.add_chunks(all_chunks)
-        
-        # Save index
+        # A full index is a rebuild; use update_index() for changed files only
+        self.vector_store.reset()
+        
+        pipeline = IndexingPipeline(
+            self.parser,
+            self.embedding_generator,
+            self.vector_store,
+            parse_workers=parse_workers,
+            embed_workers=embed_workers,
+            embed_batch_size=embed_batch_size,
+            queue_size=queue_size,
+            dedupe_content=dedupe_content
+        )
+        indexed_files = []
+        
+        def track(file_paths):
+            for file_path in file_paths:
+                indexed_files.append(file_path)
+                yield file_path
+        
+        stats = pipeline.run(track(self._iter_source_files(file_extensions)))
+        self.last_indexing_stats = stats
+        
+        # Save index and fingerprint the files for later incremental updates
         self.vector_store.save()
-        logger.info(f"Indexed {len(all_chunks)} chunks successfully")
+        self.incremental_indexer.mark_indexed(indexed_files, pipeline.fingerprints)
+        self._flush_embedding_cache()
+        logger.info(
+            f"Indexed {stats.chunks} chunks from {stats.files} files in {stats.seconds:.2f}s "
+            f"({stats.files_per_second:.1f} files/s, {stats.chunks_per_second:.1f} chunks/s)"
+        )
         
-        return len(all_chunks)
+        return stats.chunks
+    
+    def _iter_source_files(self, file_extensions: List[str]) -> Iterator[str]:
+        """Lazily yield indexable files so parsing overlaps the walk
+
+        Ignored, vendored and build directories are pruned before they are
+        entered and .gitignore files are honored.
+        """
+        return FileWalker(
+            self.codebase_path,
+            file_extensions,
+            use_git=self.use_git_ls_files,
+            max_file_bytes=self.max_file_bytes
+        ).walk()
     
     def retrieve(self, 
                 query: str, 
                 k: int = 5,
                 file_filter: Optional[List[str]] = None,
-                min_similarity: float = 0.3) -> List[Dict]:
-        """Retrieve relevant code chunks for a query"""
-        
-        # Generate query embedding
-        query_embedding = self.embedding_generator.generate_embedding(query)
-        
-        # Search vector store
-        results = self.vector_store.search(query_embedding, k=k*2)  # Get more results for filtering
-        
-        # Filter results
-        filtered_results = []
-        for chunk, similarity in results:
-            # Apply similarity threshold
-            if similarity < min_similarity:
-                continue
-                
-            # Apply file filter if specified
-            if file_filter and not any(f in chunk.file_path for f in file_filter):
-                continue
-                
-            filtered_results.append({
-                'content': chunk.content,
-                'file_path': chunk.file_path,
-                'start_line': chunk.start_line,
-                'end_line': chunk.end_line,
-                'chunk_type': chunk.chunk_type,
-                'similarity': similarity
-            })
-            
-            if len(filtered_results) >= k:
-                break
+                min_similarity: float = 0.3,
+                languages: Optional[List[str]] = None,
+                chunk_types: Optional[List[str]] = None) -> List[Dict]:
+        """Retrieve relevant code chunks for a query
+
+        file_filter, languages and chunk_types restrict the search to matching
+        chunks before ranking, so filtered queries still return up to k hits.
+        """
+        
+        return self._search_and_filter(self._embed_queries([query]), k, min_similarity,
+                                       file_filter, languages, chunk_types)[0]
+    
+    def retrieve_many(self,
+                      queries: List[str],
+                      k: int = 5,
+                      file_filter: Optional[List[str]] = None,
+                      min_similarity: float = 0.3,
+                      languages: Optional[List[str]] = None,
+                      chunk_types: Optional[List[str]] = None) -> List[List[Dict]]:
+        """Retrieve relevant code chunks for many queries at once
+
+        All queries are embedded with one batch call and searched with one
+        matrix search; results are returned in query order.
+        """
+        if not queries:
+            return []
+        
+        return self._search_and_filter(self._embed_queries(queries), k, min_similarity,
+                                       file_filter, languages, chunk_types)
+    
+    def _embed_queries(self, queries: List[str]) -> np.ndarray:
+        """Embed queries as a matrix, reusing cached query embeddings
+
+        Query embeddings are kept in memory only, so retrieval never writes
+        to the persistent embedding cache.
+        """
+        embeddings = {query: self.query_embedding_cache.get(query) for query in dict.fromkeys(queries)}
+        missing = [query for query, embedding in embeddings.items() if embedding is None]
+        
+        if missing:
+            for query, embedding in zip(missing, self.embedding_generator.generate_embeddings_batch(
+                    missing, persist=False)):
+                self.query_embedding_cache.put(query, embedding)
+                embeddings[query] = embedding
+        
+        return np.stack([embeddings[query] for query in queries])
+    
+    def _search_and_filter(self,
+                           query_embeddings: np.ndarray,
+                           k: int,
+                           min_similarity: float,
+                           file_filter: Optional[List[str]] = None,
+                           languages: Optional[List[str]] = None,
+                           chunk_types: Optional[List[str]] = None) -> List[List[Dict]]:
+        """Search a matrix of query embeddings and filter the hits of every row"""
+        
+        # Search vector store. Metadata filters are applied inside the search
+        # and results come back in similarity order, so k candidates suffice
+        with metrics.timer('search_seconds'):
+            similarities, ids = self.vector_store.search_batch(
+                query_embeddings, k, file_filter=file_filter, languages=languages, chunk_types=chunk_types
+            )
         
-        return filtered_results
+        # Threshold the whole result matrix at once
+        keep = (ids != -1) & (similarities >= min_similarity)
+        
+        results = []
+        for row_ids, row_similarities, row_keep in zip(ids, similarities, keep):
+            filtered_results = []
+            for idx, similarity in zip(row_ids[row_keep].tolist(), row_similarities[row_keep].tolist()):
+                chunk = self.vector_store.get_chunk(idx)
+                filtered_results.append({
+                    'chunk_id': chunk.chunk_id,
+                    'content': chunk.content,
+                    'file_path': chunk.file_path,
+                    'start_line': chunk.start_line,
+                    'end_line': chunk.end_line,
+                    'chunk_type': chunk.chunk_type,
+                    'name': chunk.name,
+                    'similarity': similarity
+                })
+            results.append(filtered_results)
+        
+        return results
     
     def get_context_for_error(self, 
                              error: Dict,
-                             max_tokens: int = 3000) -> str:
+                             max_tokens: int = 3000,
+                             k: int = 10,
+                             file_filter: Optional[List[str]] = None,
+                             languages: Optional[List[str]] = None,
+                             chunk_types: Optional[List[str]] = None) -> str:
         """Get relevant context for an error"""
+        return self.get_context_for_errors([error], max_tokens, k, file_filter, languages, chunk_types)[0]
+    
+    def get_context_for_errors(self,
+                               errors: List[Dict],
+                               max_tokens: int = 3000,
+                               k: int = 10,
+                               file_filter: Optional[List[str]] = None,
+                               languages: Optional[List[str]] = None,
+                               chunk_types: Optional[List[str]] = None) -> List[str]:
+        """Get relevant context for a burst of errors with one batched retrieval
+
+        Contexts already built for the same query and options are served
+        from the context cache while the vector store is unchanged.
+        """
+        generation = self.vector_store.generation
+        keys, contexts, missing = self._cached_contexts(errors, max_tokens, k, file_filter, languages, chunk_types)
+        
+        if missing:
+            all_chunks = self.retrieve_many([key[0] for key in missing], k=k, file_filter=file_filter,
+                                            languages=languages, chunk_types=chunk_types)
+            self._fill_contexts(errors, keys, contexts, dict(zip(missing, all_chunks)), max_tokens, generation)
         
-        # Build query from error information
+        return contexts
+    
+    def _cached_contexts(self,
+                         errors: List[Dict],
+                         max_tokens: int,
+                         k: int,
+                         file_filter: Optional[List[str]],
+                         languages: Optional[List[str]],
+                         chunk_types: Optional[List[str]]) -> Tuple[List[Tuple], List[Optional[str]], List[Tuple]]:
+        """Cache keys and cached contexts (None on a miss) per error, plus the distinct missing keys"""
+        filters = (tuple(file_filter or ()), tuple(languages or ()), tuple(chunk_types or ()))
+        keys = [(self._error_query(error), k, max_tokens) + filters + self._focus_key(error) for error in errors]
+        contexts = [self.context_cache.get(key, self.vector_store.generation) for key in keys]
+        missing = list(dict.fromkeys(key for key, context in zip(keys, contexts) if context is None))
+        return keys, contexts, missing
+    
+    def _focus_key(self, error: Dict) -> Tuple:
+        # Only relevance-aware compression depends on the failing line
+        return (error.get('line'),) if self.context_compressor.mode == 'relevant' else ()
+    
+    def _fill_contexts(self,
+                       errors: List[Dict],
+                       keys: List[Tuple],
+                       contexts: List[Optional[str]],
+                       chunks_by_key: Dict[Tuple, List[Dict]],
+                       max_tokens: int,
+                       generation: int):
+        """Compress freshly retrieved chunks for every cache miss and cache the result
+
+        generation is the store generation read before retrieving, so a
+        context built while the index changed is never served afterwards.
+        """
+        for i, (error, key) in enumerate(zip(errors, keys)):
+            if contexts[i] is None:
+                contexts[i] = self._compress_error_context(error, chunks_by_key[key], max_tokens)
+                self.context_cache.put(key, contexts[i], generation)
+    
+    def _error_query(self, error: Dict) -> str:
+        """Build a retrieval query from error information"""
         query_parts = []
         
         if 'message' in error:
@@ -140,33 +346,65 @@ class MemoryEngine:
         if 'function' in error:
             query_parts.append(f"function {error['function']}")
         
-        query = " ".join(query_parts)
-        
-        # Retrieve relevant chunks
-        chunks = self.retrieve(query, k=10)
+        return " ".join(query_parts)
+    
+    def _compress_error_context(self, error: Dict, chunks: List[Dict], max_tokens: int) -> str:
+        """Order retrieved chunks for an error and compress them to the token limit"""
         
         # If error has a specific file, prioritize chunks from that file
         if 'file' in error:
             chunks.sort(key=lambda x: 0 if error['file'] in x['file_path'] else 1)
         
         # Compress context to fit token limit
-        context = self.context_compressor.compress_chunks(chunks, max_tokens)
+        with metrics.timer('compress_seconds'):
+            context = self.context_compressor.compress_chunks(chunks, max_tokens,
+                                                              error_file=error.get('file'),
+                                                              error_line=error.get('line'))
         
         return context
     
+    def collect_metrics(self) -> Dict[str, Dict]:
+        """Refresh index size and cache gauges and return a metrics snapshot
+
+        Pass this as MetricsServer(collect=engine.collect_metrics) to serve
+        the same values to Prometheus.
+        """
+        metrics.set_gauge('index_vectors', self.vector_store.ntotal)
+        metrics.set_gauge('index_generation', self.vector_store.generation)
+        caches = {'query_cache': self.query_embedding_cache, 'context_cache': self.context_cache}
+        if self.embedding_generator.cache is not None:
+            caches['embedding_cache'] = self.embedding_generator.cache
+        for name, cache in caches.items():
+            for key, value in cache.stats().items():
+                metrics.set_gauge(f"{name}_{key}", value)
+        stats = getattr(self.embedding_generator, 'stats', None)
+        if stats is not None:
+            for key, value in stats.to_dict().items():
+                metrics.set_gauge(f"embedding_{key}", value)
+        return metrics.snapshot()
+    
+    def update_index(self, file_extensions: Optional[List[str]] = None) -> Dict[str, int]:
+        """Re-embed only files that changed on disk since they were last indexed"""
+        if file_extensions is None:
+            file_extensions = ['.py', '.js', '.ts', '.java', '.go', '.rs', '.c', '.cpp']
+        
+        result = self.incremental_indexer.update(self._iter_source_files(file_extensions))
+        self._flush_embedding_cache()
+        logger.info(
+            f"Incremental update: {result['files_changed']} changed, {result['files_removed']} removed, "
+            f"{result['chunks_added']} chunks re-embedded"
+        )
+        return result
+    
+    def _flush_embedding_cache(self):
+        # Cache hits are written back in batches; indexing is a good time
+        if self.embedding_generator.cache is not None:
+            self.embedding_generator.cache.flush()
+    
     def update_chunk(self, file_path: str, start_line: int, end_line: int, new_content: str):
         """Update a specific chunk (for incremental updates)"""
-        # This would be implemented for real-time updates
-        # For MVP, we'll re-index the file
-        chunks = self.parser.parse_file(file_path)
-        
-        # Generate embeddings for new chunks
-        chunk_texts = [chunk.content for chunk in chunks]
-        embeddings = self.embedding_generator.generate_embeddings_batch(chunk_texts)
-        
-        for chunk, embedding in zip(chunks, embeddings):
-            chunk.embedding = embedding
-        
-        # Update vector store (would need to implement removal of old chunks)
-        self.vector_store.add_chunks(chunks)
+        # Chunk boundaries shift with edits, so the whole file is re-parsed and
+        # its previous chunks are replaced
+        self.incremental_indexer.reindex_file(file_path)
+        self.incremental_indexer.save_state()
         self.vector_store.save()
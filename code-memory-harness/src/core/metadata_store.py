@@ -0,0 +1,342 @@
+import json
+import mmap
+from dataclasses import replace
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.core.code_chunk import CodeChunk
+from src.core.versioned_dir import commit_version, current_version
+
+# Bumped whenever the on-disk column layout changes
+FORMAT_VERSION = 2
+
+# Integer columns stored as one .npy file each
+_COLUMNS = {
+    'ids': np.int64,
+    'file_ids': np.int32,
+    'start_lines': np.int32,
+    'end_lines': np.int32,
+    'chunk_types': np.uint8,
+    'languages': np.uint8,
+    'offsets': np.int64,
+}
+
+
+def find_rows(saved_ids: np.ndarray, ids: np.ndarray, deleted: set = frozenset()) -> Tuple[np.ndarray, np.ndarray]:
+    """(rows, found) of ids, of any shape, in a sorted column of saved ids
+
+    Ids in deleted count as not found. Shared by the stores that keep saved
+    rows memory-mapped and mask removed ones until the next save.
+    """
+    if len(saved_ids) == 0:
+        return np.zeros(ids.shape, dtype=np.int64), np.zeros(ids.shape, dtype=bool)
+    rows = np.minimum(np.searchsorted(saved_ids, ids), len(saved_ids) - 1)
+    found = saved_ids[rows] == ids
+    if deleted:
+        found &= live_mask(ids, deleted)
+    return rows, found
+
+
+def live_mask(ids: np.ndarray, deleted: set) -> np.ndarray:
+    """True where an id is not in deleted"""
+    if not deleted:
+        return np.ones(ids.shape, dtype=bool)
+    return ~np.isin(ids, np.fromiter(deleted, dtype=np.int64, count=len(deleted)))
+
+
+class ChunkMetadataStore:
+    """Columnar chunk metadata with contents in a memory-mapped text blob
+
+    Saved chunks live in per-column numpy arrays sorted by vector id plus a
+    single UTF-8 blob of contents addressed by an offsets column; all of them
+    are memory-mapped on load, so startup cost does not grow with the store.
+    Chunks added since the last save are kept as objects, and removed saved
+    chunks are masked, until the next save() merges everything back into
+    columns. Embeddings are never stored here; the FAISS index owns them.
+    """
+
+    def __init__(self):
+        self._reset_base()
+        # Chunks added since the last save, keyed by vector id
+        self._added: Dict[int, CodeChunk] = {}
+        # Saved vector ids removed since the last save
+        self._deleted: set = set()
+
+    def _reset_base(self):
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._columns: Dict[str, np.ndarray] = {
+            name: np.zeros(1 if name == 'offsets' else 0, dtype=dtype)
+            for name, dtype in _COLUMNS.items()
+        }
+        self._chunk_ids = np.zeros(0, dtype='<U1')
+        # Qualified names, '' for unnamed chunks; None for stores saved without them
+        self._names: Optional[np.ndarray] = None
+        self._contents = b''
+        self._file_paths: List[str] = []
+        self._file_lookup: Dict[str, int] = {}
+        self._chunk_type_names: List[str] = []
+        self._language_names: List[str] = []
+        # Lazily built posting lists over the saved code columns
+        self._postings: Dict[str, Dict[int, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self._ids) - len(self._deleted) + len(self._added)
+
+    def __contains__(self, idx: int) -> bool:
+        idx = int(idx)
+        if idx in self._added:
+            return True
+        return idx not in self._deleted and self._row(idx) is not None
+
+    def _row(self, idx: int) -> Optional[int]:
+        """Row of a saved vector id, ignoring deletions"""
+        row = int(np.searchsorted(self._ids, idx))
+        if row < len(self._ids) and self._ids[row] == idx:
+            return row
+        return None
+
+    def add(self, idx: int, chunk: CodeChunk):
+        """Store metadata for a vector id (the embedding is dropped)"""
+        idx = int(idx)
+        if self._row(idx) is not None:
+            # Replacing a saved chunk masks the saved row
+            self._deleted.add(idx)
+        self._added[idx] = replace(chunk, embedding=None) if chunk.embedding is not None else chunk
+
+    def remove(self, idx: int) -> Optional[str]:
+        """Forget a vector id, returning the file path it belonged to"""
+        idx = int(idx)
+        chunk = self._added.pop(idx, None)
+        if chunk is not None:
+            return chunk.file_path
+        if idx in self._deleted:
+            return None
+        row = self._row(idx)
+        if row is None:
+            return None
+        self._deleted.add(idx)
+        return self._file_paths[self._columns['file_ids'][row]]
+
+    def get(self, idx: int) -> Optional[CodeChunk]:
+        """Materialize a chunk for a vector id"""
+        idx = int(idx)
+        chunk = self._added.get(idx)
+        if chunk is not None:
+            return chunk
+        if idx in self._deleted:
+            return None
+        row = self._row(idx)
+        if row is None:
+            return None
+        return self._materialize(row)
+
+    def _materialize(self, row: int) -> CodeChunk:
+        columns = self._columns
+        start, end = columns['offsets'][row], columns['offsets'][row + 1]
+        return CodeChunk(
+            content=self._contents[start:end].decode('utf-8'),
+            file_path=self._file_paths[columns['file_ids'][row]],
+            start_line=int(columns['start_lines'][row]),
+            end_line=int(columns['end_lines'][row]),
+            chunk_type=self._chunk_type_names[columns['chunk_types'][row]],
+            language=self._language_names[columns['languages'][row]],
+            chunk_id=str(self._chunk_ids[row]),
+            name=(str(self._names[row]) or None) if self._names is not None else None
+        )
+
+    def contains_many(self, ids: np.ndarray) -> np.ndarray:
+        """Vectorized membership test for an id array of any shape"""
+        _, found = find_rows(self._ids, ids, self._deleted)
+        if self._added:
+            found |= np.isin(ids, np.fromiter(self._added.keys(), dtype=np.int64))
+        return found
+
+    def filter_ids(self,
+                   file_substrings: Optional[List[str]] = None,
+                   languages: Optional[List[str]] = None,
+                   chunk_types: Optional[List[str]] = None) -> np.ndarray:
+        """Sorted live ids whose chunk passes every given filter
+
+        A chunk passes the file filter when its path contains any of the
+        substrings, and the language/chunk_type filters on exact match.
+        Saved chunks are resolved through per-column posting lists.
+        """
+        saved = None
+        for column, names, wanted, by_substring in (
+            ('file_ids', self._file_paths, file_substrings, True),
+            ('languages', self._language_names, languages, False),
+            ('chunk_types', self._chunk_type_names, chunk_types, False),
+        ):
+            if not wanted:
+                continue
+            postings = self._posting_lists(column)
+            matching = [postings[code] for code, name in enumerate(names)
+                        if code in postings and self._name_matches(name, wanted, by_substring)]
+            ids = np.concatenate(matching) if matching else np.zeros(0, dtype=np.int64)
+            saved = np.sort(ids) if saved is None else np.intersect1d(saved, ids, assume_unique=True)
+
+        if saved is None:
+            saved = np.asarray(self._ids)
+        if self._deleted:
+            saved = saved[live_mask(saved, self._deleted)]
+
+        added = [idx for idx, chunk in self._added.items()
+                 if (not file_substrings or self._name_matches(chunk.file_path, file_substrings, True))
+                 and (not languages or chunk.language in languages)
+                 and (not chunk_types or chunk.chunk_type in chunk_types)]
+        if not added:
+            return saved
+        return np.sort(np.concatenate([saved, np.array(added, dtype=np.int64)]))
+
+    @staticmethod
+    def _name_matches(name: str, wanted: List[str], by_substring: bool) -> bool:
+        if by_substring:
+            return any(value in name for value in wanted)
+        return name in wanted
+
+    def _posting_lists(self, column: str) -> Dict[int, np.ndarray]:
+        """Inverted index from a code column to the sorted saved ids carrying each code
+
+        Saved columns are immutable until the next load, so each index is
+        built once on first use.
+        """
+        postings = self._postings.get(column)
+        if postings is None:
+            codes = np.asarray(self._columns[column])
+            # Stable sort keeps ids ascending within each code
+            order = np.argsort(codes, kind='stable')
+            boundaries = np.flatnonzero(np.diff(codes[order])) + 1
+            postings = {}
+            for rows in np.split(order, boundaries):
+                if len(rows):
+                    postings[int(codes[rows[0]])] = np.asarray(self._ids[rows])
+            self._postings[column] = postings
+        return postings
+
+    def ids(self) -> np.ndarray:
+        """All live vector ids"""
+        saved = self._ids
+        if self._deleted:
+            saved = saved[live_mask(saved, self._deleted)]
+        added = np.fromiter(self._added.keys(), dtype=np.int64, count=len(self._added))
+        return np.concatenate([saved, added])
+
+    def ids_for_file(self, file_path: str) -> List[int]:
+        """Live vector ids of every chunk from a file"""
+        ids = []
+        file_id = self._file_lookup.get(file_path)
+        if file_id is not None:
+            rows = np.nonzero(self._columns['file_ids'] == file_id)[0]
+            ids.extend(idx for idx in self._ids[rows].tolist() if idx not in self._deleted)
+        ids.extend(idx for idx, chunk in self._added.items() if chunk.file_path == file_path)
+        return ids
+
+    def file_paths(self) -> List[str]:
+        """Distinct file paths with at least one live chunk"""
+        paths = set(chunk.file_path for chunk in self._added.values())
+        live_rows = live_mask(self._ids, self._deleted)
+        for file_id in np.unique(self._columns['file_ids'][live_rows]).tolist():
+            paths.add(self._file_paths[file_id])
+        return sorted(paths)
+
+    def save(self, directory: str, attributes: Optional[Dict] = None):
+        """Write all live chunks as columns, committing a new version of directory atomically"""
+        self.load(str(commit_version(directory, lambda version: self.write(version, attributes))))
+
+    def write(self, directory, attributes: Optional[Dict] = None):
+        """Write all live chunks as columns into an empty directory, without committing it
+
+        For callers that commit the metadata together with other files; the
+        written directory can be passed to load().
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        columns, chunk_ids, names, vocab = self._merged_columns(directory / 'contents.bin')
+
+        for name, values in columns.items():
+            np.save(directory / f'{name}.npy', values)
+        np.save(directory / 'chunk_ids.npy', chunk_ids)
+        np.save(directory / 'names.npy', names)
+        (directory / 'manifest.json').write_text(json.dumps({
+            'version': FORMAT_VERSION,
+            **vocab,
+            'attributes': attributes or {}
+        }))
+
+    def _merged_columns(self, contents_path: Path) -> Tuple[Dict[str, np.ndarray], np.ndarray, np.ndarray, Dict]:
+        """Combine live saved rows and added chunks, sorted by vector id"""
+        file_paths: List[str] = []
+        file_lookup: Dict[str, int] = {}
+        chunk_types: List[str] = []
+        languages: List[str] = []
+
+        def code(value: str, names: List[str], lookup: Optional[Dict[str, int]] = None) -> int:
+            if lookup is None:
+                if value not in names:
+                    names.append(value)
+                return names.index(value)
+            if value not in lookup:
+                lookup[value] = len(names)
+                names.append(value)
+            return lookup[value]
+
+        entries = [(int(idx), self.get(idx)) for idx in self.ids()]
+        entries.sort(key=lambda entry: entry[0])
+
+        n = len(entries)
+        columns = {name: np.zeros(n + 1 if name == 'offsets' else n, dtype=dtype)
+                   for name, dtype in _COLUMNS.items()}
+        chunk_ids = []
+        names = []
+
+        offset = 0
+        with open(contents_path, 'wb') as blob:
+            for row, (idx, chunk) in enumerate(entries):
+                data = chunk.content.encode('utf-8')
+                blob.write(data)
+                columns['ids'][row] = idx
+                columns['file_ids'][row] = code(chunk.file_path, file_paths, file_lookup)
+                columns['start_lines'][row] = chunk.start_line
+                columns['end_lines'][row] = chunk.end_line
+                columns['chunk_types'][row] = code(chunk.chunk_type, chunk_types)
+                columns['languages'][row] = code(chunk.language, languages)
+                columns['offsets'][row] = offset
+                offset += len(data)
+                chunk_ids.append(chunk.chunk_id)
+                names.append(chunk.name or '')
+            columns['offsets'][n] = offset
+
+        vocab = {'file_paths': file_paths, 'chunk_types': chunk_types, 'languages': languages}
+        return columns, np.array(chunk_ids, dtype=str), np.array(names, dtype=str), vocab
+
+    def load(self, directory: str) -> Dict:
+        """Memory-map a saved store, returning the attributes saved with it
+
+        directory is either one committed by save() or one filled by write().
+        """
+        # Stores saved before versioned commits hold the columns directly
+        directory = current_version(directory) or Path(directory)
+        manifest = json.loads((directory / 'manifest.json').read_text())
+
+        self._reset_base()
+        self._columns = {name: np.load(directory / f'{name}.npy', mmap_mode='r') for name in _COLUMNS}
+        self._ids = self._columns['ids']
+        self._chunk_ids = np.load(directory / 'chunk_ids.npy', mmap_mode='r')
+        if (directory / 'names.npy').exists():
+            self._names = np.load(directory / 'names.npy', mmap_mode='r')
+
+        contents_path = directory / 'contents.bin'
+        if contents_path.stat().st_size:
+            with open(contents_path, 'rb') as f:
+                self._contents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._file_paths = manifest['file_paths']
+        self._file_lookup = {path: i for i, path in enumerate(self._file_paths)}
+        self._chunk_type_names = manifest['chunk_types']
+        self._language_names = manifest['languages']
+        self._added = {}
+        self._deleted = set()
+
+        return manifest.get('attributes', {})
@@ -0,0 +1,453 @@
+import json
+import logging
+import os
+import shutil
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from src.core.code_chunk import CodeChunk
+from src.core.vector_store import SimpleVectorStore, stable_vector_id
+
+logger = logging.getLogger(__name__)
+
+# Bumped whenever the manifest layout changes
+MANIFEST_VERSION = 1
+
+# SimpleVectorStore arguments that fix a segment's index layout
+LAYOUT_PARAMS = ('nlist', 'pq_m', 'pq_nbits', 'hnsw_m', 'ef_construction', 'quantization')
+
+# Chunks re-added per step when compaction merges segments
+_MERGE_BATCH = 10000
+
+
+def merge_top_k(results: List[Tuple[np.ndarray, np.ndarray]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Merge per-part (similarities, ids) search results into the overall top k
+
+    Each part is shaped (n_queries, any width) with empty slots holding id -1
+    and similarity -inf, as SimpleVectorStore.search_batch returns them.
+    """
+    similarities = np.concatenate([part for part, _ in results], axis=1)
+    ids = np.concatenate([part for _, part in results], axis=1)
+    order = np.argsort(-similarities, axis=1, kind='stable')[:, :k]
+    return np.take_along_axis(similarities, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+
+def _copy_chunks(source: SimpleVectorStore, target: SimpleVectorStore, exclude: Set[int] = frozenset()):
+    """Add every chunk of source, with its vector, to target"""
+    ids, vectors = source.get_vectors()
+    if exclude:
+        live = ~np.isin(ids, np.fromiter(exclude, dtype=np.int64, count=len(exclude)))
+        ids, vectors = ids[live], vectors[live]
+    for start in range(0, len(ids), _MERGE_BATCH):
+        chunks = []
+        for idx, vector in zip(ids[start:start + _MERGE_BATCH].tolist(), vectors[start:start + _MERGE_BATCH]):
+            chunk = source.get_chunk(idx)
+            chunk.embedding = vector
+            chunks.append(chunk)
+        target.add_chunks(chunks)
+
+
+@dataclass
+class _Segment:
+    """A sealed, memory-mapped segment and the ids deleted from it since it was written
+
+    tombstones is changed only under the store's lock. Readers, which do
+    not take it, use tombstone_ids(): a sorted array that is replaced,
+    never modified, whenever the tombstones change.
+    """
+    name: str
+    store: SimpleVectorStore
+    # Ids removed or replaced, including changes not committed yet
+    tombstones: Set[int] = field(default_factory=set)
+    # Tombstones as of the last commit, and the file holding them
+    committed: Set[int] = field(default_factory=set)
+    tombstone_file: Optional[str] = None
+    _tombstone_ids: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.int64))
+
+    def tombstone(self, ids: Iterable[int]) -> int:
+        new = [idx for idx in ids if idx not in self.tombstones and idx in self.store.metadata]
+        if new:
+            self.tombstones.update(new)
+            self._tombstone_ids = np.union1d(self._tombstone_ids, np.array(new, dtype=np.int64))
+        return len(new)
+
+    def set_tombstones(self, tombstones: Set[int]):
+        self.tombstones = tombstones
+        self._tombstone_ids = np.sort(np.fromiter(tombstones, dtype=np.int64, count=len(tombstones)))
+
+    def tombstone_ids(self) -> np.ndarray:
+        return self._tombstone_ids
+
+    def is_tombstoned(self, idx: int) -> bool:
+        ids = self._tombstone_ids
+        position = np.searchsorted(ids, idx)
+        return position < len(ids) and ids[position] == idx
+
+    @property
+    def live(self) -> int:
+        return len(self.store.metadata) - len(self._tombstone_ids)
+
+
+class SegmentedVectorStore:
+    """Vector store persisted as immutable segments plus a manifest, LSM style
+
+    Chunks added since the last save() go to an in-memory delta store; save()
+    writes only that delta as a new segment and records deletions from older
+    segments as tombstones, so a commit costs the size of the change rather
+    than the size of the index. Every commit ends by atomically replacing
+    manifest.json, so a crash leaves the previous commit intact. Sealed
+    segments are memory-mapped read-only; searches fan out across them and
+    the delta and merge the top k.
+
+    When more than max_segments accumulate, a background thread merges the
+    small ones (and any with many tombstones) into one segment built with
+    index_type, and swaps it in with a manifest commit. Delta segments use an
+    exact flat index. Other keyword arguments (quantization, rerank, nprobe,
+    ...) are passed to every SimpleVectorStore segment.
+    """
+
+    def __init__(self,
+                 dimension: int = 1536,
+                 index_path: Optional[str] = None,
+                 index_type: str = 'flat',
+                 metric: str = 'l2',
+                 max_segments: int = 8,
+                 background_compaction: bool = True,
+                 mmap: bool = False,
+                 **store_params):
+        self.dimension = dimension
+        # Other state (file fingerprints, embedding cache) is named after index_path
+        self.index_path = index_path or "vector_store.index"
+        self.segments_dir = Path(self.index_path.replace('.index', '_segments') if index_path
+                                 else "vector_store_segments")
+        self.manifest_path = self.segments_dir / 'manifest.json'
+        self.index_type = index_type
+        self.metric = metric
+        self.max_segments = max_segments
+        self.background_compaction = background_compaction
+        self.store_params = store_params
+        self.mmap = mmap
+        # Set once segments are loaded with mmap=True
+        self.read_only = False
+        self.generation = 0
+
+        self._lock = threading.RLock()
+        self._compaction: Optional[threading.Thread] = None
+        # Segment names being written outside the manifest (by compaction)
+        self._reserved: Set[str] = set()
+        # Bumped by reset() so an in-flight compaction does not swap in stale data
+        self._epoch = 0
+        self._next_id = 1
+        self.reset()
+
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"{self.index_path} was loaded read-only (mmap=True) and cannot be modified")
+
+    def _new_store(self, name: str, index_type: str = 'flat', mmap: bool = False) -> SimpleVectorStore:
+        return SimpleVectorStore(dimension=self.dimension, index_path=str(self.segments_dir / f"{name}.index"),
+                                 index_type=index_type, metric=self.metric, mmap=mmap, **self.store_params)
+
+    def _new_name(self, prefix: str = 'segment') -> str:
+        name = f"{prefix}_{self._next_id:06d}"
+        self._next_id += 1
+        return name
+
+    def reset(self):
+        """Drop every stored chunk; the next save() commits an empty store"""
+        self._check_writable()
+        with self._lock:
+            self._segments: List[_Segment] = []
+            # Written under its own name as the next segment on save()
+            self.delta = self._new_store(self._new_name())
+            self._epoch += 1
+            self.generation += 1
+
+    @property
+    def segments(self) -> List[str]:
+        return [segment.name for segment in self._segments]
+
+    @property
+    def ntotal(self) -> int:
+        """Number of live chunks in the store"""
+        return self.delta.ntotal + sum(segment.live for segment in self._segments)
+
+    def add_chunks(self, chunks: List[CodeChunk]):
+        """Add code chunks with their embeddings; existing chunk_ids are replaced"""
+        self._check_writable()
+        ids = [stable_vector_id(chunk.chunk_id) for chunk in chunks if chunk.embedding is not None]
+        with self._lock:
+            for segment in self._segments:
+                segment.tombstone(ids)
+            self.delta.add_chunks(chunks)
+            self.generation += 1
+
+    def upsert_file(self, file_path: str, chunks: List[CodeChunk]):
+        """Replace every chunk of a file with a freshly parsed set"""
+        self.remove_file(file_path)
+        self.add_chunks(chunks)
+
+    def remove_file(self, file_path: str) -> int:
+        """Remove all chunks that belong to a file, returning how many were dropped"""
+        self._check_writable()
+        with self._lock:
+            removed = self.delta.remove_file(file_path)
+            for segment in self._segments:
+                removed += segment.tombstone(segment.store.metadata.ids_for_file(file_path))
+            self.generation += 1
+        return removed
+
+    def remove_chunks(self, chunk_ids: Iterable[str]) -> int:
+        """Remove chunks by chunk_id, returning how many were dropped"""
+        self._check_writable()
+        chunk_ids = list(chunk_ids)
+        ids = [stable_vector_id(chunk_id) for chunk_id in chunk_ids]
+        with self._lock:
+            removed = self.delta.remove_chunks(chunk_ids)
+            for segment in self._segments:
+                removed += segment.tombstone(ids)
+            self.generation += 1
+        return removed
+
+    def search(self,
+               query_embedding: np.ndarray,
+               k: int = 5,
+               file_filter: Optional[List[str]] = None,
+               languages: Optional[List[str]] = None,
+               chunk_types: Optional[List[str]] = None) -> List[Tuple[CodeChunk, float]]:
+        """Search for similar code chunks"""
+        similarities, ids = self.search_batch(np.asarray(query_embedding)[np.newaxis, :], k,
+                                              file_filter, languages, chunk_types)
+        return [(self.get_chunk(idx), similarity)
+                for idx, similarity in zip(ids[0].tolist(), similarities[0].tolist()) if idx != -1]
+
+    def search_batch(self,
+                     query_embeddings: np.ndarray,
+                     k: int = 5,
+                     file_filter: Optional[List[str]] = None,
+                     languages: Optional[List[str]] = None,
+                     chunk_types: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Search every segment and the delta, merging the top k; see SimpleVectorStore.search_batch"""
+        results = [self.delta.search_batch(query_embeddings, k, file_filter, languages, chunk_types)]
+        for segment in list(self._segments):
+            # Tombstoned ids are left out inside FAISS, so each segment
+            # fetches only k however many chunks were deleted from it
+            results.append(segment.store.search_batch(query_embeddings, k, file_filter, languages, chunk_types,
+                                                      exclude=segment.tombstone_ids()))
+        return merge_top_k(results, k)
+
+    def get_chunk(self, idx: int) -> Optional[CodeChunk]:
+        """Materialize the chunk stored under a vector id"""
+        chunk = self.delta.get_chunk(idx)
+        if chunk is not None:
+            return chunk
+        for segment in reversed(list(self._segments)):
+            if not segment.is_tombstoned(idx):
+                chunk = segment.store.get_chunk(idx)
+                if chunk is not None:
+                    return chunk
+        return None
+
+    def get_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (ids, vectors) for every live chunk"""
+        parts = [self.delta.get_vectors()]
+        for segment in list(self._segments):
+            ids, vectors = segment.store.get_vectors()
+            tombstone_ids = segment.tombstone_ids()
+            if len(tombstone_ids):
+                live = ~np.isin(ids, tombstone_ids)
+                ids, vectors = ids[live], vectors[live]
+            parts.append((ids, vectors))
+        return np.concatenate([ids for ids, _ in parts]), np.concatenate([vectors for _, vectors in parts])
+
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        """Tune recall vs latency at query time on every segment"""
+        for key, value in (('nprobe', nprobe), ('ef_search', ef_search)):
+            if value is not None:
+                self.store_params[key] = value
+        for segment in list(self._segments):
+            segment.store.set_search_params(nprobe, ef_search)
+
+    def save(self):
+        """Commit the delta as a new segment and the tombstones, then swap in a new manifest"""
+        self._check_writable()
+        with self._lock:
+            if self.delta.ntotal:
+                self.segments_dir.mkdir(parents=True, exist_ok=True)
+                self.delta.save()
+                name = Path(self.delta.index_path).stem
+                self._segments = self._segments + [self._open_segment(name)]
+                self.delta = self._new_store(self._new_name())
+
+            for segment in self._segments:
+                if segment.tombstones != segment.committed:
+                    segment.tombstone_file = f"{self._new_name('tombstones')}.npy"
+                    self.segments_dir.mkdir(parents=True, exist_ok=True)
+                    np.save(self.segments_dir / segment.tombstone_file, segment.tombstone_ids())
+                    segment.committed = set(segment.tombstones)
+
+            self._commit()
+        self._maybe_compact()
+
+    def _open_segment(self, name: str, tombstone_file: Optional[str] = None) -> _Segment:
+        store = self._new_store(name, mmap=True)
+        if not store.load():
+            raise FileNotFoundError(f"Segment {name} is missing from {self.segments_dir}")
+        segment = _Segment(name, store, tombstone_file=tombstone_file)
+        if tombstone_file:
+            segment.set_tombstones(set(np.load(self.segments_dir / tombstone_file).tolist()))
+            segment.committed = set(segment.tombstones)
+        return segment
+
+    def _commit(self):
+        """Atomically replace the manifest with the current sealed state, then drop unreferenced files"""
+        self.segments_dir.mkdir(parents=True, exist_ok=True)
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'dimension': self.dimension,
+            'metric': self.metric,
+            # Layout of compacted segments, kept across loads like the metric
+            'index_type': self.index_type,
+            'index_params': {key: value for key, value in self.store_params.items() if key in LAYOUT_PARAMS},
+            'next_id': self._next_id,
+            'segments': [{'name': segment.name, 'tombstones': segment.tombstone_file}
+                         for segment in self._segments],
+        }
+        tmp_path = self.segments_dir / 'manifest.json.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+
+        # Readers that mapped replaced files keep them until they close them
+        keep = set(self._reserved)
+        for segment in self._segments:
+            keep.add(segment.name)
+            if segment.tombstone_file:
+                keep.add(segment.tombstone_file)
+        for path in self.segments_dir.iterdir():
+            if path.name == 'manifest.json' or any(path.name == name or path.name.startswith((f"{name}.", f"{name}_"))
+                                                   for name in keep):
+                continue
+            if path.is_dir():
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                path.unlink(missing_ok=True)
+
+    def load(self) -> bool:
+        """Open the committed segments; a store saved by SimpleVectorStore is migrated on the next save()"""
+        if not self.manifest_path.exists():
+            legacy = SimpleVectorStore(dimension=self.dimension, index_path=self.index_path,
+                                       index_type=self.index_type, metric=self.metric, **self.store_params)
+            if not legacy.load():
+                return False
+            with self._lock:
+                self.metric = legacy.metric
+                self.index_type = legacy.index_type
+                self.store_params.update({key: legacy.index_params[key] for key in LAYOUT_PARAMS})
+                self.reset()
+                _copy_chunks(legacy, self.delta)
+            logger.info(f"Loaded unsegmented store {self.index_path}; the next save() writes it as a segment")
+            return True
+
+        # A writer in another process may commit and delete old files while
+        # this one opens them; re-read the manifest and retry
+        for attempt in range(3):
+            manifest = json.loads(self.manifest_path.read_text())
+            try:
+                segments = [self._open_segment(entry['name'], entry['tombstones'])
+                            for entry in manifest['segments']]
+                break
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise
+
+        with self._lock:
+            self.read_only = False
+            self.metric = manifest['metric']
+            self.index_type = manifest.get('index_type', self.index_type)
+            self.store_params.update(manifest.get('index_params', {}))
+            self._next_id = manifest['next_id']
+            self.reset()
+            self._segments = segments
+            self.read_only = self.mmap
+            self.generation += 1
+        return True
+
+    def _compaction_candidates(self) -> List[str]:
+        """Segments worth rewriting: heavily tombstoned ones, and once there are
+        more than max_segments, every segment but a dominant base segment"""
+        segments = self._segments
+        candidates = {segment.name for segment in segments
+                      if len(segment.tombstones) > 0.2 * max(1, len(segment.store.metadata))}
+        if len(segments) > self.max_segments:
+            largest = max(segments, key=lambda segment: segment.live)
+            total = sum(segment.live for segment in segments)
+            candidates.update(segment.name for segment in segments
+                              if segment is not largest or largest.live < total / 2)
+        return [segment.name for segment in segments if segment.name in candidates]
+
+    def _maybe_compact(self):
+        if not self.background_compaction or (self._compaction is not None and self._compaction.is_alive()):
+            return
+        names = self._compaction_candidates()
+        if names:
+            self._compaction = threading.Thread(target=self.compact, args=(names,), daemon=True)
+            self._compaction.start()
+
+    def wait_for_compaction(self):
+        if self._compaction is not None:
+            self._compaction.join()
+
+    def compact(self, names: Optional[List[str]] = None):
+        """Merge sealed segments (all of them by default) into one, dropping tombstoned chunks
+
+        Safe to run alongside adds, removes and saves: the merge reads the
+        immutable segment files, and tombstones recorded meanwhile are
+        carried over to the merged segment when it is swapped in.
+        """
+        self._check_writable()
+        with self._lock:
+            names = set(names if names is not None else self.segments)
+            sources = [segment for segment in self._segments if segment.name in names]
+            if len(sources) < 2 and not any(segment.tombstones for segment in sources):
+                return
+            snapshot = {segment.name: set(segment.committed) for segment in sources}
+            epoch = self._epoch
+            name = self._new_name()
+            self._reserved.add(name)
+
+        try:
+            merged = self._new_store(name, index_type=self.index_type)
+            for segment in sources:
+                _copy_chunks(segment.store, merged, exclude=snapshot[segment.name])
+            merged.save()
+
+            with self._lock:
+                current = {segment.name: segment for segment in self._segments}
+                if self._epoch != epoch or not all(segment.name in current for segment in sources):
+                    return
+                replacement = self._open_segment(name)
+                # Deletions made while merging apply to the merged segment
+                tombstones = set()
+                for segment in sources:
+                    current_segment = current[segment.name]
+                    tombstones |= current_segment.tombstones - snapshot[segment.name]
+                    replacement.committed |= current_segment.committed - snapshot[segment.name]
+                replacement.set_tombstones(tombstones)
+                if replacement.committed:
+                    replacement.tombstone_file = f"{self._new_name('tombstones')}.npy"
+                    np.save(self.segments_dir / replacement.tombstone_file,
+                            np.fromiter(replacement.committed, dtype=np.int64))
+                position = min(i for i, segment in enumerate(self._segments) if segment.name in names)
+                remaining = [segment for segment in self._segments if segment.name not in names]
+                self._segments = remaining[:position] + [replacement] + remaining[position:]
+                self._commit()
+        finally:
+            with self._lock:
+                self._reserved.discard(name)
@@ -0,0 +1,222 @@
+import heapq
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from src.core.code_chunk import CodeChunk
+from src.core.segmented_store import SegmentedVectorStore
+from src.core.vector_store import SimpleVectorStore, stable_vector_id
+
+# How chunks are assigned to shards: by their file, or by the repository
+# (top-level directory under repository_root) they belong to
+PARTITIONS = ('file', 'repository')
+
+
+def merge_shard_results(results: List[Tuple[np.ndarray, np.ndarray]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Heap-merge per-shard (similarities, ids) rows, each sorted best first, into the top k"""
+    n_queries = len(results[0][0])
+    similarities = np.full((n_queries, k), -np.inf, dtype=np.float32)
+    ids = np.full((n_queries, k), -1, dtype=np.int64)
+    for row in range(n_queries):
+        rows = [zip((-part_similarities[row]).tolist(), part_ids[row].tolist())
+                for part_similarities, part_ids in results]
+        merged = [(-negated, idx) for negated, idx in islice(heapq.merge(*rows), k) if idx != -1]
+        if merged:
+            similarities[row, :len(merged)], ids[row, :len(merged)] = zip(*merged)
+    return similarities, ids
+
+
+class ShardedVectorStore:
+    """Vector store partitioned across shards that are searched in parallel
+
+    Each chunk lives in one of num_shards SimpleVectorStores (or
+    SegmentedVectorStores with segmented=True), chosen by a stable hash of
+    its file path or repository, so a file's chunks are always replaced and
+    removed in one shard. Searches run on every shard from a thread pool
+    (FAISS releases the GIL while it searches) and the per-shard top k are
+    heap-merged. Saves and loads also run shard by shard in parallel. Other
+    keyword arguments (index_type, quantization, rerank, ...) configure
+    every shard.
+    """
+
+    def __init__(self,
+                 dimension: int = 1536,
+                 index_path: Optional[str] = None,
+                 num_shards: int = 4,
+                 partition: str = 'file',
+                 repository_root: Optional[str] = None,
+                 search_workers: Optional[int] = None,
+                 segmented: bool = False,
+                 **store_params):
+        if partition not in PARTITIONS:
+            raise ValueError(f"Unknown partition: {partition}")
+        if partition == 'repository' and repository_root is None:
+            raise ValueError("partition='repository' needs a repository_root")
+        if num_shards < 1:
+            raise ValueError("num_shards must be at least 1")
+
+        self.dimension = dimension
+        # Other state (file fingerprints, embedding cache) is named after index_path
+        self.index_path = index_path or "vector_store.index"
+        self.shards_dir = Path(self.index_path.replace('.index', '_shards') if index_path
+                               else "vector_store_shards")
+        self.num_shards = num_shards
+        self.partition = partition
+        self.repository_root = Path(repository_root).resolve() if repository_root else None
+        # Threads searching shards at once; 1 searches them one after another
+        self.search_workers = min(num_shards, search_workers or os.cpu_count() or 1)
+        self.segmented = segmented
+
+        store_class = SegmentedVectorStore if segmented else SimpleVectorStore
+        self.shards = [
+            store_class(dimension=dimension, index_path=str(self.shards_dir / f"shard_{shard:03d}.index"),
+                        **store_params)
+            for shard in range(num_shards)
+        ]
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _map(self, function, shards=None) -> list:
+        """Apply function to every shard, in parallel when there are search workers to spare"""
+        shards = self.shards if shards is None else shards
+        if self.search_workers <= 1 or len(shards) == 1:
+            return [function(shard) for shard in shards]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.search_workers, thread_name_prefix='shard')
+        return list(self._executor.map(function, shards))
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _partition_key(self, file_path: str) -> str:
+        if self.partition == 'repository':
+            try:
+                return Path(file_path).resolve().relative_to(self.repository_root).parts[0]
+            except (ValueError, IndexError):
+                # Files outside the root group by their directory
+                return str(Path(file_path).parent)
+        return str(file_path)
+
+    def _shard_number(self, file_path: str) -> int:
+        return stable_vector_id(self._partition_key(file_path)) % self.num_shards
+
+    def shard_for(self, file_path: str):
+        """The shard that holds, or will hold, the chunks of a file"""
+        return self.shards[self._shard_number(file_path)]
+
+    @property
+    def metric(self) -> str:
+        return self.shards[0].metric
+
+    @property
+    def read_only(self) -> bool:
+        return any(shard.read_only for shard in self.shards)
+
+    @property
+    def generation(self) -> int:
+        # Each shard's counter only grows, so their sum changes whenever one does
+        return sum(shard.generation for shard in self.shards)
+
+    @property
+    def ntotal(self) -> int:
+        """Number of live chunks in the store"""
+        return sum(shard.ntotal for shard in self.shards)
+
+    def reset(self):
+        """Drop every stored chunk"""
+        for shard in self.shards:
+            shard.reset()
+
+    def add_chunks(self, chunks: List[CodeChunk]):
+        """Add code chunks with their embeddings to their shards"""
+        by_shard: Dict[int, List[CodeChunk]] = {}
+        for chunk in chunks:
+            by_shard.setdefault(self._shard_number(chunk.file_path), []).append(chunk)
+        for number, shard_chunks in by_shard.items():
+            self.shards[number].add_chunks(shard_chunks)
+
+    def upsert_file(self, file_path: str, chunks: List[CodeChunk]):
+        """Replace every chunk of a file with a freshly parsed set"""
+        self.shard_for(file_path).upsert_file(file_path, chunks)
+
+    def remove_file(self, file_path: str) -> int:
+        """Remove all chunks that belong to a file, returning how many were dropped"""
+        return self.shard_for(file_path).remove_file(file_path)
+
+    def remove_chunks(self, chunk_ids: Iterable[str]) -> int:
+        """Remove chunks by chunk_id, returning how many were dropped"""
+        chunk_ids = list(chunk_ids)
+        return sum(shard.remove_chunks(chunk_ids) for shard in self.shards)
+
+    def search(self,
+               query_embedding: np.ndarray,
+               k: int = 5,
+               file_filter: Optional[List[str]] = None,
+               languages: Optional[List[str]] = None,
+               chunk_types: Optional[List[str]] = None) -> List[Tuple[CodeChunk, float]]:
+        """Search for similar code chunks"""
+        similarities, ids = self.search_batch(np.asarray(query_embedding)[np.newaxis, :], k,
+                                              file_filter, languages, chunk_types)
+        return [(self.get_chunk(idx), similarity)
+                for idx, similarity in zip(ids[0].tolist(), similarities[0].tolist()) if idx != -1]
+
+    def search_batch(self,
+                     query_embeddings: np.ndarray,
+                     k: int = 5,
+                     file_filter: Optional[List[str]] = None,
+                     languages: Optional[List[str]] = None,
+                     chunk_types: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Search every shard and merge the top k; see SimpleVectorStore.search_batch"""
+        results = self._map(lambda shard: shard.search_batch(query_embeddings, k, file_filter, languages, chunk_types))
+        return merge_shard_results(results, k)
+
+    def get_chunk(self, idx: int) -> Optional[CodeChunk]:
+        """Materialize the chunk stored under a vector id"""
+        for shard in self.shards:
+            chunk = shard.get_chunk(idx)
+            if chunk is not None:
+                return chunk
+        return None
+
+    def get_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (ids, vectors) for every live chunk"""
+        parts = [shard.get_vectors() for shard in self.shards]
+        return np.concatenate([ids for ids, _ in parts]), np.concatenate([vectors for _, vectors in parts])
+
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        """Tune recall vs latency at query time on every shard"""
+        for shard in self.shards:
+            shard.set_search_params(nprobe, ef_search)
+
+    def save(self):
+        """Persist every shard, then the shard layout"""
+        self.shards_dir.mkdir(parents=True, exist_ok=True)
+        self._map(lambda shard: shard.save())
+        layout = {'num_shards': self.num_shards, 'partition': self.partition,
+                  'repository_root': str(self.repository_root) if self.repository_root else None,
+                  'segmented': self.segmented}
+        tmp_path = self.shards_dir / 'shards.json.tmp'
+        tmp_path.write_text(json.dumps(layout))
+        os.replace(tmp_path, self.shards_dir / 'shards.json')
+
+    def load(self) -> bool:
+        """Load every shard; False if nothing was saved at index_path"""
+        layout_path = self.shards_dir / 'shards.json'
+        if not layout_path.exists():
+            return False
+        layout = json.loads(layout_path.read_text())
+        if (layout['num_shards'], layout['partition'], layout['segmented']) != \
+                (self.num_shards, self.partition, self.segmented):
+            # Chunks would be looked up in the wrong shards
+            raise ValueError(
+                f"{self.shards_dir} holds {layout['num_shards']} {layout['partition']}-partitioned "
+                f"{'segmented ' if layout['segmented'] else ''}shards; open it with the same layout "
+                f"or re-index"
+            )
+        return any(self._map(lambda shard: shard.load()))
@@ -0,0 +1,107 @@
+import logging
+import os
+from functools import lru_cache
+from typing import TYPE_CHECKING, Dict, List, Tuple, Union
+
+if TYPE_CHECKING:
+    import tiktoken
+
+# Model whose tokenizer is used when none is given; OpenAI's embedding and
+# chat models share the cl100k_base encoding
+DEFAULT_MODEL = "gpt-4"
+
+# Set to "1" (see allow_byte_fallback) to count UTF-8 bytes as tokens when
+# tiktoken's encoding cannot be downloaded. For offline benchmarks only:
+# byte counts are about four times tiktoken's, which shrinks chunk bounds,
+# context budgets and embedding batches. Subprocesses inherit it
+BYTE_FALLBACK_ENV = "CODE_MEMORY_BYTE_TOKENS"
+
+logger = logging.getLogger(__name__)
+
+
+class ByteEncoding:
+    """UTF-8 bytes as tokens, used offline when allowed by BYTE_FALLBACK_ENV
+
+    Every byte counts as one token, so token limits are met conservatively
+    rather than exceeded. Only the Encoding methods this package calls are
+    provided.
+    """
+
+    name = "bytes"
+    n_vocab = 256
+
+    def encode_ordinary(self, text: str) -> List[int]:
+        return list(text.encode("utf-8"))
+
+    def encode(self, text: str, **kwargs) -> List[int]:
+        return self.encode_ordinary(text)
+
+    def encode_ordinary_batch(self, texts: List[str], **kwargs) -> List[List[int]]:
+        return [self.encode_ordinary(text) for text in texts]
+
+    def decode(self, tokens: List[int], errors: str = "replace") -> str:
+        return bytes(tokens).decode("utf-8", errors=errors)
+
+    def decode_with_offsets(self, tokens: List[int]) -> Tuple[str, List[int]]:
+        """Text and the index of the character each token (byte) falls in"""
+        offsets = []
+        chars = 0
+        for token in tokens:
+            # Continuation bytes (0b10xxxxxx) belong to the preceding character
+            if not 0x80 <= token < 0xC0:
+                chars += 1
+            offsets.append(chars - 1 if chars else 0)
+        return self.decode(tokens), offsets
+
+
+# Models counted in bytes after their encoding failed to load under BYTE_FALLBACK_ENV
+_byte_fallbacks: Dict[str, ByteEncoding] = {}
+
+
+def allow_byte_fallback():
+    """Let this process and its subprocesses count bytes when tiktoken's encoding cannot be loaded"""
+    os.environ[BYTE_FALLBACK_ENV] = "1"
+
+
+@lru_cache(maxsize=None)
+def _load_encoding(model: str) -> "tiktoken.Encoding":
+    import tiktoken
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # Unknown (e.g. local) models are approximated with OpenAI's encoding
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def get_encoding(model: str = DEFAULT_MODEL) -> Union["tiktoken.Encoding", ByteEncoding]:
+    """Tokenizer for a model, loaded once per process and shared by every caller
+
+    tiktoken is imported here, so modules that only might count tokens do
+    not pay for it at import time. Its encoding files are downloaded once
+    into TIKTOKEN_CACHE_DIR; on machines without network access, pre-seed
+    that directory. A failed download raises and is retried on the next
+    call, unless BYTE_FALLBACK_ENV is set, in which case the model is
+    counted in bytes from then on and a warning is logged.
+    """
+    fallback = _byte_fallbacks.get(model)
+    if fallback is not None:
+        return fallback
+    try:
+        return _load_encoding(model)
+    except OSError as e:
+        # requests' network errors are OSErrors too
+        if os.environ.get(BYTE_FALLBACK_ENV) != "1":
+            raise
+        logger.warning(f"Could not load the tiktoken encoding for {model} ({e}); "
+                       f"counting UTF-8 bytes as tokens instead")
+        return _byte_fallbacks.setdefault(model, ByteEncoding())
+
+
+def count_tokens(text: str, model: str = DEFAULT_MODEL) -> int:
+    """Number of tokens in text"""
+    return len(get_encoding(model).encode_ordinary(text))
+
+
+def count_tokens_batch(texts: List[str], model: str = DEFAULT_MODEL) -> List[int]:
+    """Token counts for many texts, encoded in parallel by tiktoken"""
+    return [len(tokens) for tokens in get_encoding(model).encode_ordinary_batch(texts)]
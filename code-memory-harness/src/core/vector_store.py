@@ -1,116 +1,727 @@
-import faiss
+import logging
 import numpy as np
 import pickle
+import shutil
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
+from typing import Iterable, List, Dict, Tuple, Optional
 import hashlib
-from dataclasses import dataclass
-import json
-
-@dataclass
-class CodeChunk:
-    """Represents a chunk of code with metadata"""
-    content: str
-    file_path: str
-    start_line: int
-    end_line: int
-    chunk_type: str  # 'function', 'class', 'module', 'block'
-    language: str
-    embedding: Optional[np.ndarray] = None
-    chunk_id: Optional[str] = None
-    
-    def __post_init__(self):
-        if not self.chunk_id:
-            # Generate unique ID based on content and location
-            unique_str = f"{self.file_path}:{self.start_line}:{self.end_line}:{self.content[:50]}"
-            self.chunk_id = hashlib.md5(unique_str.encode()).hexdigest()
+
+from src.core.code_chunk import CodeChunk
+from src.core.exact_vectors import ExactVectors
+from src.core.lazy_import import lazy_import
+from src.core.metadata_store import ChunkMetadataStore
+from src.core.versioned_dir import commit_version, current_version
+from src.monitoring.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Loaded on first use, so importing the engine does not pay for faiss
+faiss = lazy_import("faiss")
+
+# Index layouts accepted by SimpleVectorStore(index_type=...)
+INDEX_TYPES = ('flat', 'ivfflat', 'ivfpq', 'hnsw')
+
+# Vector encodings accepted by SimpleVectorStore(quantization=...): float32,
+# or scalar-quantized to float16 (half the bytes) or 8 bits per dimension
+# (a quarter). 'ivfpq' always stores product-quantized codes
+QUANTIZATIONS = ('none', 'sqfp16', 'sq8')
+
+# Files of a committed store version (see versioned_dir)
+INDEX_FILE = 'index.faiss'
+METADATA_DIR = 'meta'
+VECTORS_DIR = 'vectors'
+
+# Similarity metrics accepted by SimpleVectorStore(metric=...); 'cosine' stores
+# L2-normalized vectors under an inner-product index. Values are
+# faiss.METRIC_L2 and faiss.METRIC_INNER_PRODUCT, spelled out so that
+# reading them does not load faiss
+METRICS = {
+    'l2': 1,
+    'cosine': 0
+}
+
+def stable_vector_id(chunk_id: str) -> int:
+    """Map a chunk_id to a stable, non-negative 63-bit FAISS id"""
+    digest = hashlib.md5(chunk_id.encode()).digest()
+    return int.from_bytes(digest[:8], 'little') & 0x7FFFFFFFFFFFFFFF
+
+def build_index(index_type: str,
+                dimension: int,
+                metric: str = 'l2',
+                nlist: int = 1024,
+                pq_m: int = 16,
+                pq_nbits: int = 8,
+                hnsw_m: int = 32,
+                ef_construction: int = 200,
+                quantization: str = 'none'):
+    """Create an empty FAISS index that accepts add_with_ids/remove_ids
+
+    IVF indexes keep ids natively (with a hashtable direct map so vectors can
+    be reconstructed by id); flat and HNSW indexes are wrapped in IndexIDMap2.
+    quantization selects scalar-quantized storage for flat, HNSW and ivfflat.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown metric: {metric}")
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization: {quantization}")
+    if quantization != 'none' and index_type == 'ivfpq':
+        raise ValueError("ivfpq stores product-quantized codes and takes no scalar quantization")
+    faiss_metric = METRICS[metric]
+    qtype = {'sqfp16': faiss.ScalarQuantizer.QT_fp16, 'sq8': faiss.ScalarQuantizer.QT_8bit}.get(quantization)
+    
+    if index_type == 'flat':
+        if qtype is None:
+            return faiss.IndexIDMap2(faiss.IndexFlat(dimension, faiss_metric))
+        return faiss.IndexIDMap2(faiss.IndexScalarQuantizer(dimension, qtype, faiss_metric))
+    
+    if index_type == 'hnsw':
+        if qtype is None:
+            hnsw = faiss.IndexHNSWFlat(dimension, hnsw_m, faiss_metric)
+        else:
+            hnsw = faiss.IndexHNSWSQ(dimension, qtype, hnsw_m, faiss_metric)
+        hnsw.hnsw.efConstruction = ef_construction
+        return faiss.IndexIDMap2(hnsw)
+    
+    quantizer = faiss.IndexFlat(dimension, faiss_metric)
+    if index_type == 'ivfflat' and qtype is not None:
+        index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, qtype, faiss_metric)
+    elif index_type == 'ivfflat':
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss_metric)
+    elif index_type == 'ivfpq':
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, pq_nbits, faiss_metric)
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+    
+    index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    return index
+
+def index_metric(index) -> str:
+    """Return the METRICS name of a FAISS index"""
+    return 'cosine' if index.metric_type == faiss.METRIC_INNER_PRODUCT else 'l2'
+
+def index_kind(index) -> str:
+    """Return the INDEX_TYPES name of a FAISS index built by build_index"""
+    if isinstance(index, faiss.IndexIDMap2):
+        inner = faiss.downcast_index(index.index)
+        return 'hnsw' if isinstance(inner, faiss.IndexHNSW) else 'flat'
+    if isinstance(index, faiss.IndexIVFPQ):
+        return 'ivfpq'
+    if isinstance(index, faiss.IndexIVF):
+        return 'ivfflat'
+    return 'flat'
+
+def index_build_params(index) -> Dict:
+    """Return the build_index arguments (beyond type, metric and quantization) a FAISS index was built with"""
+    if isinstance(index, faiss.IndexIDMap2):
+        inner = faiss.downcast_index(index.index)
+        if isinstance(inner, faiss.IndexHNSW):
+            return {'hnsw_m': inner.hnsw.nb_neighbors(1), 'ef_construction': inner.hnsw.efConstruction}
+        return {}
+    if isinstance(index, faiss.IndexIVFPQ):
+        return {'nlist': index.nlist, 'pq_m': index.pq.M, 'pq_nbits': index.pq.nbits}
+    if isinstance(index, faiss.IndexIVF):
+        return {'nlist': index.nlist}
+    return {}
+
+def index_quantization(index) -> str:
+    """Return the QUANTIZATIONS name of a FAISS index built by build_index"""
+    if isinstance(index, faiss.IndexIDMap2):
+        index = faiss.downcast_index(index.index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return 'sqfp16' if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else 'sq8'
+    return 'none'
+
+def min_training_points(index_type: str, nlist: int, pq_nbits: int = 8) -> int:
+    """Fewest vectors FAISS accepts to train the given index type"""
+    if index_type == 'ivfflat':
+        return nlist
+    if index_type == 'ivfpq':
+        return max(nlist, 2 ** pq_nbits)
+    return 0
+
+def set_search_params(index, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+    """Apply runtime search knobs to a FAISS index built by build_index"""
+    if nprobe is not None and isinstance(index, faiss.IndexIVF):
+        index.nprobe = nprobe
+    if ef_search is not None and isinstance(index, faiss.IndexIDMap2):
+        inner = faiss.downcast_index(index.index)
+        if isinstance(inner, faiss.IndexHNSW):
+            inner.hnsw.efSearch = ef_search
+
+def saved_index_file(index_path: str) -> Optional[Path]:
+    """The FAISS file that a store saved at index_path loads from, if any"""
+    saved_dir = current_version(index_path.replace('.index', '_versions'))
+    if saved_dir is not None:
+        return saved_dir / INDEX_FILE
+    return Path(index_path) if Path(index_path).exists() else None
 
 class SimpleVectorStore:
-    """FAISS-based vector store for code embeddings"""
+    """FAISS-based vector store for code embeddings
+
+    index_type selects the FAISS layout: 'flat' (exact), 'ivfflat', 'ivfpq'
+    or 'hnsw'. IVF indexes are trained on the first train_size vectors added;
+    until then vectors are buffered and training is forced by search() or
+    save(). Stores too small to train an IVF index fall back to flat.
+    
+    metric='cosine' normalizes vectors on insert and query so search returns
+    true cosine similarities; 'l2' maps L2 distances to 1 / (1 + distance).
+    A loaded index keeps the metric, index type and build parameters it was
+    written with, whatever the constructor was given, until rebuild(...).
+    
+    quantization='sqfp16' or 'sq8' stores vectors at 2 or 1 bytes per
+    dimension instead of 4. rerank=N fetches N candidates per query and
+    re-scores them exactly against float32 copies kept in a memory-mapped
+    side file, which recovers most of the recall lost to quantization
+    (including ivfpq's) at the cost of that file on disk.
     
-    def __init__(self, dimension: int = 1536, index_path: Optional[str] = None):
+    mmap=True loads a saved index memory-mapped and read-only. Vectors and
+    metadata stay in the OS page cache, so worker processes serving the same
+    index share one copy and start without reading it into memory; such a
+    store raises RuntimeError on any change.
+    
+    save() writes the index and its metadata as a new version directory
+    under versions_dir and then atomically points versions_dir/CURRENT at
+    it, so a crash mid-save leaves the previous save loadable and never
+    pairs an index with another save's metadata.
+    """
+    
+    def __init__(self,
+                 dimension: int = 1536,
+                 index_path: Optional[str] = None,
+                 index_type: str = 'flat',
+                 metric: str = 'l2',
+                 nlist: int = 1024,
+                 pq_m: int = 16,
+                 pq_nbits: int = 8,
+                 hnsw_m: int = 32,
+                 ef_construction: int = 200,
+                 train_size: Optional[int] = None,
+                 nprobe: int = 16,
+                 ef_search: int = 64,
+                 brute_force_limit: int = 4096,
+                 mmap: bool = False,
+                 quantization: str = 'none',
+                 rerank: int = 0):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}")
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        
         self.dimension = dimension
         self.index_path = index_path or "vector_store.index"
+        # Committed versions of the index and its columnar metadata; the
+        # separate index file, metadata directory and pickle are only read
+        # from stores saved before versioned commits
+        self.versions_dir = index_path.replace('.index', '_versions') if index_path else "vector_store_versions"
+        self.metadata_dir = index_path.replace('.index', '_meta') if index_path else "vector_store_meta"
         self.metadata_path = index_path.replace('.index', '_metadata.pkl') if index_path else "vector_store_metadata.pkl"
+        # Float32 side file for re-ranking, in stores saved before versioned commits
+        self.vectors_dir = index_path.replace('.index', '_vectors') if index_path else "vector_store_vectors"
         
-        # Initialize FAISS index
-        self.index = faiss.IndexFlatL2(dimension)
-        self.id_to_chunk: Dict[int, CodeChunk] = {}
-        self.chunk_id_to_index: Dict[str, int] = {}
-        self.current_idx = 0
+        self.index_type = index_type
+        self.metric = metric
+        self.index_params = {
+            'nlist': nlist,
+            'pq_m': pq_m,
+            'pq_nbits': pq_nbits,
+            'hnsw_m': hnsw_m,
+            'ef_construction': ef_construction,
+            'quantization': quantization
+        }
+        self.train_size = train_size or 64 * nlist
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        # Filtered searches with at most this many candidates are scanned exactly
+        self.brute_force_limit = brute_force_limit
+        # Candidates per query re-scored against exact vectors (0 disables)
+        self.rerank = rerank
+        self._filter_cache: Dict[Tuple, Tuple[int, np.ndarray]] = {}
+        # Bumped on every change to the stored chunks, so callers can
+        # invalidate anything derived from search results
+        self.generation = 0
+        self.mmap = mmap
+        # Set once an index is loaded memory-mapped; writing to it would crash faiss
+        self.read_only = False
+        # Committed version directory last saved or loaded
+        self.saved_dir: Optional[Path] = None
         
-    def add_chunks(self, chunks: List[CodeChunk]):
-        """Add code chunks with their embeddings to the store"""
-        embeddings = []
-        valid_chunks = []
+        self.reset()
+    
+    def reset(self):
+        """Drop every stored chunk"""
+        self._check_writable()
+        # Vectors are keyed by stable_vector_id(chunk_id) so individual chunks
+        # can be replaced or removed in place
+        self.index = build_index(self.index_type, self.dimension, self.metric, **self.index_params)
+        set_search_params(self.index, self.nprobe, self.ef_search)
+        self.metadata = ChunkMetadataStore()
+        self.exact_vectors = ExactVectors(self.dimension) if self.rerank else None
+        # Vectors waiting for an untrained IVF index, keyed by id
+        self._pending: Dict[int, np.ndarray] = {}
+        # HNSW cannot remove vectors; removed ones stay in the graph until rebuild()
+        self._dead_vectors = 0
+        self.generation += 1
+    
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None):
+        """Tune recall vs latency at query time (IVF nprobe, HNSW efSearch)"""
+        if nprobe is not None:
+            self.nprobe = nprobe
+        if ef_search is not None:
+            self.ef_search = ef_search
+        set_search_params(self.index, self.nprobe, self.ef_search)
+    
+    def _check_writable(self):
+        if self.read_only:
+            raise RuntimeError(f"{self.index_path} was loaded read-only (mmap=True) and cannot be modified")
+    
+    @property
+    def ntotal(self) -> int:
+        """Number of live chunks in the store"""
+        return len(self.metadata)
         
+    def add_chunks(self, chunks: List[CodeChunk]):
+        """Add code chunks with their embeddings to the store
+
+        Chunks whose chunk_id is already stored replace the existing entry.
+        """
+        self._check_writable()
+        # Deduplicate by chunk_id, last occurrence wins
+        valid_chunks: Dict[str, CodeChunk] = {}
         for chunk in chunks:
             if chunk.embedding is not None:
-                embeddings.append(chunk.embedding)
-                valid_chunks.append(chunk)
+                valid_chunks[chunk.chunk_id] = chunk
         
-        if not embeddings:
+        if not valid_chunks:
             return
         
+        ids = np.array([stable_vector_id(chunk_id) for chunk_id in valid_chunks], dtype=np.int64)
+        
+        # Upsert: drop stale vectors for chunks that are being replaced
+        self._remove_ids([int(idx) for idx in ids if int(idx) in self.metadata])
+        
         # Convert to numpy array
-        embeddings_array = np.array(embeddings, dtype=np.float32)
+        embeddings_array = np.array([chunk.embedding for chunk in valid_chunks.values()], dtype=np.float32)
         
         # Add to FAISS index
-        self.index.add(embeddings_array)
+        self._add_vectors(embeddings_array, ids)
         
-        # Store metadata
-        for chunk in valid_chunks:
-            self.id_to_chunk[self.current_idx] = chunk
-            self.chunk_id_to_index[chunk.chunk_id] = self.current_idx
-            self.current_idx += 1
+        # Store metadata (without the embedding, which the index already holds)
+        for idx, chunk in zip(ids.tolist(), valid_chunks.values()):
+            self.metadata.add(idx, chunk)
+        self.generation += 1
     
-    def search(self, query_embedding: np.ndarray, k: int = 5) -> List[Tuple[CodeChunk, float]]:
+    def _add_vectors(self, vectors: np.ndarray, ids: np.ndarray):
+        """Add vectors to the index, buffering them while it is untrained"""
+        if self.metric == 'cosine':
+            vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+            faiss.normalize_L2(vectors)
+        if self.exact_vectors is not None:
+            self.exact_vectors.add(ids, vectors)
+        
+        if self.index.is_trained:
+            self.index.add_with_ids(vectors, ids)
+            return
+        
+        for idx, vector in zip(ids.tolist(), vectors):
+            self._pending[idx] = vector
+        
+        if len(self._pending) >= self.train_size:
+            self.train()
+    
+    def train(self):
+        """Train an IVF index on the first train_size buffered vectors and flush the buffer"""
+        if self.index.is_trained or not self._pending:
+            return
+        
+        ids = np.fromiter(self._pending.keys(), dtype=np.int64, count=len(self._pending))
+        vectors = np.stack(list(self._pending.values())).astype(np.float32)
+        self._pending = {}
+        
+        required = min_training_points(self.index_type, self.index_params['nlist'], self.index_params['pq_nbits'])
+        if len(vectors) < required:
+            logger.warning(
+                f"{len(vectors)} vectors are too few to train the {self.index_type} index "
+                f"(need {required}); using an exact flat index instead"
+            )
+            self.index = build_index('flat', self.dimension, self.metric)
+        else:
+            self.index.train(vectors[:self.train_size])
+            set_search_params(self.index, self.nprobe, self.ef_search)
+        
+        self.index.add_with_ids(vectors, ids)
+    
+    def get_vectors(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (ids, vectors) for every live chunk, reconstructed from the index"""
+        self.train()
+        ids = self.metadata.ids()
+        if len(ids) == 0:
+            return ids, np.zeros((0, self.dimension), dtype=np.float32)
+        if self.exact_vectors is not None:
+            # Quantized indexes only reconstruct approximations
+            vectors, found = self.exact_vectors.get(ids)
+            if found.all():
+                return ids, vectors
+        return ids, self.index.reconstruct_batch(ids)
+    
+    def rebuild(self, index_type: Optional[str] = None, metric: Optional[str] = None, **index_params):
+        """Re-create the index, optionally as a different type or metric, from the stored vectors
+
+        Also reclaims the space of vectors removed from an HNSW index, and is
+        the migration path from 'l2' stores to 'cosine'.
+        """
+        self._check_writable()
+        if index_type is not None and index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type: {index_type}")
+        if metric is not None and metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        
+        ids, vectors = self.get_vectors()
+        
+        self.index_type = index_type or self.index_type
+        self.metric = metric or self.metric
+        self.index_params.update(index_params)
+        if 'nlist' in index_params:
+            self.train_size = 64 * index_params['nlist']
+        
+        self.index = build_index(self.index_type, self.dimension, self.metric, **self.index_params)
+        set_search_params(self.index, self.nprobe, self.ef_search)
+        self._pending = {}
+        self._dead_vectors = 0
+        if self.exact_vectors is not None:
+            self.exact_vectors = ExactVectors(self.dimension)
+        self.generation += 1
+        
+        if len(ids):
+            self._add_vectors(vectors, ids)
+            self.train()
+    
+    def upsert_file(self, file_path: str, chunks: List[CodeChunk]):
+        """Replace every chunk of a file with a freshly parsed set"""
+        self.remove_file(file_path)
+        self.add_chunks(chunks)
+    
+    def remove_file(self, file_path: str) -> int:
+        """Remove all chunks that belong to a file, returning how many were dropped"""
+        return self._remove_ids(self.metadata.ids_for_file(file_path))
+    
+    def remove_chunks(self, chunk_ids: Iterable[str]) -> int:
+        """Remove chunks by chunk_id, returning how many were dropped"""
+        ids = [stable_vector_id(chunk_id) for chunk_id in chunk_ids]
+        return self._remove_ids([idx for idx in ids if idx in self.metadata])
+    
+    def _remove_ids(self, ids: List[int]) -> int:
+        """Drop vectors and metadata for the given FAISS ids"""
+        if not ids:
+            return 0
+        self._check_writable()
+        
+        for idx in ids:
+            self._pending.pop(idx, None)
+        
+        if index_kind(self.index) == 'hnsw':
+            # Searches skip ids without metadata; rebuild() reclaims the space
+            self._dead_vectors += len(ids)
+        else:
+            self.index.remove_ids(np.array(ids, dtype=np.int64))
+        if self.exact_vectors is not None:
+            self.exact_vectors.remove(ids)
+        
+        for idx in ids:
+            self.metadata.remove(idx)
+        self.generation += 1
+        
+        return len(ids)
+    
+    def search(self,
+               query_embedding: np.ndarray,
+               k: int = 5,
+               file_filter: Optional[List[str]] = None,
+               languages: Optional[List[str]] = None,
+               chunk_types: Optional[List[str]] = None) -> List[Tuple[CodeChunk, float]]:
         """Search for similar code chunks"""
-        if self.index.ntotal == 0:
-            return []
+        similarities, ids = self.search_batch(np.asarray(query_embedding)[np.newaxis, :], k,
+                                              file_filter, languages, chunk_types)
+        
+        # Chunks are materialized only for hits
+        return [(self.get_chunk(idx), similarity)
+                for idx, similarity in zip(ids[0].tolist(), similarities[0].tolist()) if idx != -1]
+    
+    def search_batch(self,
+                     query_embeddings: np.ndarray,
+                     k: int = 5,
+                     file_filter: Optional[List[str]] = None,
+                     languages: Optional[List[str]] = None,
+                     chunk_types: Optional[List[str]] = None,
+                     exclude: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Search many queries with one FAISS call
+
+        Filters restrict the search to matching chunks before ranking
+        (file_filter matches path substrings; languages and chunk_types match
+        exactly), so a filtered query still returns up to k hits. exclude is
+        a sorted array of ids left out the same way. Returns
+        (similarities, ids) arrays of shape (n_queries, k), best first; slots
+        without a live hit hold id -1 and similarity -inf.
+        """
+        n_queries = len(query_embeddings)
+        self.train()
+        if self.index.ntotal == 0 or n_queries == 0:
+            return self._empty_results(n_queries, k)
+        
+        queries = np.array(query_embeddings, dtype=np.float32).reshape(n_queries, self.dimension)
+        if self.metric == 'cosine':
+            faiss.normalize_L2(queries)
+        
+        # Over-fetch past vectors removed from HNSW but still in the graph,
+        # and enough candidates to re-rank
+        candidates = max(k, self.rerank)
+        fetch_k = min(candidates + self._dead_vectors, self.index.ntotal)
         
-        # Ensure query embedding is the right shape
-        query_embedding = np.array([query_embedding], dtype=np.float32)
+        metrics.inc('search_queries_total', n_queries)
+        excluding = exclude is not None and len(exclude) > 0
+        if file_filter or languages or chunk_types:
+            with metrics.timer('filter_seconds'):
+                allowed = self._filter_ids(file_filter, languages, chunk_types)
+                if excluding:
+                    allowed = allowed[~np.isin(allowed, exclude, assume_unique=True)]
+            if len(allowed) == 0:
+                return self._empty_results(n_queries, k)
+            with metrics.timer('faiss_search_seconds'):
+                if len(allowed) <= self.brute_force_limit:
+                    # Exact scan of a small candidate set beats any selector
+                    distances, ids = self._search_subset(queries, allowed, candidates)
+                else:
+                    selector = faiss.IDSelectorBatch(allowed)
+                    distances, ids = self.index.search(queries, fetch_k, params=self._search_parameters(selector))
+        elif excluding:
+            with metrics.timer('faiss_search_seconds'):
+                # IDSelectorNot does not own the batch selector; keep it referenced
+                excluded = faiss.IDSelectorBatch(exclude)
+                selector = faiss.IDSelectorNot(excluded)
+                distances, ids = self.index.search(queries, fetch_k, params=self._search_parameters(selector))
+        else:
+            with metrics.timer('faiss_search_seconds'):
+                distances, ids = self.index.search(queries, fetch_k)
         
-        # Search
-        distances, indices = self.index.search(query_embedding, min(k, self.index.ntotal))
+        if self.exact_vectors is not None:
+            with metrics.timer('rerank_seconds'):
+                distances, ids = self.exact_vectors.rerank(queries, distances, ids, self.metric)
         
-        # Return chunks with distances
-        results = []
-        for idx, distance in zip(indices[0], distances[0]):
-            if idx != -1 and idx in self.id_to_chunk:
-                chunk = self.id_to_chunk[idx]
-                # Convert L2 distance to similarity score (0-1)
-                similarity = 1 / (1 + distance)
-                results.append((chunk, similarity))
+        similarities = self._similarity(distances).astype(np.float32)
+        
+        valid = ids != -1
+        if self._dead_vectors:
+            valid &= self.metadata.contains_many(ids)
+            # An upserted HNSW id can appear twice (old and new vector)
+            for row in range(n_queries):
+                _, first = np.unique(ids[row], return_index=True)
+                duplicate = np.ones(ids.shape[1], dtype=bool)
+                duplicate[first] = False
+                valid[row] &= ~duplicate
+        
+        # Move live hits to the front of each row, keeping similarity order
+        order = np.argsort(~valid, axis=1, kind='stable')[:, :k]
+        ids = np.take_along_axis(ids, order, axis=1)
+        similarities = np.take_along_axis(similarities, order, axis=1)
+        valid = np.take_along_axis(valid, order, axis=1)
+        ids[~valid] = -1
+        similarities[~valid] = -np.inf
+        
+        if ids.shape[1] < k:
+            padded_similarities, padded_ids = self._empty_results(n_queries, k)
+            padded_similarities[:, :ids.shape[1]] = similarities
+            padded_ids[:, :ids.shape[1]] = ids
+            return padded_similarities, padded_ids
+        
+        return similarities, ids
+    
+    def _empty_results(self, n_queries: int, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return np.full((n_queries, k), -np.inf, dtype=np.float32), np.full((n_queries, k), -1, dtype=np.int64)
+    
+    def _filter_ids(self,
+                    file_filter: Optional[List[str]],
+                    languages: Optional[List[str]],
+                    chunk_types: Optional[List[str]]) -> np.ndarray:
+        """Resolve filters to allowed ids, reusing the result until the metadata changes"""
+        key = (tuple(file_filter or ()), tuple(languages or ()), tuple(chunk_types or ()))
+        cached = self._filter_cache.get(key)
+        if cached is not None and cached[0] == self.generation:
+            return cached[1]
         
-        return results
+        allowed = self.metadata.filter_ids(file_filter, languages, chunk_types)
+        if len(self._filter_cache) >= 64:
+            self._filter_cache.clear()
+        self._filter_cache[key] = (self.generation, allowed)
+        return allowed
+    
+    def _search_subset(self, queries: np.ndarray, allowed: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact search restricted to the allowed ids"""
+        subset = faiss.IndexFlat(self.dimension, METRICS[self.metric])
+        subset.add(self.index.reconstruct_batch(allowed))
+        distances, positions = subset.search(queries, min(k, len(allowed)))
+        ids = np.where(positions == -1, -1, allowed[positions])
+        return distances, ids
+    
+    def _search_parameters(self, selector):
+        """Search parameters carrying an id selector and the current knobs"""
+        kind = index_kind(self.index)
+        if kind in ('ivfflat', 'ivfpq'):
+            return faiss.SearchParametersIVF(sel=selector, nprobe=self.nprobe)
+        if kind == 'hnsw':
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=self.ef_search)
+        return faiss.SearchParameters(sel=selector)
+    
+    def get_chunk(self, idx: int) -> Optional[CodeChunk]:
+        """Materialize the chunk stored under a vector id"""
+        return self.metadata.get(idx)
+    
+    def _similarity(self, distances: np.ndarray) -> np.ndarray:
+        """Convert FAISS distances into similarity scores"""
+        if self.metric == 'cosine':
+            # Inner product of unit vectors is the cosine similarity
+            return distances
+        # Convert L2 distance to similarity score (0-1)
+        return 1 / (1 + distances)
     
     def save(self):
         """Persist the vector store to disk"""
-        # Save FAISS index
-        faiss.write_index(self.index, self.index_path)
+        self._check_writable()
+        self.train()
+        if self._dead_vectors > 0.2 * max(1, self.index.ntotal):
+            self.rebuild()
+        
+        # The index, its metadata and exact vectors are committed together as
+        # one new version, so a crash leaves the previous set intact. Files
+        # of replaced versions stay readable to processes that mapped them
+        def write(version_dir: Path):
+            faiss.write_index(self.index, str(version_dir / INDEX_FILE))
+            # The configured layout is saved too: a small IVF store is
+            # written as the flat index it fell back to until it can train
+            self.metadata.write(version_dir / METADATA_DIR, {
+                'dead_vectors': self._dead_vectors,
+                'index_type': self.index_type,
+                'index_params': self.index_params,
+                'train_size': self.train_size,
+            })
+            if self.exact_vectors is not None:
+                self.exact_vectors.write(version_dir / VECTORS_DIR)
         
-        # Save metadata
-        with open(self.metadata_path, 'wb') as f:
-            pickle.dump({
-                'id_to_chunk': self.id_to_chunk,
-                'chunk_id_to_index': self.chunk_id_to_index,
-                'current_idx': self.current_idx
-            }, f)
+        saved_dir = commit_version(self.versions_dir, write)
+        self.metadata.load(str(saved_dir / METADATA_DIR))
+        if self.exact_vectors is not None:
+            self.exact_vectors.load(str(saved_dir / VECTORS_DIR))
+        self.saved_dir = saved_dir
+        self._remove_unversioned_files()
+    
+    def _remove_unversioned_files(self):
+        """Drop the loose files of a store saved before versioned commits"""
+        Path(self.index_path).unlink(missing_ok=True)
+        shutil.rmtree(self.metadata_dir, ignore_errors=True)
+        shutil.rmtree(self.vectors_dir, ignore_errors=True)
     
     def load(self):
         """Load vector store from disk"""
-        if Path(self.index_path).exists() and Path(self.metadata_path).exists():
-            # Load FAISS index
-            self.index = faiss.read_index(self.index_path)
-            
-            # Load metadata
+        saved_dir = current_version(self.versions_dir)
+        if saved_dir is not None:
+            index = self._read_index(str(saved_dir / INDEX_FILE))
+            attributes = self.metadata.load(str(saved_dir / METADATA_DIR))
+            self._adopt_index(index, attributes)
+            self._load_exact_vectors(saved_dir / VECTORS_DIR)
+            self._dead_vectors = attributes.get('dead_vectors', 0)
+            self.saved_dir = saved_dir
+            self.read_only = self.mmap
+            return True
+        
+        if not Path(self.index_path).exists():
+            return False
+        
+        if Path(self.metadata_dir).exists():
+            index = self._read_index(self.index_path)
+            attributes = self.metadata.load(self.metadata_dir)
+            self._adopt_index(index, attributes)
+            self._load_exact_vectors(Path(self.vectors_dir))
+            self._dead_vectors = attributes.get('dead_vectors', 0)
+            self.read_only = self.mmap
+            return True
+        
+        if Path(self.metadata_path).exists():
+            # Stores saved before the columnar layout pickled their metadata;
+            # they are migrated in memory, so they are never memory-mapped
+            index = faiss.read_index(self.index_path)
             with open(self.metadata_path, 'rb') as f:
                 metadata = pickle.load(f)
-                self.id_to_chunk = metadata['id_to_chunk']
-                self.chunk_id_to_index = metadata['chunk_id_to_index']
-                self.current_idx = metadata['current_idx']
             
+            if 'file_to_ids' not in metadata:
+                # Stores written before stable ids used sequential positions
+                self._migrate_sequential_index(index, metadata['id_to_chunk'])
+                return True
+            
+            self.metadata = ChunkMetadataStore()
+            for idx, chunk in metadata['id_to_chunk'].items():
+                self.metadata.add(idx, chunk)
+            self._adopt_index(index)
+            self._dead_vectors = metadata.get('dead_vectors', 0)
             return True
+        
         return False
+    
+    def _read_index(self, path: str):
+        """Read a saved FAISS index, memory-mapped when mmap=True"""
+        if not self.mmap:
+            return faiss.read_index(path)
+        # IO_FLAG_MMAP_IFC maps the flat, HNSW and IVF storage in place; older
+        # faiss releases only map IVF inverted lists (IO_FLAG_MMAP)
+        flags = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        return faiss.read_index(path, flags)
+    
+    def _load_exact_vectors(self, directory: Path):
+        if self.exact_vectors is None:
+            return
+        if directory.exists():
+            self.exact_vectors.load(str(directory))
+        elif self.index.ntotal:
+            logger.warning(f"{self.index_path} was saved without exact vectors; "
+                           f"its results are not re-ranked until the store is rebuilt")
+    
+    def _adopt_index(self, index, attributes: Optional[Dict] = None):
+        """Install a loaded FAISS index, with the layout it was saved with
+
+        Stores saved without their layout take it from the index itself,
+        so later rebuilds (compaction, reset) keep an HNSW or IVF store one.
+        """
+        attributes = attributes or {}
+        self.index = index
+        self.metric = index_metric(index)
+        if 'index_type' in attributes:
+            self.index_type = attributes['index_type']
+            self.index_params.update(attributes['index_params'])
+            self.train_size = attributes['train_size']
+        else:
+            self.index_type = index_kind(index)
+            self.index_params.update(index_build_params(index))
+            if 'nlist' in self.index_params and self.index_type in ('ivfflat', 'ivfpq'):
+                self.train_size = 64 * self.index_params['nlist']
+        self.index_params['quantization'] = index_quantization(index)
+        set_search_params(self.index, self.nprobe, self.ef_search)
+        self._pending = {}
+        self.generation += 1
+    
+    def _migrate_sequential_index(self, index, id_to_chunk: Dict[int, CodeChunk]):
+        """Rebuild a sequentially numbered flat index under stable chunk ids
+
+        The rebuilt index keeps the saved index's metric, whatever metric
+        this store was constructed with, so results do not change.
+        """
+        vectors = index.reconstruct_n(0, index.ntotal) if index.ntotal else np.zeros((0, self.dimension), dtype=np.float32)
+        
+        chunks = []
+        for position, chunk in sorted(id_to_chunk.items()):
+            chunk.embedding = vectors[position]
+            chunks.append(chunk)
+        
+        self.metric = index_metric(index)
+        self.reset()
+        self.add_chunks(chunks)
@@ -0,0 +1,67 @@
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Callable, Optional
+
+# Names the committed version inside a versioned directory
+POINTER_FILE = 'CURRENT'
+
+_VERSION = re.compile(r'^v(\d+)(\.tmp)?$')
+
+
+def current_version(root) -> Optional[Path]:
+    """The committed version directory under root, or None if nothing was committed"""
+    pointer = Path(root) / POINTER_FILE
+    if not pointer.exists():
+        return None
+    return Path(root) / pointer.read_text().strip()
+
+
+def _fsync_tree(directory: Path):
+    for path in directory.rglob('*'):
+        if path.is_file():
+            with open(path, 'rb') as f:
+                os.fsync(f.fileno())
+
+
+def commit_version(root, write: Callable[[Path], None], keep: int = 2) -> Path:
+    """Write a new version of a directory of files and atomically make it current
+
+    write() fills a fresh, empty directory; once it returns, the directory
+    is renamed to its final name and root/CURRENT is replaced to point at
+    it. A crash at any point leaves the previously committed version in
+    place, and loaders never see a partly written one. The newest `keep`
+    versions are kept so readers that just read the pointer can still open
+    theirs; older ones and leftovers from interrupted writes are removed.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    numbers = [int(match.group(1)) for match in map(_VERSION.match, os.listdir(root)) if match]
+    name = f"v{max(numbers, default=0) + 1:06d}"
+
+    tmp_dir = root / f"{name}.tmp"
+    tmp_dir.mkdir()
+    try:
+        write(tmp_dir)
+        _fsync_tree(tmp_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    os.rename(tmp_dir, root / name)
+
+    tmp_pointer = root / f"{POINTER_FILE}.tmp"
+    with open(tmp_pointer, 'w') as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_pointer, root / POINTER_FILE)
+
+    # Files that readers still map stay readable until they close them
+    committed = sorted((entry for entry in os.listdir(root) if _VERSION.match(entry)
+                        and not entry.endswith('.tmp')), reverse=True)
+    stale = committed[keep:] + [entry for entry in os.listdir(root)
+                                if entry.endswith('.tmp') and _VERSION.match(entry)]
+    for entry in stale:
+        shutil.rmtree(root / entry, ignore_errors=True)
+    return root / name
@@ -0,0 +1,119 @@
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+
+class AIMDController:
+    """Additive-increase / multiplicative-decrease limit shared across threads
+
+    Every success raises the limit by `increase` up to `maximum`; every
+    throttle multiplies it by `decrease` down to `minimum`. Used both for
+    the number of in-flight requests and for the tokens packed per request.
+    """
+
+    def __init__(self, initial: float, minimum: float, maximum: float,
+                 increase: float = 1.0, decrease: float = 0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self._value = max(minimum, min(initial, maximum))
+        self._lock = threading.Lock()
+
+    @property
+    def value(self) -> float:
+        return self._value
+
+    @property
+    def limit(self) -> int:
+        return max(1, int(self._value))
+
+    def on_success(self):
+        with self._lock:
+            self._value = min(self.maximum, self._value + self.increase)
+
+    def on_throttle(self):
+        with self._lock:
+            self._value = max(self.minimum, self._value * self.decrease)
+
+
+@dataclass
+class EmbeddingStats:
+    """Progress and throughput counters of an EmbeddingGenerator"""
+    requests: int = 0
+    texts: int = 0
+    tokens: int = 0
+    # Sub-batches sent again after a 429 or a transient failure
+    retries: int = 0
+    throttled: int = 0
+    failures: int = 0
+    # Wall time spent inside batch calls
+    seconds: float = 0.0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record_request(self, texts: int, tokens: int):
+        with self._lock:
+            self.requests += 1
+            self.texts += texts
+            self.tokens += tokens
+
+    def record_retry(self, throttled: bool):
+        with self._lock:
+            self.retries += 1
+            if throttled:
+                self.throttled += 1
+            else:
+                self.failures += 1
+
+    def record_time(self, seconds: float):
+        with self._lock:
+            self.seconds += seconds
+
+    @property
+    def texts_per_second(self) -> float:
+        return self.texts / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def tokens_per_second(self) -> float:
+        return self.tokens / self.seconds if self.seconds > 0 else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            'requests': self.requests,
+            'texts': self.texts,
+            'tokens': self.tokens,
+            'retries': self.retries,
+            'throttled': self.throttled,
+            'failures': self.failures,
+            'seconds': self.seconds,
+            'texts_per_second': self.texts_per_second,
+            'tokens_per_second': self.tokens_per_second
+        }
+
+
+class Backoff:
+    """Shared pause after throttling: exponential in consecutive 429s, reset on success"""
+
+    def __init__(self, base: float = 0.5, maximum: float = 30.0):
+        self.base = base
+        self.maximum = maximum
+        self._consecutive = 0
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def throttled(self, retry_after: Optional[float] = None):
+        with self._lock:
+            self._consecutive += 1
+            delay = retry_after if retry_after else min(self.maximum, self.base * 2 ** (self._consecutive - 1))
+            self._resume_at = max(self._resume_at, time.monotonic() + delay)
+
+    def succeeded(self):
+        with self._lock:
+            self._consecutive = 0
+
+    def wait(self):
+        """Sleep until the current pause (if any) is over"""
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
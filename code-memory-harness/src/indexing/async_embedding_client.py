@@ -0,0 +1,183 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+import numpy as np
+from tenacity import retry, stop_after_attempt, wait_exponential
+
+from src.indexing.embedding_generator import EmbeddingGenerator
+
+
+class TokenBucket:
+    """Async token-bucket rate limiter
+
+    Tokens refill continuously at `rate` per second up to `capacity`, so
+    bursts up to the capacity go out immediately and sustained traffic is
+    held to the rate without fixed sleeps between requests.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        """Wait until `tokens` are available and take them"""
+        tokens = min(tokens, self.capacity)
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+
+class AsyncEmbeddingClient:
+    """Non-blocking embedding calls on top of an EmbeddingGenerator
+
+    Reuses the generator's provider settings, local model and embedding
+    cache. OpenAI requests use the async API, are capped at
+    `max_concurrency` in flight and paced by a token bucket of
+    `requests_per_second`; local models run in the default thread pool.
+
+    Requests share the generator's adaptive limits and counters: 429s
+    shrink its batch_tokens and concurrency limits (which also cap the
+    batches and in-flight requests sent here), and requests, retries and
+    time are recorded in its EmbeddingStats.
+    """
+
+    def __init__(self,
+                 embedding_generator: EmbeddingGenerator,
+                 max_concurrency: int = 4,
+                 requests_per_second: float = 10.0,
+                 burst: Optional[float] = None):
+        self.embedding_generator = embedding_generator
+        self.rate_limiter = TokenBucket(requests_per_second, burst)
+        self.max_concurrency = max_concurrency
+        self._in_flight = 0
+        self._slots: Optional[asyncio.Condition] = None
+
+    @property
+    def provider(self) -> str:
+        return self.embedding_generator.provider
+
+    @property
+    def model_name(self) -> str:
+        return self.embedding_generator.model_name
+
+    @property
+    def dimension(self) -> int:
+        return self.embedding_generator.dimension
+
+    def _concurrency_limit(self) -> int:
+        return min(self.max_concurrency, self.embedding_generator.concurrency.limit)
+
+    @asynccontextmanager
+    async def _slot(self):
+        """Hold one of the in-flight request slots"""
+        # Created lazily so the condition binds to the running loop
+        if self._slots is None:
+            self._slots = asyncio.Condition()
+        async with self._slots:
+            await self._slots.wait_for(lambda: self._in_flight < self._concurrency_limit())
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            async with self._slots:
+                self._in_flight -= 1
+                self._slots.notify_all()
+
+    async def generate_embedding(self, text: str) -> np.ndarray:
+        """Embed a single text"""
+        return (await self.generate_embeddings_batch([text]))[0]
+
+    async def generate_embeddings_batch(self, texts: List[str], batch_size: Optional[int] = None,
+                                        persist: bool = True) -> List[np.ndarray]:
+        """Embed many texts, sending token-packed provider batches concurrently
+
+        persist=False (query embeddings) reads the cache without writing to it.
+        """
+        if not texts:
+            return []
+
+        cache = self.embedding_generator.cache
+        if cache is not None:
+            cached = await asyncio.to_thread(cache.get_many, self.provider, self.model_name, texts)
+        else:
+            cached = {}
+
+        # Embed each distinct missing text once
+        missing: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            if i not in cached:
+                missing.setdefault(text, []).append(i)
+
+        if missing:
+            missing_texts = list(missing)
+            if self.provider == "local":
+                batches = [(missing_texts, 0)]
+            else:
+                batches = self.embedding_generator.token_batches(missing_texts, batch_size)
+            start_time = time.perf_counter()
+            try:
+                batches = await asyncio.gather(*[self._embed_batch(batch, tokens) for batch, tokens in batches])
+            finally:
+                if self.provider != "local":
+                    self.embedding_generator.stats.record_time(time.perf_counter() - start_time)
+            new_embeddings = [embedding for batch in batches for embedding in batch]
+
+            if cache is not None and persist:
+                await asyncio.to_thread(cache.put_many, self.provider, self.model_name,
+                                        missing_texts, new_embeddings)
+            for text, embedding in zip(missing_texts, new_embeddings):
+                for i in missing[text]:
+                    cached[i] = embedding
+
+        return [cached[i] for i in range(len(texts))]
+
+    async def _embed_batch(self, texts: List[str], tokens: int) -> List[np.ndarray]:
+        """Call the provider for one batch"""
+        if self.provider == "local":
+            return await asyncio.to_thread(self.embedding_generator._embed_batch, texts)
+
+        async with self._slot():
+            return await self._request(texts, tokens)
+
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+    async def _request(self, texts: List[str], tokens: int) -> List[np.ndarray]:
+        import openai
+        generator = self.embedding_generator
+        await self.rate_limiter.acquire()
+        try:
+            response = await openai.Embedding.acreate(
+                input=texts,
+                model=self.model_name,
+                api_key=generator.api_key,
+                api_base=generator.api_base
+            )
+        except openai.error.RateLimitError:
+            generator.stats.record_retry(throttled=True)
+            generator.batch_tokens.on_throttle()
+            generator.concurrency.on_throttle()
+            raise
+        except (openai.error.APIError, openai.error.Timeout, openai.error.APIConnectionError,
+                openai.error.ServiceUnavailableError):
+            generator.stats.record_retry(throttled=False)
+            raise
+
+        generator.stats.record_request(len(texts), tokens)
+        generator.batch_tokens.on_success()
+        generator.concurrency.on_success()
+        # Responses carry an index per input; do not rely on their order
+        data = sorted(response['data'], key=lambda item: item.get('index', 0))
+        return [np.array(item['embedding'], dtype=np.float32) for item in data]
@@ -1,17 +1,93 @@
 import ast
+import hashlib
 import os
-from typing import List, Optional, Tuple
+import time
+from typing import Dict, List, Optional, Tuple, Union
 from pathlib import Path
 import re
 
+from src.core.tokenizer import get_encoding
 from src.core.vector_store import CodeChunk
+from src.indexing.tree_sitter_chunker import TreeSitterChunker
+from src.monitoring.metrics import metrics
+
+# Definition patterns for the regex fallback, compiled once. Prefixes that
+# could only widen a match are left out so long lines do not backtrack.
+_FUNCTION_PATTERNS = {
+    'javascript': re.compile(r'(function\s+\w+|const\s+\w+\s*=\s*\(|class\s+\w+)'),
+    'typescript': re.compile(r'(function\s+\w+|const\s+\w+\s*=\s*\(|class\s+\w+)'),
+    'java': re.compile(r'(class|interface|void|int|String)'),
+    'go': re.compile(r'func\s+(\(\w+\s+\*?\w+\))?\s*\w+'),
+    'rust': re.compile(r'(fn\s+\w+|struct\s+\w+|impl\s+\w+)'),
+    'c': re.compile(r'\w\s*\([^)]*\)\s*{'),
+    'cpp': re.compile(r'(class\s+\w+|\w\s*\([^)]*\)\s*{)')
+}
+
+
+def record_parse(chunks: List[CodeChunk], seconds: float):
+    """Record one parsed file in metrics, wherever it was parsed"""
+    metrics.observe('parse_seconds', seconds)
+    metrics.inc('parsed_files_total')
+    metrics.inc('parsed_chunks_total', len(chunks))
+
+
+class _DefinitionCollector(ast.NodeVisitor):
+    """Collect class and function definitions with qualified names in one pass
+
+    Names follow __qualname__: methods are "Class.method" and functions
+    nested in a function are "outer.<locals>.inner".
+    """
+    
+    def __init__(self):
+        self.definitions: List[Tuple[ast.AST, str]] = []
+        self._scope: List[str] = []
+    
+    def _visit_definition(self, node: ast.AST, scope_suffix: Optional[str]):
+        qualified_name = '.'.join(self._scope + [node.name])
+        self.definitions.append((node, qualified_name))
+        
+        self._scope.append(node.name if scope_suffix is None else f"{node.name}.{scope_suffix}")
+        self.generic_visit(node)
+        self._scope.pop()
+    
+    def visit_ClassDef(self, node: ast.ClassDef):
+        self._visit_definition(node, None)
+    
+    def visit_FunctionDef(self, node: ast.FunctionDef):
+        self._visit_definition(node, '<locals>')
+    
+    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef):
+        self._visit_definition(node, '<locals>')
+
+
+# 'overlapping' emits definitions plus overlapping blocks over the whole file;
+# 'minimal' covers each line once, definitions first and blocks for the gaps
+CHUNK_MODES = ('overlapping', 'minimal')
+
 
 class CodeParser:
     """Parse code files into semantic chunks"""
     
-    def __init__(self, chunk_size: int = 50, overlap: int = 10):
+    def __init__(self,
+                 chunk_size: int = 50,
+                 overlap: int = 10,
+                 use_tree_sitter: bool = True,
+                 chunk_mode: str = 'overlapping',
+                 max_tokens: Optional[int] = None,
+                 tokenizer_model: str = "text-embedding-ada-002"):
+        if chunk_mode not in CHUNK_MODES:
+            raise ValueError(f"Unknown chunk mode: {chunk_mode}")
         self.chunk_size = chunk_size
         self.overlap = overlap
+        self.chunk_mode = chunk_mode
+        # Optional hard cap on chunk size in tokens, so long-line and minified
+        # files cannot produce chunks beyond the embedding model's input limit
+        self.max_tokens = max_tokens
+        self.tokenizer_model = tokenizer_model
+        # Grammar-based definitions for non-Python languages; each language
+        # without an installed grammar falls back to the regex patterns
+        tree_sitter_overlap = overlap if chunk_mode == 'overlapping' else 0
+        self.tree_sitter = TreeSitterChunker(chunk_size, tree_sitter_overlap) if use_tree_sitter else None
         self.supported_extensions = {
             '.py': 'python',
             '.js': 'javascript',
@@ -25,24 +101,109 @@ class CodeParser:
     
     def parse_file(self, file_path: str) -> List[CodeChunk]:
         """Parse a single file into code chunks"""
+        chunks, seconds, _ = self.parse_file_timed(file_path)
+        if seconds is not None:
+            record_parse(chunks, seconds)
+        return chunks
+    
+    def parse_file_timed(self, file_path: str) -> Tuple[List[CodeChunk], Optional[float], Optional[Dict]]:
+        """Parse a file, also returning the wall seconds spent reading and chunking it
+        and the fingerprint of the bytes parsed
+
+        The fingerprint (mtime, size, sha256, as IncrementalIndexer records
+        them) is stat'ed from the open file before it is read, so an edit
+        made while or after it is parsed always changes it. Seconds and
+        fingerprint are None for files that were skipped (unsupported or
+        unreadable). Nothing is recorded in metrics, so worker processes
+        can send the time back for the parent to record with record_parse().
+        """
         path = Path(file_path)
         
         if path.suffix not in self.supported_extensions:
-            return []
+            return [], None, None
         
         language = self.supported_extensions[path.suffix]
+        start = time.perf_counter()
         
         try:
-            content = path.read_text(encoding='utf-8')
+            with open(path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                data = f.read()
+            # Universal newlines, as read_text() would translate them
+            content = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
         except:
-            return []
+            return [], None, None
+        fingerprint = {
+            'mtime': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'sha256': hashlib.sha256(data).hexdigest()
+        }
         
         # Use language-specific parser
         if language == 'python':
-            return self._parse_python(content, file_path)
+            chunks = self._parse_python(content, file_path)
         else:
-            # Fallback to line-based chunking for other languages
-            return self._parse_generic(content, file_path, language)
+            chunks = self._parse_generic(content, file_path, language)
+        
+        if self.max_tokens:
+            chunks = self._apply_token_budget(chunks)
+        return chunks, time.perf_counter() - start, fingerprint
+    
+    def _apply_token_budget(self, chunks: List[CodeChunk]) -> List[CodeChunk]:
+        """Split every chunk longer than max_tokens into pieces that fit"""
+        encoding = get_encoding(self.tokenizer_model)
+        bounded = []
+        for chunk in chunks:
+            # A token spans at least one byte, so short chunks always fit
+            if len(chunk.content.encode('utf-8')) <= self.max_tokens:
+                bounded.append(chunk)
+                continue
+            if len(encoding.encode_ordinary(chunk.content)) <= self.max_tokens:
+                bounded.append(chunk)
+                continue
+            bounded.extend(self._split_chunk(chunk, encoding))
+        return bounded
+    
+    def _split_chunk(self, chunk: CodeChunk, encoding) -> List[CodeChunk]:
+        """Pack whole lines into pieces of at most max_tokens, cutting single oversized lines by token"""
+        lines = chunk.content.split('\n')
+        line_tokens = encoding.encode_ordinary_batch(lines)
+        pieces: List[Tuple[int, int, str]] = []  # (first line, last line, content), lines relative to the chunk
+        
+        current: List[str] = []
+        current_start = 0
+        current_tokens = 0
+        for i, (line, tokens) in enumerate(zip(lines, line_tokens)):
+            # +1 for the newline joining it to the previous line
+            cost = len(tokens) + 1
+            if current and current_tokens + cost > self.max_tokens:
+                pieces.append((current_start, i - 1, '\n'.join(current)))
+                current, current_tokens = [], 0
+            
+            if cost > self.max_tokens:
+                for start in range(0, len(tokens), self.max_tokens):
+                    pieces.append((i, i, encoding.decode(tokens[start:start + self.max_tokens])))
+                continue
+            
+            if not current:
+                current_start = i
+            current.append(line)
+            current_tokens += cost
+        if current:
+            pieces.append((current_start, len(lines) - 1, '\n'.join(current)))
+        
+        return [
+            CodeChunk(
+                content=content,
+                file_path=chunk.file_path,
+                start_line=chunk.start_line + first,
+                end_line=chunk.start_line + last,
+                chunk_type=chunk.chunk_type,
+                language=chunk.language,
+                name=chunk.name
+            )
+            for first, last, content in pieces if content.strip()
+        ]
     
     def _parse_python(self, content: str, file_path: str) -> List[CodeChunk]:
         """Parse Python code using AST"""
@@ -54,6 +215,16 @@ class CodeParser:
             # If AST parsing fails, fall back to generic parsing
             return self._parse_generic(content, file_path, 'python')
         
+        # Split once; every chunk slices the same line list
+        lines = content.split('\n')
+        
+        # Extract classes, functions and methods in a single pass
+        collector = _DefinitionCollector()
+        collector.visit(tree)
+        
+        if self.chunk_mode == 'minimal':
+            return self._minimal_python_chunks(collector.definitions, lines, file_path)
+        
         # Extract module-level docstring
         module_docstring = ast.get_docstring(tree)
         if module_docstring:
@@ -66,23 +237,15 @@ class CodeParser:
                 language='python'
             ))
         
-        # Extract classes and functions
-        for node in ast.walk(tree):
+        for node, qualified_name in collector.definitions:
             if isinstance(node, ast.ClassDef):
-                chunk = self._extract_class_chunk(node, content, file_path)
-                if chunk:
-                    chunks.append(chunk)
-                    
-            elif isinstance(node, ast.FunctionDef):
-                # Only top-level functions (not methods)
-                if not any(isinstance(parent, ast.ClassDef) for parent in ast.walk(tree) 
-                          if hasattr(parent, 'body') and node in parent.body):
-                    chunk = self._extract_function_chunk(node, content, file_path)
-                    if chunk:
-                        chunks.append(chunk)
+                chunk = self._extract_class_chunk(node, lines, file_path, qualified_name)
+            else:
+                chunk = self._extract_function_chunk(node, lines, file_path, qualified_name)
+            if chunk:
+                chunks.append(chunk)
         
         # Also add reasonable-sized code blocks
-        lines = content.split('\n')
         for i in range(0, len(lines), self.chunk_size - self.overlap):
             end = min(i + self.chunk_size, len(lines))
             chunk_content = '\n'.join(lines[i:end])
@@ -102,18 +265,86 @@ class CodeParser:
         
         return chunks
     
-    def _extract_class_chunk(self, node: ast.ClassDef, content: str, file_path: str) -> Optional[CodeChunk]:
-        """Extract a class definition as a chunk"""
-        lines = content.split('\n')
+    def _minimal_python_chunks(self,
+                               definitions: List[Tuple[ast.AST, str]],
+                               lines: List[str],
+                               file_path: str) -> List[CodeChunk]:
+        """Coverage-minimal chunks: outermost definitions that fit, blocks for the rest
+
+        A definition longer than chunk_size is replaced by its nested
+        definitions when it has any (its own remaining lines become blocks),
+        and otherwise split into consecutive windows.
+        """
+        chunks = []
+        covered_until = 0
         
-        # Get the class definition and its immediate methods
-        start_line = node.lineno - 1
-        end_line = start_line
+        # Definitions arrive in pre-order, so nested ones follow their parent
+        for i, (node, qualified_name) in enumerate(definitions):
+            start = min([node.lineno] + [d.lineno for d in node.decorator_list]) - 1
+            end = getattr(node, 'end_lineno', None) or node.lineno
+            if start < covered_until:
+                continue
+            
+            has_nested = i + 1 < len(definitions) and definitions[i + 1][0].lineno <= end
+            if end - start > self.chunk_size and has_nested:
+                continue
+            
+            chunk_type = 'class' if isinstance(node, ast.ClassDef) else 'function'
+            for window_start in range(start, end, self.chunk_size):
+                window_end = min(window_start + self.chunk_size, end)
+                chunks.append(CodeChunk(
+                    content='\n'.join(lines[window_start:window_end]),
+                    file_path=file_path,
+                    start_line=window_start + 1,
+                    end_line=window_end,
+                    chunk_type=chunk_type,
+                    language='python',
+                    name=qualified_name
+                ))
+            covered_until = end
         
-        # Find the end of the class
-        for child in node.body:
-            if hasattr(child, 'lineno'):
-                end_line = max(end_line, getattr(child, 'end_lineno', child.lineno))
+        return self._cover_gaps(chunks, lines, file_path, 'python')
+    
+    def _cover_gaps(self, chunks: List[CodeChunk], lines: List[str], file_path: str, language: str) -> List[CodeChunk]:
+        """Add non-overlapping blocks for the lines no chunk covers"""
+        covered = [False] * len(lines)
+        for chunk in chunks:
+            covered[chunk.start_line - 1:chunk.end_line] = [True] * (chunk.end_line - chunk.start_line + 1)
+        
+        blocks = []
+        i = 0
+        while i < len(lines):
+            if covered[i]:
+                i += 1
+                continue
+            # Each gap is cut into blocks of at most chunk_size lines
+            end = i
+            while end < len(lines) and not covered[end] and end - i < self.chunk_size:
+                end += 1
+            chunk_content = '\n'.join(lines[i:end])
+            
+            # Skip gaps that are only blank lines or stray brackets
+            if len(chunk_content.strip()) >= 10:
+                blocks.append(CodeChunk(
+                    content=chunk_content,
+                    file_path=file_path,
+                    start_line=i + 1,
+                    end_line=end,
+                    chunk_type='block',
+                    language=language
+                ))
+            i = end
+        
+        return sorted(chunks + blocks, key=lambda chunk: chunk.start_line)
+    
+    def _extract_class_chunk(self,
+                             node: ast.ClassDef,
+                             lines: List[str],
+                             file_path: str,
+                             qualified_name: Optional[str] = None) -> Optional[CodeChunk]:
+        """Extract a class definition as a chunk"""
+        start_line = node.lineno - 1
+        end_line = getattr(node, 'end_lineno', None) or node.lineno
         
         # Include some context
         start_line = max(0, start_line - 2)
@@ -127,15 +358,18 @@ class CodeParser:
             start_line=start_line + 1,
             end_line=end_line,
             chunk_type='class',
-            language='python'
+            language='python',
+            name=qualified_name or node.name
         )
     
-    def _extract_function_chunk(self, node: ast.FunctionDef, content: str, file_path: str) -> Optional[CodeChunk]:
-        """Extract a function definition as a chunk"""
-        lines = content.split('\n')
-        
+    def _extract_function_chunk(self,
+                                node: Union[ast.FunctionDef, ast.AsyncFunctionDef],
+                                lines: List[str],
+                                file_path: str,
+                                qualified_name: Optional[str] = None) -> Optional[CodeChunk]:
+        """Extract a function or method definition as a chunk"""
         start_line = node.lineno - 1
-        end_line = getattr(node, 'end_lineno', node.lineno)
+        end_line = getattr(node, 'end_lineno', None) or node.lineno
         
         # Include decorators and some context
         for decorator in node.decorator_list:
@@ -153,47 +387,29 @@ class CodeParser:
             start_line=start_line + 1,
             end_line=end_line,
             chunk_type='function',
-            language='python'
+            language='python',
+            name=qualified_name or node.name
         )
     
     def _parse_generic(self, content: str, file_path: str, language: str) -> List[CodeChunk]:
         """Generic parsing for non-Python languages"""
-        chunks = []
         lines = content.split('\n')
         
-        # Simple heuristic: look for function/class definitions
-        function_patterns = {
-            'javascript': r'(function\s+\w+|const\s+\w+\s*=\s*\(|class\s+\w+)',
-            'typescript': r'(function\s+\w+|const\s+\w+\s*=\s*\(|class\s+\w+)',
-            'java': r'(public|private|protected)?\s*(static)?\s*(class|interface|void|int|String)',
-            'go': r'func\s+(\(\w+\s+\*?\w+\))?\s*\w+',
-            'rust': r'(fn\s+\w+|struct\s+\w+|impl\s+\w+)',
-            'c': r'(\w+\s+)?\w+\s*\([^)]*\)\s*{',
-            'cpp': r'(class\s+\w+|(\w+\s+)?\w+\s*\([^)]*\)\s*{)'
-        }
+        chunks = None
+        if self.tree_sitter is not None:
+            chunks = self.tree_sitter.chunk(content, file_path, language)
+        if chunks is None:
+            chunks = self._parse_regex(lines, file_path, language)
         
-        pattern = function_patterns.get(language)
-        
-        if pattern:
-            # Find function/class boundaries
-            boundaries = []
-            for i, line in enumerate(lines):
-                if re.search(pattern, line):
-                    boundaries.append(i)
-            
-            # Create chunks around these boundaries
-            for i, start in enumerate(boundaries):
-                end = boundaries[i + 1] if i + 1 < len(boundaries) else min(start + self.chunk_size, len(lines))
-                
-                chunk_content = '\n'.join(lines[start:end])
-                chunks.append(CodeChunk(
-                    content=chunk_content,
-                    file_path=file_path,
-                    start_line=start + 1,
-                    end_line=end,
-                    chunk_type='function',
-                    language=language
-                ))
+        if self.chunk_mode == 'minimal':
+            # Keep definitions in source order, dropping any that overlap a kept one
+            kept = []
+            covered_until = 0
+            for chunk in sorted(chunks, key=lambda chunk: chunk.start_line):
+                if chunk.start_line > covered_until:
+                    kept.append(chunk)
+                    covered_until = chunk.end_line
+            return self._cover_gaps(kept, lines, file_path, language)
         
         # Also add regular chunks
         for i in range(0, len(lines), self.chunk_size - self.overlap):
@@ -213,3 +429,30 @@ class CodeParser:
             ))
         
         return chunks
+    
+    def _parse_regex(self, lines: List[str], file_path: str, language: str) -> List[CodeChunk]:
+        """Definition chunks found by scanning lines for definition-like patterns"""
+        chunks = []
+        
+        pattern = _FUNCTION_PATTERNS.get(language)
+        
+        if pattern:
+            # Find function/class boundaries
+            boundaries = [i for i, line in enumerate(lines) if pattern.search(line)]
+            
+            # Create chunks around these boundaries, never longer than chunk_size
+            for i, start in enumerate(boundaries):
+                next_start = boundaries[i + 1] if i + 1 < len(boundaries) else len(lines)
+                end = min(next_start, start + self.chunk_size)
+                
+                chunk_content = '\n'.join(lines[start:end])
+                chunks.append(CodeChunk(
+                    content=chunk_content,
+                    file_path=file_path,
+                    start_line=start + 1,
+                    end_line=end,
+                    chunk_type='function',
+                    language=language
+                ))
+        
+        return chunks
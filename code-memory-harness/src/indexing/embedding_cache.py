@@ -0,0 +1,197 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+class EmbeddingCache:
+    """Persistent, content-addressed embedding cache backed by SQLite
+
+    Entries are keyed by (provider, model_name, sha256(text)), so identical
+    chunk text is embedded once no matter which file or run it comes from.
+    The cache is bounded by entry count; the least recently used entries
+    are evicted first.
+
+    Lookups never write: hits are remembered in memory and their last_used
+    times are written in one batch by the next put_many(), flush() or
+    close(). At most max_pending_touches hits are remembered between
+    flushes; later ones are dropped, which only makes eviction order
+    slightly less exact.
+
+    read_only=True opens an existing cache with a read-only connection
+    (e.g. from serving workers sharing one index): hits are not recorded
+    and put_many() stores nothing.
+    """
+
+    def __init__(self, cache_path: str = "embedding_cache.sqlite", max_entries: int = 1_000_000,
+                 max_pending_touches: int = 100_000, read_only: bool = False):
+        self.cache_path = Path(cache_path)
+        self.read_only = read_only
+        self.max_entries = max_entries
+        self.max_pending_touches = max_pending_touches
+        # (provider, model_name, text_hash) -> last hit time, not yet written
+        self._pending_touches: Dict[Tuple[str, str, bytes], float] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # One connection shared across embedding threads, serialized by a lock
+        self._lock = threading.Lock()
+        if read_only:
+            # Takes no write locks, so any number of readers never contend
+            self._conn = sqlite3.connect(f"{self.cache_path.resolve().as_uri()}?mode=ro", uri=True,
+                                         check_same_thread=False)
+            self._approx_count = 0
+            return
+        self._conn = sqlite3.connect(str(self.cache_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " provider TEXT NOT NULL,"
+            " model_name TEXT NOT NULL,"
+            " text_hash BLOB NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (provider, model_name, text_hash))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS embeddings_lru ON embeddings (last_used)")
+        self._conn.commit()
+
+        # Upper bound on the row count; replaced rows are over-counted until
+        # the next exact recount in _evict()
+        self._approx_count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def text_hash(text: str) -> bytes:
+        return hashlib.sha256(text.encode('utf-8')).digest()
+
+    def get_many(self, provider: str, model_name: str, texts: List[str]) -> Dict[int, np.ndarray]:
+        """Look up cached embeddings, returning {position in texts: embedding}"""
+        positions: Dict[bytes, List[int]] = {}
+        for i, text in enumerate(texts):
+            positions.setdefault(self.text_hash(text), []).append(i)
+
+        found: Dict[int, np.ndarray] = {}
+        hashes = list(positions)
+        now = time.time()
+
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(hashes), 500):
+                group = hashes[start:start + 500]
+                rows = self._conn.execute(
+                    "SELECT text_hash, vector FROM embeddings"
+                    " WHERE provider = ? AND model_name = ?"
+                    f" AND text_hash IN ({','.join('?' * len(group))})",
+                    [provider, model_name, *group]
+                ).fetchall()
+
+                for text_hash, vector in rows:
+                    embedding = np.frombuffer(vector, dtype=np.float32).copy()
+                    for i in positions[text_hash]:
+                        found[i] = embedding
+                    self._touch((provider, model_name, text_hash), now)
+
+            self.hits += len(found)
+            self.misses += len(texts) - len(found)
+
+        return found
+
+    def _touch(self, key: Tuple[str, str, bytes], now: float):
+        """Remember a hit for the next batched last_used write (lock held)"""
+        if self.read_only:
+            return
+        if key in self._pending_touches or len(self._pending_touches) < self.max_pending_touches:
+            self._pending_touches[key] = now
+
+    def _flush_touches(self):
+        """Write remembered hits in one statement (lock held, caller commits)"""
+        if self._pending_touches:
+            self._conn.executemany(
+                "UPDATE embeddings SET last_used = ?"
+                " WHERE provider = ? AND model_name = ? AND text_hash = ?",
+                [(now, *key) for key, now in self._pending_touches.items()]
+            )
+            self._pending_touches.clear()
+
+    def flush(self):
+        """Write last_used times of hits since the last write"""
+        with self._lock:
+            if self._pending_touches:
+                self._flush_touches()
+                self._conn.commit()
+
+    def get(self, provider: str, model_name: str, text: str) -> Optional[np.ndarray]:
+        """Look up a single cached embedding"""
+        return self.get_many(provider, model_name, [text]).get(0)
+
+    def put_many(self, provider: str, model_name: str, texts: List[str], embeddings: List[np.ndarray]):
+        """Store embeddings for the given texts"""
+        if self.read_only:
+            return
+        now = time.time()
+        rows = [
+            (provider, model_name, self.text_hash(text),
+             np.asarray(embedding, dtype=np.float32).tobytes(), now)
+            for text, embedding in zip(texts, embeddings)
+        ]
+
+        with self._lock:
+            # Before the inserts, so entries replaced here keep their new time
+            self._flush_touches()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (provider, model_name, text_hash, vector, last_used)"
+                " VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            self._approx_count += len(rows)
+            if self._approx_count > self.max_entries:
+                self._evict()
+            self._conn.commit()
+
+    def put(self, provider: str, model_name: str, text: str, embedding: np.ndarray):
+        """Store a single embedding"""
+        self.put_many(provider, model_name, [text], [embedding])
+
+    def _evict(self):
+        """Trim the least recently used entries beyond max_entries (lock held)"""
+        count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        if count <= self.max_entries:
+            self._approx_count = count
+            return
+
+        # Trim to a low-water mark so the recount is amortized over many puts
+        target = int(self.max_entries * 0.9)
+        excess = count - target
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE rowid IN"
+            " (SELECT rowid FROM embeddings ORDER BY last_used LIMIT ?)",
+            (excess,)
+        )
+        self._approx_count = target
+        self.evictions += excess
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss counters since this cache was opened"""
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'pending_touches': len(self._pending_touches),
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
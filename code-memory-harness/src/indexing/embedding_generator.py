@@ -1,41 +1,119 @@
-import openai
-from typing import List, Optional
+import logging
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
 import numpy as np
 import time
 from tenacity import retry, stop_after_attempt, wait_exponential
 import os
-from sentence_transformers import SentenceTransformer
+
+from src.core.tokenizer import get_encoding
+from src.indexing.adaptive_batching import AIMDController, Backoff, EmbeddingStats
+from src.indexing.embedding_cache import EmbeddingCache
+from src.monitoring.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# openai (aiohttp, requests) and sentence_transformers (torch) are imported on
+# first use, so importing this module or building a generator stays cheap
+
+# OpenAI accepts at most this many inputs per embeddings request
+OPENAI_MAX_BATCH_INPUTS = 2048
 
 class EmbeddingGenerator:
     """Generate embeddings for code chunks"""
     
-    def __init__(self, provider: str = "openai", model_name: Optional[str] = None, api_key: Optional[str] = None):
+    def __init__(self,
+                 provider: str = "openai",
+                 model_name: Optional[str] = None,
+                 api_key: Optional[str] = None,
+                 cache: Optional[EmbeddingCache] = None,
+                 cache_path: Optional[str] = None,
+                 max_batch_tokens: int = 100_000,
+                 max_input_tokens: int = 8191,
+                 max_concurrency: int = 4,
+                 max_retries: int = 5,
+                 api_base: Optional[str] = None,
+                 progress_callback: Optional[Callable[[int, int], None]] = None,
+                 local_backend: str = "torch",
+                 local_processes: int = 1,
+                 intra_op_threads: Optional[int] = None):
         self.provider = provider
+        # Inputs per forward pass for local models
+        self.local_batch_size = 32 if local_backend == "onnx" else 10
+        # OpenAI requests are packed up to max_batch_tokens; longer single
+        # inputs are truncated to max_input_tokens instead of failing the batch
+        self.max_batch_tokens = max_batch_tokens
+        self.max_input_tokens = max_input_tokens
+        # Request size and in-flight requests adapt (AIMD) to 429 responses:
+        # both grow while requests succeed and halve when throttled
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.batch_tokens = AIMDController(
+            initial=min(max_batch_tokens, max(max_input_tokens, max_batch_tokens // 4)),
+            minimum=max_input_tokens,
+            maximum=max_batch_tokens,
+            increase=max(1, max_batch_tokens // 20)
+        )
+        self.concurrency = AIMDController(initial=self.max_concurrency, minimum=1, maximum=self.max_concurrency,
+                                          increase=0.25)
+        self.backoff = Backoff()
+        self.stats = EmbeddingStats()
+        # Called with (texts embedded, texts requested) after each OpenAI response
+        self.progress_callback = progress_callback
+        self.api_base = api_base
+        self._executor: Optional[ThreadPoolExecutor] = None
+        # Optional content-addressed cache consulted before calling the provider
+        self.cache = cache or (EmbeddingCache(cache_path) if cache_path else None)
         
         if provider == "openai":
             self.api_key = api_key or os.getenv("OPENAI_API_KEY")
             if not self.api_key:
                 raise ValueError("OpenAI API key required")
-            openai.api_key = self.api_key
             self.model_name = model_name or "text-embedding-ada-002"
             self.dimension = 1536
             
         elif provider == "local":
             # Use sentence-transformers for local embeddings
             self.model_name = model_name or "microsoft/codebert-base"
-            self.model = SentenceTransformer(self.model_name)
+            if local_backend == "onnx":
+                # int8-quantized ONNX Runtime model for CPU-only hosts
+                from src.indexing.onnx_encoder import OnnxEncoder
+                self.model = OnnxEncoder(self.model_name, intra_op_threads=intra_op_threads,
+                                         processes=local_processes)
+            elif local_backend == "torch":
+                from sentence_transformers import SentenceTransformer
+                self.model = SentenceTransformer(self.model_name)
+            else:
+                raise ValueError(f"Unknown local backend: {local_backend}")
             self.dimension = self.model.get_sentence_embedding_dimension()
         
         else:
             raise ValueError(f"Unknown provider: {provider}")
     
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
     def generate_embedding(self, text: str) -> np.ndarray:
         """Generate embedding for a single text"""
+        if self.cache is not None:
+            cached = self.cache.get(self.provider, self.model_name, text)
+            if cached is not None:
+                return cached
+        
+        embedding = self._embed_single(text)
+        
+        if self.cache is not None:
+            self.cache.put(self.provider, self.model_name, text, embedding)
+        return embedding
+    
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+    def _embed_single(self, text: str) -> np.ndarray:
+        """Call the provider for a single text"""
         if self.provider == "openai":
+            import openai
             response = openai.Embedding.create(
                 input=text,
-                model=self.model_name
+                model=self.model_name,
+                api_key=self.api_key,
+                api_base=self.api_base
             )
             return np.array(response['data'][0]['embedding'], dtype=np.float32)
             
@@ -45,30 +123,190 @@ class EmbeddingGenerator:
             embedding = self.model.encode(code_text)
             return np.array(embedding, dtype=np.float32)
     
-    def generate_embeddings_batch(self, texts: List[str], batch_size: int = 10) -> List[np.ndarray]:
-        """Generate embeddings for multiple texts"""
+    def generate_embeddings_batch(self, texts: List[str], batch_size: Optional[int] = None,
+                                  persist: bool = True) -> List[np.ndarray]:
+        """Generate embeddings for multiple texts
+
+        For OpenAI, batch_size only caps inputs per request; requests are
+        filled up to max_batch_tokens. persist=False (query embeddings)
+        reads the cache but never writes new embeddings to it.
+        """
+        if self.cache is None:
+            return self._embed_batch(texts, batch_size)
+        
+        cached = self.cache.get_many(self.provider, self.model_name, texts)
+        
+        # Embed each distinct missing text once
+        missing: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            if i not in cached:
+                missing.setdefault(text, []).append(i)
+        
+        if missing:
+            missing_texts = list(missing)
+            new_embeddings = self._embed_batch(missing_texts, batch_size)
+            if persist:
+                self.cache.put_many(self.provider, self.model_name, missing_texts, new_embeddings)
+            for text, embedding in zip(missing_texts, new_embeddings):
+                for i in missing[text]:
+                    cached[i] = embedding
+        
+        return [cached[i] for i in range(len(texts))]
+    
+    def _prepare_inputs(self, texts: List[str]) -> Tuple[List[str], List[int]]:
+        """Truncate inputs to max_input_tokens, returning (texts, token counts)"""
+        encoding = get_encoding(self.model_name)
+        prepared = []
+        counts = []
+        for text, tokens in zip(texts, encoding.encode_ordinary_batch(texts)):
+            if len(tokens) > self.max_input_tokens:
+                logger.warning(f"Truncating embedding input from {len(tokens)} to {self.max_input_tokens} tokens")
+                text = encoding.decode(tokens[:self.max_input_tokens])
+                tokens = tokens[:self.max_input_tokens]
+            prepared.append(text)
+            counts.append(len(tokens))
+        return prepared, counts
+    
+    def _batch_end(self, counts: List[int], start: int, max_tokens: int, max_inputs: int) -> int:
+        """End of the request batch starting at start, packed up to max_tokens"""
+        end = start
+        total = 0
+        while end < len(counts) and end - start < max_inputs:
+            if end > start and total + counts[end] > max_tokens:
+                break
+            total += counts[end]
+            end += 1
+        return end
+    
+    def token_batches(self, texts: List[str], batch_size: Optional[int] = None) -> List[Tuple[List[str], int]]:
+        """Split texts, in order, into (batch, token count) requests packed up to the current token budget
+
+        The budget is the adaptive batch_tokens limit, which shrinks after
+        429 responses and grows back up to max_batch_tokens.
+        """
+        texts, counts = self._prepare_inputs(texts)
+        max_inputs = min(batch_size or OPENAI_MAX_BATCH_INPUTS, OPENAI_MAX_BATCH_INPUTS)
+        
+        batches = []
+        start = 0
+        while start < len(texts):
+            end = self._batch_end(counts, start, int(self.batch_tokens.value), max_inputs)
+            batches.append((texts[start:end], sum(counts[start:end])))
+            start = end
+        return batches
+    
+    def _embed_batch(self, texts: List[str], batch_size: Optional[int] = None) -> List[np.ndarray]:
+        """Call the provider for multiple texts"""
         embeddings = []
         
-        if self.provider == "openai":
-            # OpenAI supports batch embedding
-            for i in range(0, len(texts), batch_size):
-                batch = texts[i:i + batch_size]
-                response = openai.Embedding.create(
-                    input=batch,
-                    model=self.model_name
-                )
-                batch_embeddings = [np.array(item['embedding'], dtype=np.float32) 
-                                  for item in response['data']]
-                embeddings.extend(batch_embeddings)
+        with metrics.timer('embed_seconds'):
+            if self.provider == "openai":
+                embeddings = self._embed_openai(texts, batch_size)
+                        
+            elif self.provider == "local":
+                # Local models can handle larger batches
+                code_texts = [f"Code: {text}" for text in texts]
+                embeddings = self.model.encode(code_texts, batch_size=batch_size or self.local_batch_size)
+                embeddings = [np.array(emb, dtype=np.float32) for emb in embeddings]
+        metrics.inc('embedded_texts_total', len(texts))
+        
+        return embeddings
+    
+    def _embed_openai(self, texts: List[str], batch_size: Optional[int] = None) -> List[np.ndarray]:
+        """Embed texts with concurrent, adaptively sized OpenAI requests
+
+        Texts are cut into sub-batches packed up to the current token budget
+        and sent with up to the current concurrency limit in flight. A
+        sub-batch that is throttled or fails is queued again on its own, so
+        one bad response never redoes the whole run.
+        """
+        import openai
+        texts, counts = self._prepare_inputs(texts)
+        max_inputs = min(batch_size or OPENAI_MAX_BATCH_INPUTS, OPENAI_MAX_BATCH_INPUTS)
+        embeddings: List[Optional[np.ndarray]] = [None] * len(texts)
+        
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="openai-embed")
+        
+        start_time = time.perf_counter()
+        done_count = 0
+        position = 0
+        retry_queue = deque()  # (start, end, attempts)
+        in_flight = {}
+        try:
+            while position < len(texts) or retry_queue or in_flight:
+                while len(in_flight) < self.concurrency.limit and (retry_queue or position < len(texts)):
+                    if retry_queue:
+                        start, end, attempts = retry_queue.popleft()
+                    else:
+                        start = position
+                        end = self._batch_end(counts, start, int(self.batch_tokens.value), max_inputs)
+                        position, attempts = end, 0
+                    self.backoff.wait()
+                    future = self._executor.submit(self._request_embeddings, texts[start:end])
+                    in_flight[future] = (start, end, attempts)
                 
-                # Rate limiting
-                if i + batch_size < len(texts):
-                    time.sleep(0.1)
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    start, end, attempts = in_flight.pop(future)
+                    try:
+                        batch_embeddings = future.result()
+                    except openai.error.RateLimitError as e:
+                        self._on_failure(retry_queue, start, end, attempts, e, throttled=True)
+                        continue
+                    except (openai.error.APIError, openai.error.Timeout, openai.error.APIConnectionError,
+                            openai.error.ServiceUnavailableError) as e:
+                        self._on_failure(retry_queue, start, end, attempts, e, throttled=False)
+                        continue
                     
-        elif self.provider == "local":
-            # Local models can handle larger batches
-            code_texts = [f"Code: {text}" for text in texts]
-            embeddings = self.model.encode(code_texts, batch_size=batch_size)
-            embeddings = [np.array(emb, dtype=np.float32) for emb in embeddings]
+                    embeddings[start:end] = batch_embeddings
+                    self.stats.record_request(end - start, sum(counts[start:end]))
+                    self.batch_tokens.on_success()
+                    self.concurrency.on_success()
+                    self.backoff.succeeded()
+                    
+                    done_count += end - start
+                    if self.progress_callback is not None:
+                        self.progress_callback(done_count, len(texts))
+        finally:
+            self.stats.record_time(time.perf_counter() - start_time)
         
         return embeddings
+    
+    def _on_failure(self, retry_queue: deque, start: int, end: int, attempts: int,
+                    error: Exception, throttled: bool):
+        """Queue a failed sub-batch again, shrinking limits when throttled"""
+        if attempts + 1 > self.max_retries:
+            raise error
+        self.stats.record_retry(throttled)
+        
+        if throttled:
+            self.batch_tokens.on_throttle()
+            self.concurrency.on_throttle()
+            retry_after = None
+            headers = getattr(error, 'headers', None) or {}
+            try:
+                retry_after = float(headers.get('retry-after'))
+            except (TypeError, ValueError):
+                pass
+            self.backoff.throttled(retry_after)
+            logger.debug(f"Throttled; retrying {end - start} texts "
+                         f"(batch tokens {self.batch_tokens.limit}, concurrency {self.concurrency.limit})")
+        else:
+            logger.warning(f"Embedding request failed ({getattr(error, 'user_message', error)}); retrying {end - start} texts")
+            self.backoff.throttled()
+        
+        retry_queue.append((start, end, attempts + 1))
+    
+    def _request_embeddings(self, texts: List[str]) -> List[np.ndarray]:
+        """One embeddings request; runs on the request thread pool"""
+        import openai
+        response = openai.Embedding.create(
+            input=texts,
+            model=self.model_name,
+            api_key=self.api_key,
+            api_base=self.api_base
+        )
+        # Responses carry an index per input; do not rely on their order
+        data = sorted(response['data'], key=lambda item: item.get('index', 0))
+        return [np.array(item['embedding'], dtype=np.float32) for item in data]
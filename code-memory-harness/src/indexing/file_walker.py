@@ -0,0 +1,282 @@
+import logging
+import os
+import re
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Directories never worth descending into: VCS metadata, dependencies,
+# virtualenvs, caches and build output
+DEFAULT_IGNORED_DIRS = frozenset({
+    '.git', '.hg', '.svn', '__pycache__', 'node_modules', '.env', '.venv', 'venv',
+    '.tox', '.nox', '.mypy_cache', '.pytest_cache', '.ruff_cache', '.idea', '.vscode',
+    'dist', 'build', 'target', '.next', '.gradle', 'bower_components', '.eggs',
+})
+
+# Paths checked per stat task, so a slow directory does not stall the stream
+_STAT_BATCH = 256
+
+
+def _glob_to_regex(pattern: str) -> str:
+    """Translate one gitignore glob (without the ! or trailing /) to a regex"""
+    i = 0
+    parts = []
+    while i < len(pattern):
+        char = pattern[i]
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+            continue
+        if pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+            continue
+        if char == '*':
+            parts.append('[^/]*')
+        elif char == '?':
+            parts.append('[^/]')
+        elif char == '[':
+            end = pattern.find(']', i + 2)
+            if end == -1:
+                parts.append(re.escape(char))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                parts.append(f"[{body}]")
+                i = end
+        elif char == '\\' and i + 1 < len(pattern):
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return ''.join(parts)
+
+
+class GitignoreRules:
+    """Patterns from one .gitignore, matched against paths relative to its directory
+
+    Supports comments, negation (!), directory-only patterns (trailing /),
+    anchoring (a / anywhere but the end) and the *, ?, [...] and **
+    wildcards. Later patterns override earlier ones.
+    """
+
+    def __init__(self, lines: Iterable[str]):
+        self.rules: List[Tuple[re.Pattern, bool, bool]] = []  # (regex, negated, directories only)
+        for line in lines:
+            line = line.rstrip('\n')
+            if not line.endswith('\\ '):
+                line = line.rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negated = line.startswith('!')
+            if negated:
+                line = line[1:]
+            elif line.startswith('\\'):
+                line = line[1:]
+            directory_only = line.endswith('/')
+            line = line.rstrip('/')
+            if not line:
+                continue
+            if '/' in line:
+                regex = _glob_to_regex(line.lstrip('/'))
+            else:
+                # Unanchored names match at any depth
+                regex = '(?:.*/)?' + _glob_to_regex(line)
+            self.rules.append((re.compile(regex + '$'), negated, directory_only))
+
+    @classmethod
+    def from_file(cls, path: str) -> "GitignoreRules":
+        try:
+            with open(path, encoding='utf-8', errors='replace') as f:
+                return cls(f.readlines())
+        except OSError:
+            return cls([])
+
+    def match(self, relative_path: str, is_dir: bool) -> Optional[bool]:
+        """True if ignored, False if re-included by a negation, None if no pattern matches"""
+        result = None
+        for regex, negated, directory_only in self.rules:
+            if directory_only and not is_dir:
+                continue
+            if regex.match(relative_path):
+                result = not negated
+        return result
+
+
+class FileWalker:
+    """Stream indexable source files under a root
+
+    Directories named in ignored_dirs, or ignored by a .gitignore, are
+    pruned before they are entered, using os.scandir so file types come
+    from the directory listing. With use_git, `git ls-files` supplies the
+    candidate list instead when the root is inside a git work tree. Files
+    larger than max_file_bytes, or with a NUL byte in their first block,
+    are skipped; those checks run on a thread pool in small batches, so
+    paths keep flowing to the parsers while the walk continues.
+    """
+
+    def __init__(self,
+                 root: str,
+                 extensions: Iterable[str],
+                 ignored_dirs: Iterable[str] = DEFAULT_IGNORED_DIRS,
+                 use_gitignore: bool = True,
+                 use_git: bool = False,
+                 max_file_bytes: Optional[int] = 1_000_000,
+                 skip_binary: bool = True,
+                 stat_workers: int = 8):
+        self.root = str(root)
+        self.extensions = tuple(extensions)
+        self.ignored_dirs = frozenset(ignored_dirs)
+        self.use_gitignore = use_gitignore
+        self.use_git = use_git
+        self.max_file_bytes = max_file_bytes
+        self.skip_binary = skip_binary
+        self.stat_workers = max(1, stat_workers)
+
+    def __iter__(self) -> Iterator[str]:
+        return self.walk()
+
+    def walk(self) -> Iterator[str]:
+        candidates = self._git_files() if self.use_git else None
+        if candidates is None:
+            candidates = self._scan()
+        if not self.max_file_bytes and not self.skip_binary:
+            yield from candidates
+            return
+
+        with ThreadPoolExecutor(max_workers=self.stat_workers, thread_name_prefix="walk-stat") as pool:
+            batch = []
+            for path in candidates:
+                batch.append(path)
+                if len(batch) >= _STAT_BATCH:
+                    yield from self._checked(pool, batch)
+                    batch = []
+            if batch:
+                yield from self._checked(pool, batch)
+
+    def _checked(self, pool: ThreadPoolExecutor, paths: List[str]) -> Iterator[str]:
+        step = max(1, len(paths) // self.stat_workers)
+        slices = [paths[start:start + step] for start in range(0, len(paths), step)]
+        for kept in pool.map(self._accept_all, slices):
+            yield from kept
+
+    def _accept_all(self, paths: List[str]) -> List[str]:
+        return [path for path in paths if self._accept(path)]
+
+    def _accept(self, path: str) -> bool:
+        """Size and binary checks; runs on the stat threads"""
+        try:
+            if self.max_file_bytes and os.stat(path).st_size > self.max_file_bytes:
+                return False
+            if self.skip_binary:
+                with open(path, 'rb') as f:
+                    return b'\0' not in f.read(1024)
+        except OSError:
+            return False
+        return True
+
+    def _scan(self) -> Iterator[str]:
+        """Depth-first os.scandir walk that prunes ignored directories"""
+        # (directory, its path relative to root, .gitignore rules in scope with their base)
+        stack = [(self.root, '', [])]
+        while stack:
+            directory, relative, rule_sets = stack.pop()
+            try:
+                with os.scandir(directory) as listing:
+                    entries = list(listing)
+            except OSError:
+                continue
+
+            if self.use_gitignore and any(entry.name == '.gitignore' for entry in entries):
+                rules = GitignoreRules.from_file(os.path.join(directory, '.gitignore'))
+                if rules.rules:
+                    rule_sets = rule_sets + [(relative, rules)]
+
+            subdirectories = []
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                except OSError:
+                    continue
+                if is_dir:
+                    if entry.name in self.ignored_dirs:
+                        continue
+                elif not entry.name.endswith(self.extensions) or not entry.is_file():
+                    continue
+
+                entry_relative = f"{relative}/{entry.name}" if relative else entry.name
+                if rule_sets and self._ignored(entry_relative, is_dir, rule_sets):
+                    continue
+                if is_dir:
+                    subdirectories.append((entry.path, entry_relative, rule_sets))
+                else:
+                    yield entry.path
+
+            # Reversed so directories are visited in listing order
+            stack.extend(reversed(subdirectories))
+
+    @staticmethod
+    def _ignored(relative_path: str, is_dir: bool, rule_sets: List[Tuple[str, GitignoreRules]]) -> bool:
+        """Apply .gitignore files from the root down; deeper files take precedence"""
+        ignored = False
+        for base, rules in rule_sets:
+            path = relative_path[len(base) + 1:] if base else relative_path
+            result = rules.match(path, is_dir)
+            if result is not None:
+                ignored = result
+        return ignored
+
+    def _git_files(self) -> Optional[Iterator[str]]:
+        """Tracked and untracked, not ignored files from git, or None outside a work tree"""
+        if shutil.which('git') is None:
+            return None
+        try:
+            inside = subprocess.run(['git', '-C', self.root, 'rev-parse', '--is-inside-work-tree'],
+                                    capture_output=True, text=True)
+        except OSError:
+            return None
+        if inside.returncode != 0 or inside.stdout.strip() != 'true':
+            return None
+        return self._stream_git_files()
+
+    def _stream_git_files(self) -> Iterator[str]:
+        process = subprocess.Popen(
+            ['git', '-C', self.root, 'ls-files', '-z', '--cached', '--others', '--exclude-standard'],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        seen = set()
+        pending = b''
+        try:
+            for block in iter(lambda: process.stdout.read(65536), b''):
+                names = (pending + block).split(b'\0')
+                pending = names.pop()
+                for name in names:
+                    path = os.fsdecode(name)
+                    # Conflicted files are listed once per stage
+                    if path in seen or not path.endswith(self.extensions):
+                        continue
+                    seen.add(path)
+                    directories = path.split('/')[:-1]
+                    if any(directory in self.ignored_dirs for directory in directories):
+                        continue
+                    yield os.path.join(self.root, path)
+        finally:
+            process.stdout.close()
+            if process.wait() != 0:
+                logger.warning("git ls-files failed for %s", self.root)
+
+
+def rglob_source_files(root: str, extensions: Iterable[str]) -> Iterator[str]:
+    """The previous walk: rglob everything and filter afterwards (kept for benchmarks)"""
+    extensions = list(extensions)
+    for file_path in Path(root).rglob('*'):
+        if any(part in file_path.parts for part in ['.git', '__pycache__', 'node_modules', '.env']):
+            continue
+        if file_path.is_file() and file_path.suffix in extensions:
+            yield str(file_path)
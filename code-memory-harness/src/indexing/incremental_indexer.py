@@ -0,0 +1,159 @@
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.core.vector_store import SimpleVectorStore
+from src.indexing.code_parser import CodeParser, record_parse
+from src.indexing.embedding_generator import EmbeddingGenerator
+
+logger = logging.getLogger(__name__)
+
+
+def file_sha256(file_path: str) -> str:
+    """Hash file contents in fixed-size blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IncrementalIndexer:
+    """Re-index only the files whose contents changed since the last run
+
+    Each indexed file is recorded with its mtime, size and content hash.
+    A file whose mtime and size are unchanged is skipped without being read;
+    otherwise its hash decides whether its chunks are re-parsed and re-embedded.
+    """
+
+    def __init__(self,
+                 parser: CodeParser,
+                 embedding_generator: EmbeddingGenerator,
+                 vector_store: SimpleVectorStore,
+                 state_path: Optional[str] = None):
+        self.parser = parser
+        self.embedding_generator = embedding_generator
+        self.vector_store = vector_store
+        self.state_path = Path(state_path or vector_store.index_path.replace('.index', '_files.json'))
+        self.file_state: Dict[str, Dict] = self._load_state()
+
+    def _load_state(self) -> Dict[str, Dict]:
+        if self.state_path.exists():
+            try:
+                return json.loads(self.state_path.read_text())
+            except Exception:
+                return {}
+        return {}
+
+    def save_state(self):
+        """Persist the per-file fingerprints"""
+        self.state_path.write_text(json.dumps(self.file_state))
+
+    def _fingerprint(self, file_path: str) -> Dict:
+        stat = Path(file_path).stat()
+        return {
+            'mtime': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'sha256': file_sha256(file_path)
+        }
+
+    def scan(self, file_paths: Iterable[str]) -> Tuple[List[str], List[str]]:
+        """Return (changed, removed) files relative to the recorded state
+
+        file_paths must be the complete set of indexable files; any recorded
+        file not in it is reported as removed.
+        """
+        changed = []
+        seen = set()
+
+        for file_path in file_paths:
+            file_path = str(file_path)
+            seen.add(file_path)
+            previous = self.file_state.get(file_path)
+
+            try:
+                stat = Path(file_path).stat()
+            except OSError:
+                continue
+
+            if previous and previous['mtime'] == stat.st_mtime_ns and previous['size'] == stat.st_size:
+                continue
+
+            sha256 = file_sha256(file_path)
+            if previous and previous['sha256'] == sha256:
+                # Touched but not modified; refresh the fingerprint only
+                previous['mtime'] = stat.st_mtime_ns
+                previous['size'] = stat.st_size
+                continue
+
+            changed.append(file_path)
+
+        removed = [file_path for file_path in self.file_state if file_path not in seen]
+        return changed, removed
+
+    def reindex_file(self, file_path: str) -> int:
+        """Replace the stored chunks of one file, returning the new chunk count"""
+        file_path = str(file_path)
+        chunks, seconds, fingerprint = self.parser.parse_file_timed(file_path)
+        if seconds is not None:
+            record_parse(chunks, seconds)
+
+        if chunks:
+            embeddings = self.embedding_generator.generate_embeddings_batch(
+                [chunk.content for chunk in chunks]
+            )
+            for chunk, embedding in zip(chunks, embeddings):
+                chunk.embedding = embedding
+
+        self.vector_store.upsert_file(file_path, chunks)
+        # The fingerprint of the bytes parsed, so an edit made meanwhile is seen by the next update
+        self.file_state[file_path] = fingerprint or self._fingerprint(file_path)
+        return len(chunks)
+
+    def remove_file(self, file_path: str) -> int:
+        """Forget a deleted file, returning how many chunks were dropped"""
+        self.file_state.pop(file_path, None)
+        return self.vector_store.remove_file(file_path)
+
+    def mark_indexed(self, file_paths: Iterable[str], fingerprints: Optional[Dict[str, Dict]] = None):
+        """Record fingerprints for files indexed by a full rebuild
+
+        fingerprints holds those taken when each file was parsed (see
+        IndexingPipeline.fingerprints); a file edited after it was parsed
+        then no longer matches and is re-indexed by the next update().
+        Files without one (skipped by the parser) are fingerprinted now.
+        """
+        fingerprints = fingerprints or {}
+        self.file_state = {}
+        for file_path in file_paths:
+            file_path = str(file_path)
+            try:
+                self.file_state[file_path] = fingerprints.get(file_path) or self._fingerprint(file_path)
+            except OSError:
+                continue
+        self.save_state()
+
+    def update(self, file_paths: Iterable[str]) -> Dict[str, int]:
+        """Bring the vector store in line with the current files on disk"""
+        changed, removed = self.scan(file_paths)
+
+        chunks_added = 0
+        chunks_removed = 0
+        for file_path in removed:
+            chunks_removed += self.remove_file(file_path)
+        for file_path in changed:
+            logger.debug("Re-indexing %s", file_path)
+            chunks_added += self.reindex_file(file_path)
+
+        if changed or removed:
+            self.vector_store.save()
+        self.save_state()
+
+        return {
+            'files_changed': len(changed),
+            'files_removed': len(removed),
+            'chunks_added': chunks_added,
+            'chunks_removed': chunks_removed
+        }
@@ -0,0 +1,313 @@
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from src.core.vector_store import SimpleVectorStore, CodeChunk
+from src.indexing.code_parser import CodeParser, record_parse
+from src.indexing.embedding_generator import EmbeddingGenerator
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of a stage's input
+_DONE = None
+
+# Parser instance owned by each worker process
+_worker_parser: Optional[CodeParser] = None
+
+
+def _init_parse_worker(parser: CodeParser):
+    global _worker_parser
+    _worker_parser = parser
+
+
+def _parse_in_worker(file_path: str) -> Tuple[List[CodeChunk], Optional[float], Optional[Dict]]:
+    # Worker metrics stay in the worker, so the parse time travels back and
+    # is recorded exactly as CodeParser.parse_file records it in-process
+    return _worker_parser.parse_file_timed(file_path)
+
+
+def _record_parse_result(result: Tuple[List[CodeChunk], Optional[float], Optional[Dict]]
+                         ) -> Tuple[List[CodeChunk], Optional[Dict]]:
+    chunks, seconds, fingerprint = result
+    if seconds is not None:
+        record_parse(chunks, seconds)
+    return chunks, fingerprint
+
+
+class _SharedEmbeddings:
+    """Embeddings of content seen this run, keyed by content hash, shared between embedders
+
+    Holds one vector per distinct content for the run, so copies embedded
+    in any later batch reuse it without another provider request.
+    """
+
+    def __init__(self):
+        self._embeddings: Dict[bytes, np.ndarray] = {}
+        self._ready = threading.Condition()
+
+    def put_many(self, digests: List[bytes], embeddings: List[np.ndarray]):
+        with self._ready:
+            self._embeddings.update(zip(digests, embeddings))
+            self._ready.notify_all()
+
+    def wait(self, digest: bytes, errors: List[Exception]) -> Optional[np.ndarray]:
+        """The embedding of digest once its original is embedded, or None if the run failed
+
+        The original is in the same or an earlier batch, which an embedder
+        has already taken, so the wait ends.
+        """
+        with self._ready:
+            self._ready.wait_for(lambda: digest in self._embeddings or errors)
+            return self._embeddings.get(digest)
+
+    def abort(self):
+        """Wake embedders waiting on originals after a failure"""
+        with self._ready:
+            self._ready.notify_all()
+
+
+@dataclass
+class IndexingStats:
+    """Throughput report for a single pipeline run"""
+    files: int = 0
+    chunks: int = 0
+    seconds: float = 0.0
+    # Chunks whose content was already embedded this run; each is still
+    # indexed under its own file, sharing the first copy's embedding
+    duplicates: int = 0
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files / self.seconds if self.seconds > 0 else 0.0
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.seconds if self.seconds > 0 else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            'files': self.files,
+            'chunks': self.chunks,
+            'seconds': self.seconds,
+            'duplicates': self.duplicates,
+            'files_per_second': self.files_per_second,
+            'chunks_per_second': self.chunks_per_second
+        }
+
+
+class IndexingPipeline:
+    """Staged parse -> embed -> add pipeline with bounded queues between stages
+
+    Files are parsed in a process pool, parsed chunks are grouped into batches
+    and handed to embedding threads through a bounded queue, and embedded
+    batches are streamed into the vector store by a single writer thread.
+    A full queue blocks the stage feeding it, so a slow embedding provider
+    throttles parsing instead of letting parsed chunks pile up in memory.
+    """
+
+    def __init__(self,
+                 parser: CodeParser,
+                 embedding_generator: EmbeddingGenerator,
+                 vector_store: SimpleVectorStore,
+                 parse_workers: Optional[int] = None,
+                 embed_workers: int = 1,
+                 embed_batch_size: int = 64,
+                 queue_size: int = 8,
+                 dedupe_content: bool = False):
+        self.parser = parser
+        self.embedding_generator = embedding_generator
+        self.vector_store = vector_store
+        # 0 or 1 parses in the calling process
+        self.parse_workers = (os.cpu_count() or 1) if parse_workers is None else parse_workers
+        self.embed_workers = max(1, embed_workers)
+        self.embed_batch_size = max(1, embed_batch_size)
+        self.queue_size = max(1, queue_size)
+        # Embed identical chunk content (vendored or copied code) only once
+        self.dedupe_content = dedupe_content
+        # Fingerprints of the bytes each file was parsed from in the last
+        # run, for IncrementalIndexer.mark_indexed
+        self.fingerprints: Dict[str, Dict] = {}
+
+    def run(self, file_paths: Iterable[str]) -> IndexingStats:
+        """Index the given files and return throughput statistics"""
+        stats = IndexingStats()
+        self.fingerprints = {}
+        errors: List[Exception] = []
+        embed_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        add_queue: queue.Queue = queue.Queue(maxsize=self.queue_size)
+        shared = _SharedEmbeddings() if self.dedupe_content else None
+
+        embedders = [
+            threading.Thread(target=self._embed_stage, args=(embed_queue, add_queue, errors, shared),
+                             name=f"embed-{i}", daemon=True)
+            for i in range(self.embed_workers)
+        ]
+        writer = threading.Thread(target=self._add_stage, args=(add_queue, stats, errors, shared),
+                                  name="vector-store-writer", daemon=True)
+
+        start = time.perf_counter()
+        for thread in embedders:
+            thread.start()
+        writer.start()
+
+        try:
+            self._parse_stage(file_paths, embed_queue, stats, errors)
+        finally:
+            # Drain the downstream stages before reporting
+            for _ in embedders:
+                embed_queue.put(_DONE)
+            for thread in embedders:
+                thread.join()
+            add_queue.put(_DONE)
+            writer.join()
+            stats.seconds = time.perf_counter() - start
+
+        if errors:
+            raise errors[0]
+
+        return stats
+
+    def _parse_stage(self, file_paths: Iterable[str], embed_queue: queue.Queue,
+                     stats: IndexingStats, errors: List[Exception]):
+        """Parse files and feed fixed-size chunk batches to the embedders
+
+        Batches are (chunks, keys). With dedupe_content, keys holds each
+        chunk's (content hash, is a copy) where a copy's content was seen
+        earlier in the run; otherwise it is None.
+        """
+        batch: List[CodeChunk] = []
+        keys: List[Tuple[bytes, bool]] = []
+        seen: Set[bytes] = set()
+
+        def collect(file_path: str, chunks: List[CodeChunk], fingerprint: Optional[Dict]):
+            if fingerprint is not None:
+                self.fingerprints[file_path] = fingerprint
+            if not chunks:
+                return
+            stats.files += 1
+            if self.dedupe_content:
+                for chunk in chunks:
+                    digest = hashlib.sha256(chunk.content.encode('utf-8')).digest()
+                    copy = digest in seen
+                    if copy:
+                        stats.duplicates += 1
+                    else:
+                        seen.add(digest)
+                    keys.append((digest, copy))
+            batch.extend(chunks)
+            while len(batch) >= self.embed_batch_size:
+                # Blocks while the embedders are behind
+                embed_queue.put((batch[:self.embed_batch_size],
+                                 keys[:self.embed_batch_size] if self.dedupe_content else None))
+                del batch[:self.embed_batch_size]
+                del keys[:self.embed_batch_size]
+
+        # Per-file logging costs a format call per file even when filtered out
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if self.parse_workers <= 1:
+            for file_path in file_paths:
+                if errors:
+                    break
+                if debug:
+                    logger.debug("Processing %s", file_path)
+                collect(str(file_path), *_record_parse_result(self.parser.parse_file_timed(str(file_path))))
+        else:
+            # Bound the number of in-flight files so the walk cannot run ahead
+            max_pending = self.parse_workers * 4
+            with ProcessPoolExecutor(max_workers=self.parse_workers,
+                                     initializer=_init_parse_worker,
+                                     initargs=(self.parser,)) as pool:
+                # In-flight futures and the file each one parses
+                pending: Dict = {}
+                for file_path in file_paths:
+                    if errors:
+                        break
+                    if len(pending) >= max_pending:
+                        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            collect(pending.pop(future), *_record_parse_result(future.result()))
+                    if debug:
+                        logger.debug("Processing %s", file_path)
+                    pending[pool.submit(_parse_in_worker, str(file_path))] = str(file_path)
+
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        collect(pending.pop(future), *_record_parse_result(future.result()))
+
+        if batch:
+            embed_queue.put((batch, keys if self.dedupe_content else None))
+
+    def _embed_stage(self, embed_queue: queue.Queue, add_queue: queue.Queue,
+                     errors: List[Exception], shared: Optional[_SharedEmbeddings]):
+        """Embed chunk batches and pass them on to the writer"""
+        while True:
+            item = embed_queue.get()
+            if item is _DONE:
+                break
+            # Keep draining after a failure so the parse stage never blocks
+            if errors:
+                continue
+            batch, keys = item
+            try:
+                if keys is None:
+                    embeddings = self.embedding_generator.generate_embeddings_batch(
+                        [chunk.content for chunk in batch]
+                    )
+                    for chunk, embedding in zip(batch, embeddings):
+                        chunk.embedding = embedding
+                elif not self._embed_deduplicated(batch, keys, shared, errors):
+                    continue
+                add_queue.put(batch)
+            except Exception as e:
+                errors.append(e)
+                if shared is not None:
+                    shared.abort()
+
+    def _embed_deduplicated(self, batch: List[CodeChunk], keys: List[Tuple[bytes, bool]],
+                            shared: _SharedEmbeddings, errors: List[Exception]) -> bool:
+        """Embed the first copy of each content and give later copies its embedding
+
+        Every copy is still indexed under its own file, so removing one file
+        never drops another's chunks. Returns False if the run failed first.
+        """
+        originals = [(chunk, digest) for chunk, (digest, copy) in zip(batch, keys) if not copy]
+        if originals:
+            embeddings = self.embedding_generator.generate_embeddings_batch(
+                [chunk.content for chunk, _ in originals]
+            )
+            for (chunk, _), embedding in zip(originals, embeddings):
+                chunk.embedding = embedding
+            shared.put_many([digest for _, digest in originals], embeddings)
+        for chunk, (digest, copy) in zip(batch, keys):
+            if copy:
+                chunk.embedding = shared.wait(digest, errors)
+                if chunk.embedding is None:
+                    return False
+        return True
+
+    def _add_stage(self, add_queue: queue.Queue, stats: IndexingStats,
+                   errors: List[Exception], shared: Optional[_SharedEmbeddings]):
+        """Stream embedded batches into the vector store (single writer)"""
+        while True:
+            batch = add_queue.get()
+            if batch is _DONE:
+                break
+            if errors:
+                continue
+            try:
+                self.vector_store.add_chunks(batch)
+                stats.chunks += len(batch)
+            except Exception as e:
+                errors.append(e)
+                # Embedders skip the rest of the run, so waits on originals would never end
+                if shared is not None:
+                    shared.abort()
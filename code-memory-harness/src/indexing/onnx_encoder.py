@@ -0,0 +1,181 @@
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# onnxruntime and transformers (plus torch, to export a model the first
+# time) are optional extras that only this backend needs:
+#     pip install onnxruntime transformers torch
+# They are imported on first use, so this module imports without them
+
+DEFAULT_CACHE_DIR = Path.home() / ".cache" / "code-memory-harness" / "onnx"
+
+
+def export_model(model_name: str, output_dir: Path, quantize: bool = True) -> Path:
+    """Export a Hugging Face encoder to ONNX, optionally int8-quantized, and return the model path
+
+    Exported files are reused on later calls.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoTokenizer
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    fp32_path = output_dir / "model.onnx"
+    int8_path = output_dir / "model.int8.onnx"
+    target = int8_path if quantize else fp32_path
+    if target.exists():
+        return target
+
+    if not fp32_path.exists():
+        import torch
+        from transformers import AutoModel
+
+        logger.info(f"Exporting {model_name} to ONNX")
+        model = AutoModel.from_pretrained(model_name).eval()
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        sample = tokenizer(["def f(x): return x"], return_tensors="pt")
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (sample["input_ids"], sample["attention_mask"]),
+                str(fp32_path),
+                input_names=["input_ids", "attention_mask"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "last_hidden_state": {0: "batch", 1: "sequence"},
+                },
+                opset_version=14,
+            )
+
+    if quantize:
+        # Dynamic quantization: int8 weights, activations quantized per batch
+        logger.info(f"Quantizing {fp32_path.name} to int8")
+        quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+
+    return target
+
+
+# Encoder owned by each worker process of a multi-process encode
+_worker_encoder: Optional["OnnxEncoder"] = None
+
+
+def _init_encode_worker(model_name: str, model_path: str, intra_op_threads: int, max_length: int, batch_size: int):
+    global _worker_encoder
+    _worker_encoder = OnnxEncoder(model_name, model_path=model_path, intra_op_threads=intra_op_threads,
+                                  max_length=max_length, batch_size=batch_size, processes=1)
+
+
+def _encode_in_worker(texts: List[str]) -> np.ndarray:
+    return _worker_encoder.encode(texts)
+
+
+class OnnxEncoder:
+    """CPU sentence encoder on ONNX Runtime with int8 dynamic quantization
+
+    A drop-in for the SentenceTransformer calls EmbeddingGenerator makes
+    (encode / get_sentence_embedding_dimension), producing mean-pooled
+    embeddings. Inputs are sorted by length so each batch pads to similar
+    lengths, and large inputs can be spread over `processes` worker
+    processes that split the cores between them.
+    """
+
+    def __init__(self,
+                 model_name: str,
+                 model_path: Optional[str] = None,
+                 cache_dir: Optional[str] = None,
+                 quantize: bool = True,
+                 intra_op_threads: Optional[int] = None,
+                 processes: int = 1,
+                 max_length: int = 512,
+                 batch_size: int = 32):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.model_path = model_path or str(export_model(
+            model_name, Path(cache_dir or DEFAULT_CACHE_DIR) / model_name.replace('/', '--'), quantize
+        ))
+        self.processes = max(1, processes)
+        # Each process gets an equal share of the cores unless told otherwise
+        self.intra_op_threads = intra_op_threads or max(1, (os.cpu_count() or 1) // self.processes)
+        self.max_length = max_length
+        self.batch_size = batch_size
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = self.intra_op_threads
+        options.inter_op_num_threads = 1
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self._input_names = {node.name for node in self.session.get_inputs()}
+        self._dimension: Optional[int] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        # Embed threads may call encode() at once; only one may start the pool
+        self._pool_lock = threading.Lock()
+
+    def get_sentence_embedding_dimension(self) -> int:
+        if self._dimension is None:
+            self._dimension = int(self.encode(["dimension probe"]).shape[1])
+        return self._dimension
+
+    def encode(self, texts: Union[str, List[str]], batch_size: Optional[int] = None) -> np.ndarray:
+        """Embed texts, returning a float32 array (a single vector for a single string)"""
+        if isinstance(texts, str):
+            return self.encode([texts], batch_size)[0]
+        if not texts:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        batch_size = batch_size or self.batch_size
+        # Longest first, so every batch pads to inputs of similar length
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        sorted_texts = [texts[i] for i in order]
+
+        if self.processes > 1 and len(texts) >= self.processes * batch_size:
+            sorted_embeddings = self._encode_multi_process(sorted_texts, batch_size)
+        else:
+            sorted_embeddings = np.concatenate([
+                self._encode_batch(sorted_texts[start:start + batch_size])
+                for start in range(0, len(sorted_texts), batch_size)
+            ])
+
+        embeddings = np.empty_like(sorted_embeddings)
+        embeddings[order] = sorted_embeddings
+        return embeddings
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(texts, padding=True, truncation=True, max_length=self.max_length, return_tensors="np")
+        inputs = {name: encoded[name].astype(np.int64) for name in ("input_ids", "attention_mask", "token_type_ids")
+                  if name in self._input_names and name in encoded}
+        hidden = self.session.run(None, inputs)[0]
+
+        # Mean pooling over real tokens, as SentenceTransformer does by default
+        mask = encoded["attention_mask"][..., np.newaxis].astype(np.float32)
+        return ((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)).astype(np.float32)
+
+    def _encode_multi_process(self, sorted_texts: List[str], batch_size: int) -> np.ndarray:
+        """Encode length-sorted texts across worker processes, batch by batch"""
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    initializer=_init_encode_worker,
+                    initargs=(self.model_name, self.model_path, self.intra_op_threads, self.max_length, batch_size)
+                )
+            pool = self._pool
+        # Whole batches per task keep the length-sorted padding benefit
+        slices = [sorted_texts[start:start + batch_size] for start in range(0, len(sorted_texts), batch_size)]
+        return np.concatenate(list(pool.map(_encode_in_worker, slices)))
+
+    def close(self):
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown()
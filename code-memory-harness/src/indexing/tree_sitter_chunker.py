@@ -0,0 +1,189 @@
+import logging
+from typing import Dict, List, Optional, Tuple
+
+from src.core.code_chunk import CodeChunk
+
+try:
+    from tree_sitter_languages import get_parser
+except ImportError:  # grammars not installed; CodeParser keeps the regex path
+    get_parser = None
+
+logger = logging.getLogger(__name__)
+
+# Definition node types chunked per grammar, mapped to the chunk_type they produce
+DEFINITION_TYPES: Dict[str, Dict[str, str]] = {
+    'javascript': {
+        'function_declaration': 'function',
+        'generator_function_declaration': 'function',
+        'method_definition': 'function',
+        'class_declaration': 'class',
+    },
+    'typescript': {
+        'function_declaration': 'function',
+        'generator_function_declaration': 'function',
+        'method_definition': 'function',
+        'class_declaration': 'class',
+        'abstract_class_declaration': 'class',
+        'interface_declaration': 'class',
+        'enum_declaration': 'class',
+    },
+    'java': {
+        'method_declaration': 'function',
+        'constructor_declaration': 'function',
+        'class_declaration': 'class',
+        'interface_declaration': 'class',
+        'enum_declaration': 'class',
+        'record_declaration': 'class',
+    },
+    'go': {
+        'function_declaration': 'function',
+        'method_declaration': 'function',
+        'type_declaration': 'class',
+    },
+    'rust': {
+        'function_item': 'function',
+        'struct_item': 'class',
+        'enum_item': 'class',
+        'trait_item': 'class',
+        'impl_item': 'class',
+    },
+    'c': {
+        'function_definition': 'function',
+        'struct_specifier': 'class',
+    },
+    'cpp': {
+        'function_definition': 'function',
+        'class_specifier': 'class',
+        'struct_specifier': 'class',
+    },
+}
+
+# `const f = () => ...` and `const f = function () ...` count as functions
+_FUNCTION_VALUES = {'arrow_function', 'function', 'function_expression', 'generator_function'}
+
+# Grammar parsers are created on first use in each process (they cannot be pickled)
+_parsers: Dict[str, Optional[object]] = {}
+
+
+def _parser_for(language: str):
+    if language not in _parsers:
+        parser = None
+        if get_parser is not None and language in DEFINITION_TYPES:
+            try:
+                parser = get_parser(language)
+            except Exception as e:
+                logger.warning(f"No tree-sitter grammar for {language}, using regex chunking: {e}")
+        _parsers[language] = parser
+    return _parsers[language]
+
+
+def _node_name(node) -> Optional[str]:
+    """Best-effort identifier of a definition node"""
+    name = node.child_by_field_name('name')
+    if name is None and node.type == 'impl_item':
+        name = node.child_by_field_name('type')
+    if name is None and node.type == 'type_declaration':
+        spec = next((child for child in node.children if child.type == 'type_spec'), None)
+        name = spec.child_by_field_name('name') if spec is not None else None
+
+    # C/C++ functions name themselves through nested declarators
+    declarator = node
+    while name is None and declarator is not None:
+        declarator = declarator.child_by_field_name('declarator')
+        if declarator is not None and declarator.type in (
+                'identifier', 'field_identifier', 'qualified_identifier', 'destructor_name', 'operator_name'):
+            name = declarator
+
+    return name.text.decode('utf-8', errors='replace') if name is not None else None
+
+
+class TreeSitterChunker:
+    """Grammar-based chunking of classes, functions and methods
+
+    Each definition becomes one chunk named by its qualified name (for
+    example "Server.handle"). Chunks are bounded to max_lines: oversized
+    functions are split into overlapping windows, and oversized containers
+    keep only their first window since their members are chunked on their own.
+    """
+
+    def __init__(self, max_lines: int = 50, overlap: int = 10):
+        self.max_lines = max_lines
+        self.overlap = overlap
+
+    @staticmethod
+    def available(language: str) -> bool:
+        """Whether a grammar for the language can be loaded"""
+        return _parser_for(language) is not None
+
+    def chunk(self, content: str, file_path: str, language: str) -> Optional[List[CodeChunk]]:
+        """Definition chunks of one file, or None when the language has no grammar"""
+        parser = _parser_for(language)
+        if parser is None:
+            return None
+
+        definition_types = DEFINITION_TYPES[language]
+        tree = parser.parse(content.encode('utf-8'))
+        lines = content.split('\n')
+        chunks = []
+
+        # Iterative walk; each entry carries the names of its enclosing definitions
+        stack: List[Tuple[object, Tuple[str, ...]]] = [(tree.root_node, ())]
+        while stack:
+            node, scope = stack.pop()
+            chunk_type = definition_types.get(node.type)
+            name = None
+
+            if chunk_type is None and node.type == 'variable_declarator':
+                value = node.child_by_field_name('value')
+                if value is not None and value.type in _FUNCTION_VALUES:
+                    chunk_type = 'function'
+
+            if chunk_type is not None:
+                name = _node_name(node)
+                # Forward declarations (`struct foo;`) have no body worth chunking
+                if node.type.endswith('_specifier') and node.child_by_field_name('body') is None:
+                    chunk_type = None
+
+            if chunk_type is not None:
+                qualified_name = '.'.join(scope + (name,)) if name else None
+                chunks.extend(self._definition_chunks(node, chunk_type, qualified_name, lines,
+                                                      file_path, language))
+                if name:
+                    scope = scope + (name,)
+
+            # Reversed so definitions come out in source order
+            stack.extend((child, scope) for child in reversed(node.children))
+
+        return chunks
+
+    def _definition_chunks(self,
+                           node,
+                           chunk_type: str,
+                           name: Optional[str],
+                           lines: List[str],
+                           file_path: str,
+                           language: str) -> List[CodeChunk]:
+        """One chunk per definition, split into bounded windows when too long"""
+        start = node.start_point[0]
+        end = min(node.end_point[0] + 1, len(lines))
+
+        if end - start <= self.max_lines:
+            windows = [(start, end)]
+        elif chunk_type == 'class':
+            windows = [(start, start + self.max_lines)]
+        else:
+            step = max(1, self.max_lines - self.overlap)
+            windows = [(i, min(i + self.max_lines, end)) for i in range(start, end - self.overlap, step)]
+
+        return [
+            CodeChunk(
+                content='\n'.join(lines[window_start:window_end]),
+                file_path=file_path,
+                start_line=window_start + 1,
+                end_line=window_end,
+                chunk_type=chunk_type,
+                language=language,
+                name=name
+            )
+            for window_start, window_end in windows
+        ]
@@ -24,7 +24,33 @@ class ErrorStreamMonitor:
                 self._position = f.tell()
                 yield line.rstrip("\n")
 
-    async def tail(self, callback) -> None:
-        """Utility helper to call *callback* for each error line."""
-        async for line in self.stream_errors():
-            await callback(line)
+    async def tail(self, callback, max_concurrency: int = 1) -> None:
+        """Utility helper to call *callback* for each error line.
+
+        With ``max_concurrency`` above one, callbacks run as concurrent tasks
+        (e.g. retrievals against an ``AsyncMemoryEngine``) and reading pauses
+        once that many are in flight.
+        """
+        if max_concurrency <= 1:
+            async for line in self.stream_errors():
+                await callback(line)
+            return
+
+        slots = asyncio.Semaphore(max_concurrency)
+        pending = set()
+
+        async def run(line: str) -> None:
+            try:
+                await callback(line)
+            finally:
+                slots.release()
+
+        try:
+            async for line in self.stream_errors():
+                await slots.acquire()
+                task = asyncio.create_task(run(line))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        finally:
+            for task in pending:
+                task.cancel()
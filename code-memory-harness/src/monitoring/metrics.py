@@ -0,0 +1,206 @@
+"""Lightweight in-process metrics: counters, gauges and latency timers."""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Timer:
+    __slots__ = ('registry', 'name', 'start')
+
+    def __init__(self, registry: "MetricsRegistry", name: str) -> None:
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.registry.observe(self.name, time.perf_counter() - self.start)
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullTimer":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and latency histograms.
+
+    While disabled, ``inc`` and ``observe`` return immediately and ``timer``
+    hands out a shared no-op context manager, so instrumented hot paths pay
+    one attribute check. Gauges are always recorded; they are meant to be
+    set when a snapshot is collected rather than on hot paths.
+    """
+
+    def __init__(self, enabled: bool = False, prefix: str = "code_memory", buckets=DEFAULT_BUCKETS) -> None:
+        self.enabled = enabled
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        # name -> [per-bucket counts (last is +Inf), sum, count]
+        self._timers: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def inc(self, name: str, value: float = 1) -> None:
+        """Add value to a counter."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, seconds: float) -> None:
+        """Record one duration in a timer's histogram."""
+        if not self.enabled:
+            return
+        bucket = bisect_left(self.buckets, seconds)
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                timer = self._timers[name] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            timer[0][bucket] += 1
+            timer[1] += seconds
+            timer[2] += 1
+
+    def timer(self, name: str):
+        """Context manager that observes the time spent in its block."""
+        return _Timer(self, name) if self.enabled else _NULL_TIMER
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timers.clear()
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Current values as plain dicts; timers report count, total and mean seconds."""
+        with self._lock:
+            return {
+                'counters': dict(self._counters),
+                'gauges': dict(self._gauges),
+                'timers': {
+                    name: {'count': count, 'seconds': total, 'mean_seconds': total / count if count else 0.0}
+                    for name, (_, total, count) in self._timers.items()
+                },
+            }
+
+    def render_prometheus(self) -> str:
+        """Current values in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            for name, value in sorted(self._counters.items()):
+                metric = f"{self.prefix}_{name}"
+                lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+            for name, value in sorted(self._gauges.items()):
+                metric = f"{self.prefix}_{name}"
+                lines += [f"# TYPE {metric} gauge", f"{metric} {value}"]
+            for name, (counts, total, count) in sorted(self._timers.items()):
+                metric = f"{self.prefix}_{name}"
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f'{metric}_bucket{{le="+Inf"}} {count}')
+                lines += [f"{metric}_sum {total}", f"{metric}_count {count}"]
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry used by the instrumented modules; set
+# CODE_MEMORY_METRICS=1 or call metrics.enable() to start recording
+metrics = MetricsRegistry(enabled=os.getenv("CODE_MEMORY_METRICS", "0") not in ("", "0"))
+
+
+class MetricsServer:
+    """Serve ``GET /metrics`` in the Prometheus text format on a background thread.
+
+    ``collect`` is called before each scrape, e.g. ``MemoryEngine.collect_metrics``
+    to refresh index size and cache gauges.
+    """
+
+    def __init__(self,
+                 registry: MetricsRegistry = metrics,
+                 host: str = "127.0.0.1",
+                 port: int = 9464,
+                 collect: Optional[Callable[[], object]] = None) -> None:
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self.collect = collect
+        self._server = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self._server.server_address[1]}/metrics"
+
+    def _handler(self):
+        # http.server is only needed once something serves metrics
+        from http.server import BaseHTTPRequestHandler
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                if server.collect is not None:
+                    server.collect()
+                body = server.registry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args) -> None:
+                pass
+
+        return Handler
+
+    def start(self) -> "MetricsServer":
+        from http.server import ThreadingHTTPServer
+
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "MetricsServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
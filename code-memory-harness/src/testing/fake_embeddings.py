@@ -0,0 +1,48 @@
+"""In-process deterministic embedding provider, for running the pipeline offline."""
+
+import hashlib
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+
+class FakeEmbeddingGenerator:
+    """Drop-in for EmbeddingGenerator that needs no model or network.
+
+    Each text maps to a fixed unit vector seeded from its SHA-256, so runs
+    are reproducible and identical texts share an embedding. ``latency``
+    seconds are slept per request of up to ``batch_size`` texts to stand in
+    for provider round trips.
+    """
+
+    def __init__(self, dimension: int = 1536, latency: float = 0.0, batch_size: int = 2048) -> None:
+        self.provider = "fake"
+        self.model_name = "fake-sha256"
+        self.dimension = dimension
+        self.latency = latency
+        self.batch_size = batch_size
+        self.cache = None
+        self.requests = 0
+        self.texts = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+        return vector / np.linalg.norm(vector)
+
+    def generate_embedding(self, text: str) -> np.ndarray:
+        return self.generate_embeddings_batch([text])[0]
+
+    def generate_embeddings_batch(self, texts: List[str], batch_size: Optional[int] = None,
+                                  persist: bool = True) -> List[np.ndarray]:
+        batch_size = batch_size or self.batch_size
+        requests = -(-len(texts) // batch_size)
+        if self.latency and requests:
+            time.sleep(self.latency * requests)
+        with self._lock:
+            self.requests += requests
+            self.texts += len(texts)
+        return [self._vector(text) for text in texts]
@@ -0,0 +1,135 @@
+"""Local stand-in for the OpenAI embeddings endpoint, for exercising batching."""
+
+import hashlib
+import json
+import random
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import numpy as np
+
+
+class StubEmbeddingServer:
+    """Serve deterministic embeddings at ``POST /v1/embeddings``.
+
+    Point ``EmbeddingGenerator(api_base=server.url)`` at it. The server can
+    throttle (HTTP 429) a fraction of requests or any request beyond
+    ``max_concurrent`` in flight, fail a fraction with HTTP 500, and add
+    latency, so retry and backoff paths run without a real API key.
+    """
+
+    def __init__(self,
+                 dimension: int = 1536,
+                 latency: float = 0.0,
+                 throttle_rate: float = 0.0,
+                 failure_rate: float = 0.0,
+                 max_concurrent: Optional[int] = None,
+                 retry_after: Optional[float] = None,
+                 seed: int = 0) -> None:
+        self.dimension = dimension
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.failure_rate = failure_rate
+        self.max_concurrent = max_concurrent
+        self.retry_after = retry_after
+        self.requests: List[int] = []
+        self.throttled = 0
+        self.failed = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def embed(self, text: str) -> List[float]:
+        """The embedding served for *text*."""
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32).tolist()
+
+    def start(self) -> "StubEmbeddingServer":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "StubEmbeddingServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _decide(self) -> int:
+        """HTTP status for the next request."""
+        with self._lock:
+            if self.max_concurrent is not None and self._active >= self.max_concurrent:
+                self.throttled += 1
+                return 429
+            roll = self._random.random()
+            if roll < self.throttle_rate:
+                self.throttled += 1
+                return 429
+            if roll < self.throttle_rate + self.failure_rate:
+                self.failed += 1
+                return 500
+            self._active += 1
+            return 200
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                pass
+
+            def _reply(self, status: int, body: Dict, headers: Optional[Dict] = None) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self) -> None:
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                inputs = payload["input"]
+                if isinstance(inputs, str):
+                    inputs = [inputs]
+
+                status = stub._decide()
+                if status == 429:
+                    headers = {"Retry-After": str(stub.retry_after)} if stub.retry_after is not None else None
+                    self._reply(429, {"error": {"message": "Rate limit reached", "type": "requests"}}, headers)
+                    return
+                if status == 500:
+                    self._reply(500, {"error": {"message": "Internal error", "type": "server_error"}})
+                    return
+
+                try:
+                    if stub.latency:
+                        threading.Event().wait(stub.latency)
+                    data = [{"object": "embedding", "index": i, "embedding": stub.embed(text)}
+                            for i, text in enumerate(inputs)]
+                    with stub._lock:
+                        stub.requests.append(len(inputs))
+                    self._reply(200, {"object": "list", "data": data, "model": payload.get("model"),
+                                      "usage": {"prompt_tokens": 0, "total_tokens": 0}})
+                finally:
+                    with stub._lock:
+                        stub._active -= 1
+
+        return Handler
@@ -0,0 +1,82 @@
+import time
+from typing import Dict, List, Optional
+
+from src.core.tokenizer import get_encoding
+from src.indexing.code_parser import CodeParser
+from src.indexing.tree_sitter_chunker import TreeSitterChunker
+
+# One definition per language, repeated with a counter to build large files
+_TEMPLATES = {
+    'javascript': "class Widget{i} {{\n  render(props) {{\n    return props.items.map((item) => item * {i});\n  }}\n}}\n\n"
+                  "const handler{i} = (event) => {{\n  console.log(event.type, {i});\n}};\n",
+    'typescript': "interface Shape{i} {{\n  area(): number;\n}}\n\n"
+                  "function build{i}(size: number): Shape{i} {{\n  return {{ area: () => size * {i} }};\n}}\n",
+    'java': "class Service{i} {{\n  private int count = {i};\n\n  public int next(int step) {{\n"
+            "    count += step;\n    return count;\n  }}\n}}\n",
+    'go': "type Store{i} struct {{\n\titems map[string]int\n}}\n\n"
+          "func (s *Store{i}) Put(key string, value int) {{\n\ts.items[key] = value + {i}\n}}\n",
+    'rust': "struct Counter{i} {{\n    value: u64,\n}}\n\nimpl Counter{i} {{\n"
+            "    fn bump(&mut self) -> u64 {{\n        self.value += {i};\n        self.value\n    }}\n}}\n",
+    'c': "static int checksum_{i}(const char *data, int length) {{\n    int sum = {i};\n"
+         "    for (int k = 0; k < length; k++) {{\n        sum += data[k];\n    }}\n    return sum;\n}}\n",
+    'cpp': "class Buffer{i} {{\npublic:\n  int size() const {{ return {i}; }}\n  void clear() {{\n    data_.clear();\n  }}\n"
+           "private:\n  std::vector<int> data_;\n}};\n",
+}
+
+
+def generate_source(language: str, num_definitions: int, start: int = 0) -> str:
+    """Synthesize a source file with num_definitions repeated definitions, numbered from start"""
+    return "\n".join(_TEMPLATES[language].format(i=i) for i in range(start, start + num_definitions))
+
+
+class ChunkerBenchmark:
+    """Compare tree-sitter and regex definition chunking per language
+
+    Reports chunks/s, the average and maximum chunk size in tokens, and the
+    maximum chunk length in lines. Languages without an installed grammar
+    only get a regex row.
+    """
+
+    def __init__(self, chunk_size: int = 50, overlap: int = 10, model: str = "gpt-4"):
+        self.parser = CodeParser(chunk_size, overlap, use_tree_sitter=False)
+        self.tree_sitter = TreeSitterChunker(chunk_size, overlap)
+        self.encoding = get_encoding(model)
+
+    def run(self, num_definitions: int = 500, languages: Optional[List[str]] = None) -> List[Dict]:
+        rows = []
+        for language in languages or list(_TEMPLATES):
+            content = generate_source(language, num_definitions)
+            file_path = f"generated.{language}"
+
+            methods = {'regex': lambda: self.parser._parse_regex(content.split('\n'), file_path, language)}
+            if self.tree_sitter.available(language):
+                methods['tree-sitter'] = lambda: self.tree_sitter.chunk(content, file_path, language)
+
+            for method, chunk in methods.items():
+                start = time.perf_counter()
+                chunks = chunk()
+                seconds = time.perf_counter() - start
+
+                tokens = [len(self.encoding.encode(c.content)) for c in chunks] or [0]
+                rows.append({
+                    'language': language,
+                    'method': method,
+                    'chunks': len(chunks),
+                    'chunks_per_second': len(chunks) / seconds if seconds > 0 else 0.0,
+                    'avg_tokens': sum(tokens) / len(tokens),
+                    'max_tokens': max(tokens),
+                    'max_lines': max((c.end_line - c.start_line + 1 for c in chunks), default=0),
+                })
+        return rows
+
+    @staticmethod
+    def format_report(rows: List[Dict]) -> str:
+        """Render benchmark rows as a fixed-width text table"""
+        lines = [f"{'language':<11} {'method':<12} {'chunks':>7} {'chunks/s':>10} "
+                 f"{'avg tok':>8} {'max tok':>8} {'max lines':>9}"]
+        for row in rows:
+            lines.append(
+                f"{row['language']:<11} {row['method']:<12} {row['chunks']:>7} {row['chunks_per_second']:>10.0f} "
+                f"{row['avg_tokens']:>8.1f} {row['max_tokens']:>8} {row['max_lines']:>9}"
+            )
+        return "\n".join(lines)
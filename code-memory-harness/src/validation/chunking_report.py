@@ -0,0 +1,139 @@
+import ast
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.core.vector_store import CodeChunk, SimpleVectorStore
+from src.indexing.code_parser import CodeParser
+from src.indexing.embedding_generator import EmbeddingGenerator
+
+# (chunk_mode, dedupe_content) settings compared by default
+DEFAULT_SETTINGS = [
+    ('overlapping', False),
+    ('minimal', False),
+    ('minimal', True),
+]
+
+
+def build_query_set(file_paths: List[str], num_queries: int = 100) -> List[Dict]:
+    """Fixed queries from Python docstrings, each expecting its definition's file and line
+
+    The first docstring line of every documented function or class is a
+    query; a retrieval hits when a returned chunk covers the definition.
+    Queries are taken at even strides over the sorted candidates, so the
+    set only changes when the code does.
+    """
+    candidates = []
+    for file_path in sorted(str(path) for path in file_paths):
+        if not file_path.endswith('.py'):
+            continue
+        try:
+            tree = ast.parse(Path(file_path).read_text(encoding='utf-8'))
+        except Exception:
+            continue
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                docstring = ast.get_docstring(node)
+                if docstring and docstring.strip():
+                    candidates.append({
+                        'query': docstring.strip().split('\n')[0],
+                        'file_path': file_path,
+                        'line': node.lineno
+                    })
+
+    if len(candidates) > num_queries:
+        stride = len(candidates) / num_queries
+        candidates = [candidates[int(i * stride)] for i in range(num_queries)]
+    return candidates
+
+
+class ChunkingReport:
+    """Compare chunking settings by index size and retrieval hit rate
+
+    Each setting parses the same files, embeds the chunks into an in-memory
+    flat store and answers the same fixed query set; sizes are reported
+    relative to the first setting. As in IndexingPipeline, dedupe_content
+    indexes every chunk but embeds each distinct content once, so it
+    reduces embedded lines rather than index size.
+    """
+
+    def __init__(self, embedding_generator: EmbeddingGenerator, k: int = 5, chunk_size: int = 50, overlap: int = 10):
+        self.embedding_generator = embedding_generator
+        self.k = k
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+
+    def run(self,
+            file_paths: List[str],
+            queries: Optional[List[Dict]] = None,
+            settings: Optional[List] = None) -> List[Dict]:
+        file_paths = [str(path) for path in file_paths]
+        if queries is None:
+            queries = build_query_set(file_paths)
+        query_embeddings = (np.stack(self.embedding_generator.generate_embeddings_batch([q['query'] for q in queries]))
+                            if queries else None)
+
+        rows = []
+        for chunk_mode, dedupe_content in settings or DEFAULT_SETTINGS:
+            parser = CodeParser(self.chunk_size, self.overlap, chunk_mode=chunk_mode)
+            chunks = [chunk for file_path in file_paths for chunk in parser.parse_file(file_path)]
+
+            # The first chunk with each content is embedded for all of them
+            first: Dict[str, CodeChunk] = {}
+            for chunk in chunks:
+                first.setdefault(chunk.content, chunk)
+            embedded_chunks = list(first.values()) if dedupe_content else chunks
+
+            store = SimpleVectorStore(dimension=self.embedding_generator.dimension, metric='cosine')
+            if chunks:
+                embeddings = self.embedding_generator.generate_embeddings_batch(
+                    [chunk.content for chunk in embedded_chunks])
+                for chunk, embedding in zip(embedded_chunks, embeddings):
+                    chunk.embedding = embedding
+                if dedupe_content:
+                    for chunk in chunks:
+                        chunk.embedding = first[chunk.content].embedding
+                store.add_chunks(chunks)
+
+            rows.append({
+                'chunk_mode': chunk_mode,
+                'dedupe_content': dedupe_content,
+                'chunks': store.ntotal,
+                'duplicates': len(chunks) - len(embedded_chunks),
+                'embedded_lines': sum(chunk.end_line - chunk.start_line + 1 for chunk in embedded_chunks),
+                'index_bytes': store.ntotal * store.dimension * 4 + sum(len(chunk.content.encode('utf-8')) for chunk in chunks),
+                'hit_rate': self._hit_rate(store, queries, query_embeddings),
+            })
+
+        baseline = rows[0]['index_bytes'] if rows else 0
+        for row in rows:
+            row['size_reduction'] = 1 - row['index_bytes'] / baseline if baseline else 0.0
+        return rows
+
+    def _hit_rate(self, store: SimpleVectorStore, queries: List[Dict], query_embeddings: Optional[np.ndarray]) -> float:
+        """Fraction of queries with a top-k chunk covering the expected definition"""
+        if not queries or store.ntotal == 0:
+            return 0.0
+        _, ids = store.search_batch(query_embeddings, self.k)
+
+        hits = 0
+        for query, row in zip(queries, ids):
+            for idx in row.tolist():
+                chunk = store.get_chunk(idx) if idx != -1 else None
+                if chunk and chunk.file_path == query['file_path'] and chunk.start_line <= query['line'] <= chunk.end_line:
+                    hits += 1
+                    break
+        return hits / len(queries)
+
+    @staticmethod
+    def format_report(rows: List[Dict]) -> str:
+        """Render report rows as a fixed-width text table"""
+        lines = [f"{'mode':<12} {'dedupe':<7} {'chunks':>7} {'lines':>8} {'size MB':>8} {'saved':>7} {'hit rate':>9}"]
+        for row in rows:
+            lines.append(
+                f"{row['chunk_mode']:<12} {str(row['dedupe_content']):<7} {row['chunks']:>7} "
+                f"{row['embedded_lines']:>8} {row['index_bytes'] / 1e6:>8.2f} "
+                f"{row['size_reduction']:>7.1%} {row['hit_rate']:>9.3f}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,72 @@
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.indexing.onnx_encoder import OnnxEncoder
+
+
+class LocalEmbeddingBenchmark:
+    """Compare local embedding backends against the fp32 SentenceTransformer
+
+    Every backend embeds the same chunk texts; rows report chunks/s and the
+    cosine agreement (mean and minimum per-chunk cosine similarity) of its
+    vectors with the fp32 reference. Needs the optional sentence-transformers
+    package and the ONNX backend's extras (see onnx_encoder).
+    """
+
+    def __init__(self, model_name: str = "microsoft/codebert-base", processes: Optional[List[int]] = None):
+        self.model_name = model_name
+        self.processes = processes or [1, 4]
+
+    def run(self, texts: List[str]) -> List[Dict]:
+        from sentence_transformers import SentenceTransformer
+
+        # Same prefix EmbeddingGenerator adds for local models
+        texts = [f"Code: {text}" for text in texts]
+
+        reference_model = SentenceTransformer(self.model_name)
+        start = time.perf_counter()
+        reference = np.asarray(reference_model.encode(texts, batch_size=10), dtype=np.float32)
+        rows = [self._row('torch fp32 (batch 10)', texts, reference, reference, time.perf_counter() - start)]
+
+        for quantize in (False, True):
+            for processes in self.processes:
+                encoder = OnnxEncoder(self.model_name, quantize=quantize, processes=processes)
+                try:
+                    # Warm up sessions (and worker processes) outside the timing
+                    encoder.encode(texts[:encoder.batch_size * processes])
+                    start = time.perf_counter()
+                    embeddings = encoder.encode(texts)
+                    seconds = time.perf_counter() - start
+                finally:
+                    encoder.close()
+                name = f"onnx {'int8' if quantize else 'fp32'} x{processes}"
+                rows.append(self._row(name, texts, embeddings, reference, seconds))
+
+        return rows
+
+    @staticmethod
+    def _row(name: str, texts: List[str], embeddings: np.ndarray, reference: np.ndarray, seconds: float) -> Dict:
+        a = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        b = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+        agreement = (a * b).sum(axis=1)
+        return {
+            'backend': name,
+            'chunks': len(texts),
+            'seconds': seconds,
+            'chunks_per_second': len(texts) / seconds if seconds > 0 else 0.0,
+            'mean_cosine': float(agreement.mean()),
+            'min_cosine': float(agreement.min()),
+        }
+
+    @staticmethod
+    def format_report(rows: List[Dict]) -> str:
+        """Render benchmark rows as a fixed-width text table"""
+        lines = [f"{'backend':<24} {'chunks/s':>9} {'mean cos':>9} {'min cos':>8}"]
+        for row in rows:
+            lines.append(
+                f"{row['backend']:<24} {row['chunks_per_second']:>9.1f} "
+                f"{row['mean_cosine']:>9.4f} {row['min_cosine']:>8.4f}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,126 @@
+import time
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+
+from src.core.vector_store import METRICS, SimpleVectorStore, build_index, min_training_points, set_search_params
+
+
+# Index configurations compared by default; each is swept over its search knob
+DEFAULT_CONFIGS = [
+    {'index_type': 'flat'},
+    {'index_type': 'ivfflat', 'nprobe': [1, 8, 32, 128]},
+    {'index_type': 'ivfpq', 'nprobe': [8, 32, 128]},
+    {'index_type': 'hnsw', 'ef_search': [16, 64, 256]},
+]
+
+
+class IndexBenchmark:
+    """Compare ANN index types against the exact flat baseline on one store
+
+    Vectors are reconstructed from the store, every candidate index is built
+    from the same vectors, and recall@k is measured against exact search on
+    a sample of stored vectors used as queries.
+    """
+
+    def __init__(self, vector_store: SimpleVectorStore, k: int = 10, num_queries: int = 200, seed: int = 0):
+        self.vector_store = vector_store
+        self.k = k
+        self.num_queries = num_queries
+        self.seed = seed
+
+    def run(self, configs: Optional[List[Dict]] = None) -> List[Dict]:
+        """Return one report row per (index type, search knob) setting"""
+        ids, vectors = self.vector_store.get_vectors()
+        if len(vectors) == 0:
+            return []
+
+        rng = np.random.default_rng(self.seed)
+        sample = rng.choice(len(vectors), size=min(self.num_queries, len(vectors)), replace=False)
+        queries = vectors[sample]
+        k = min(self.k, len(vectors))
+
+        metric = self.vector_store.metric
+        exact = faiss.IndexFlat(vectors.shape[1], METRICS[metric])
+        exact.add(vectors)
+        _, truth = exact.search(queries, k)
+        truth_ids = ids[truth]
+
+        # Default IVF sizing for the store at hand (~4 * sqrt(n) lists)
+        nlist = max(1, min(int(4 * np.sqrt(len(vectors))), len(vectors) // 39 or 1))
+
+        report = []
+        for config in configs or DEFAULT_CONFIGS:
+            index_type = config['index_type']
+            params = {key: value for key, value in config.items()
+                      if key not in ('index_type', 'nprobe', 'ef_search')}
+            if index_type in ('ivfflat', 'ivfpq'):
+                params.setdefault('nlist', nlist)
+                required = min_training_points(index_type, params['nlist'], params.get('pq_nbits', 8))
+                if len(vectors) < required:
+                    # Too few vectors to train this index type
+                    continue
+
+            build_start = time.perf_counter()
+            index = build_index(index_type, vectors.shape[1], metric, **params)
+            if not index.is_trained:
+                index.train(vectors[:64 * params['nlist']])
+            index.add_with_ids(vectors, ids)
+            build_seconds = time.perf_counter() - build_start
+
+            if 'nprobe' in config:
+                settings = [{'nprobe': value} for value in config['nprobe']]
+            elif 'ef_search' in config:
+                settings = [{'ef_search': value} for value in config['ef_search']]
+            else:
+                settings = [{}]
+
+            for setting in settings:
+                set_search_params(index, **setting)
+                row = self._measure(index, queries, truth_ids, k)
+                row.update({
+                    'index_type': index_type,
+                    'build_seconds': build_seconds,
+                    **params,
+                    **setting
+                })
+                report.append(row)
+
+        return report
+
+    def _measure(self, index, queries: np.ndarray, truth_ids: np.ndarray, k: int) -> Dict:
+        """Per-query latency and recall@k of one configured index"""
+        latencies = []
+        hits = 0
+        for query, expected in zip(queries, truth_ids):
+            start = time.perf_counter()
+            _, found = index.search(query.reshape(1, -1), k)
+            latencies.append(time.perf_counter() - start)
+            hits += len(np.intersect1d(found[0], expected))
+
+        latencies_ms = np.array(latencies) * 1000
+        return {
+            f'recall@{k}': hits / (len(queries) * k),
+            'p50_ms': float(np.percentile(latencies_ms, 50)),
+            'p95_ms': float(np.percentile(latencies_ms, 95)),
+            'p99_ms': float(np.percentile(latencies_ms, 99)),
+        }
+
+    @staticmethod
+    def format_report(report: List[Dict]) -> str:
+        """Render report rows as a fixed-width text table"""
+        lines = [f"{'index':<10} {'setting':<16} {'recall':>8} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8}"]
+        for row in report:
+            recall = next(value for key, value in row.items() if key.startswith('recall@'))
+            if 'nprobe' in row:
+                setting = f"nprobe={row['nprobe']}"
+            elif 'ef_search' in row:
+                setting = f"efSearch={row['ef_search']}"
+            else:
+                setting = "exact"
+            lines.append(
+                f"{row['index_type']:<10} {setting:<16} {recall:>8.3f} "
+                f"{row['p50_ms']:>8.3f} {row['p95_ms']:>8.3f} {row['build_seconds']:>8.2f}"
+            )
+        return "\n".join(lines)
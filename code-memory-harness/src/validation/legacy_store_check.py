@@ -0,0 +1,115 @@
+import pickle
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, List
+
+import faiss
+import numpy as np
+
+from src.core.memory_engine import MemoryEngine
+from src.core.vector_store import CodeChunk
+from src.testing.fake_embeddings import FakeEmbeddingGenerator
+
+
+def write_baseline_store(index_path: Path, vectors: np.ndarray) -> List[CodeChunk]:
+    """Save vectors the way the original SimpleVectorStore did
+
+    That store had no metric setting: an IndexFlatL2 numbered by insertion
+    position, next to a pickle of position -> chunk.
+    """
+    chunks = [
+        CodeChunk(content=f"def function_{i}():\n    return {i}\n", file_path=f"module_{i // 10}.py",
+                  start_line=(i % 10) * 3 + 1, end_line=(i % 10) * 3 + 2, chunk_type='function',
+                  language='python', embedding=vector)
+        for i, vector in enumerate(vectors)
+    ]
+    index = faiss.IndexFlatL2(vectors.shape[1])
+    index.add(vectors)
+    faiss.write_index(index, str(index_path))
+    with open(str(index_path).replace('.index', '_metadata.pkl'), 'wb') as f:
+        pickle.dump({
+            'id_to_chunk': dict(enumerate(chunks)),
+            'chunk_id_to_index': {chunk.chunk_id: i for i, chunk in enumerate(chunks)},
+            'current_idx': len(chunks)
+        }, f)
+    return chunks
+
+
+class LegacyStoreCheck:
+    """Check that baseline-format stores load unchanged with default arguments
+
+    A store saved by the original IndexFlatL2 SimpleVectorStore is opened by
+    a MemoryEngine built with default arguments (whose metric applies only
+    to fresh indexes), once plain and once segmented, before and after
+    save() rewrites it in the current layout. Each row compares the top-k
+    chunk ids and 1 / (1 + distance) similarities with the original exact
+    L2 search.
+    """
+
+    def __init__(self, num_chunks: int = 500, dimension: int = 64, num_queries: int = 50,
+                 k: int = 10, seed: int = 0):
+        self.num_chunks = num_chunks
+        self.dimension = dimension
+        self.num_queries = num_queries
+        self.k = k
+        self.seed = seed
+
+    def run(self) -> List[Dict]:
+        rng = np.random.default_rng(self.seed)
+        vectors = rng.standard_normal((self.num_chunks, self.dimension)).astype(np.float32)
+        queries = rng.standard_normal((self.num_queries, self.dimension)).astype(np.float32)
+
+        index = faiss.IndexFlatL2(self.dimension)
+        index.add(vectors)
+        distances, positions = index.search(queries, self.k)
+
+        workdir = Path(tempfile.mkdtemp(prefix='legacy_store_check_'))
+        try:
+            rows = []
+            for segmented in (False, True):
+                store_dir = workdir / ('segmented' if segmented else 'simple')
+                store_dir.mkdir()
+                index_path = store_dir / 'vector_store.index'
+                chunks = write_baseline_store(index_path, vectors)
+                expected_ids = [[chunks[position].chunk_id for position in row] for row in positions]
+                expected = 1 / (1 + distances)
+                for stage in ('loaded', 'resaved'):
+                    engine = MemoryEngine(str(workdir), vector_store_path=str(index_path), segmented=segmented,
+                                          embedding_generator=FakeEmbeddingGenerator(self.dimension))
+                    rows.append(self._compare(engine, 'segmented' if segmented else 'simple', stage,
+                                              queries, expected_ids, expected))
+                    engine.vector_store.save()
+            return rows
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _compare(self, engine: MemoryEngine, store: str, stage: str, queries: np.ndarray,
+                 expected_ids: List[List[str]], expected: np.ndarray) -> Dict:
+        ids_match = True
+        max_error = 0.0
+        for query, row_ids, row_expected in zip(queries, expected_ids, expected):
+            results = engine.vector_store.search(query, self.k)
+            ids_match &= [chunk.chunk_id for chunk, _ in results] == row_ids
+            if len(results) == len(row_expected):
+                similarities = np.array([similarity for _, similarity in results])
+                max_error = max(max_error, float(np.abs(similarities - row_expected).max()))
+        return {
+            'store': store,
+            'stage': stage,
+            'metric': engine.vector_store.metric,
+            'ids_match': ids_match,
+            'max_similarity_error': max_error,
+            'passed': engine.vector_store.metric == 'l2' and ids_match and max_error < 1e-5,
+        }
+
+    @staticmethod
+    def format_report(rows: List[Dict]) -> str:
+        """Render check rows as a fixed-width text table"""
+        lines = [f"{'store':<10} {'stage':<8} {'metric':<7} {'ids match':>9} {'max error':>10} {'result':>7}"]
+        for row in rows:
+            lines.append(
+                f"{row['store']:<10} {row['stage']:<8} {row['metric']:<7} {str(row['ids_match']):>9} "
+                f"{row['max_similarity_error']:>10.2e} {'ok' if row['passed'] else 'FAILED':>7}"
+            )
+        return "\n".join(lines)
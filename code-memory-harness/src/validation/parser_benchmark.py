@@ -0,0 +1,90 @@
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.indexing.code_parser import CodeParser
+
+
+def generate_python_module(num_definitions: int, start: int = 0) -> str:
+    """Synthesize a module shaped like generated code: functions, classes and methods
+
+    Definitions are numbered from start, so modules built with different
+    starts have distinct content.
+    """
+    parts = ['"""Generated module"""', 'import asyncio', '']
+    for i in range(start, start + num_definitions):
+        kind = i % 4
+        if kind == 0:
+            parts.append(f"def function_{i}(x, y=None):\n    total = x + {i}\n    return total if y is None else total * y\n")
+        elif kind == 1:
+            parts.append(f"async def fetch_{i}(session):\n    await asyncio.sleep(0)\n    return session.get('/items/{i}')\n")
+        elif kind == 2:
+            parts.append(
+                f"class Model{i}:\n"
+                f"    def __init__(self):\n        self.value = {i}\n\n"
+                f"    @property\n    def doubled(self):\n        return self.value * 2\n\n"
+                f"    async def refresh(self):\n        return lambda: self.value\n"
+            )
+        else:
+            parts.append(
+                f"def outer_{i}(items):\n"
+                f"    def inner(item):\n        return item + {i}\n"
+                f"    return [inner(item) for item in items]\n"
+            )
+    return "\n".join(parts)
+
+
+class ParserBenchmark:
+    """Time CodeParser on synthetic Python modules of increasing size
+
+    Reports seconds and microseconds per line at each size, plus the slope
+    of log(time) against log(lines): about 1.0 means parsing scales
+    linearly, 2.0 quadratically.
+    """
+
+    def __init__(self, parser: Optional[CodeParser] = None, repeats: int = 3):
+        self.parser = parser or CodeParser()
+        self.repeats = repeats
+
+    def run(self, sizes: Optional[List[int]] = None) -> Dict:
+        """Parse one module per size (in definitions), keeping the best of `repeats` runs"""
+        rows = []
+        for size in sizes or [500, 1000, 2000, 4000, 8000]:
+            content = generate_python_module(size)
+            lines = content.count('\n') + 1
+
+            best = float('inf')
+            chunks = []
+            for _ in range(self.repeats):
+                start = time.perf_counter()
+                chunks = self.parser._parse_python(content, 'generated.py')
+                best = min(best, time.perf_counter() - start)
+
+            rows.append({
+                'definitions': size,
+                'lines': lines,
+                'chunks': len(chunks),
+                'seconds': best,
+                'us_per_line': best / lines * 1e6
+            })
+
+        slope = None
+        if len(rows) > 1:
+            slope = float(np.polyfit(np.log([row['lines'] for row in rows]),
+                                     np.log([row['seconds'] for row in rows]), 1)[0])
+
+        return {'rows': rows, 'scaling_exponent': slope}
+
+    @staticmethod
+    def format_report(report: Dict) -> str:
+        """Render the benchmark as a fixed-width text table"""
+        lines = [f"{'defs':>8} {'lines':>8} {'chunks':>8} {'seconds':>9} {'us/line':>9}"]
+        for row in report['rows']:
+            lines.append(
+                f"{row['definitions']:>8} {row['lines']:>8} {row['chunks']:>8} "
+                f"{row['seconds']:>9.4f} {row['us_per_line']:>9.2f}"
+            )
+        if report['scaling_exponent'] is not None:
+            lines.append(f"scaling exponent: {report['scaling_exponent']:.2f} (1.0 = linear)")
+        return "\n".join(lines)
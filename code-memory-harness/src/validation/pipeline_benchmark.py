@@ -0,0 +1,332 @@
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.core.memory_engine import MemoryEngine
+from src.core.tokenizer import get_encoding
+from src.core.vector_store import SimpleVectorStore
+from src.testing.fake_embeddings import FakeEmbeddingGenerator
+from src.validation.chunker_benchmark import generate_source
+from src.validation.parser_benchmark import generate_python_module
+from src.validation.startup_benchmark import StartupBenchmark
+
+# Extension per generated language; about half the files are Python
+LANGUAGE_EXTENSIONS = {
+    'python': '.py', 'javascript': '.js', 'typescript': '.ts', 'java': '.java',
+    'go': '.go', 'rust': '.rs', 'c': '.c', 'cpp': '.cpp',
+}
+_LANGUAGE_WEIGHTS = [0.5, 0.1, 0.1, 0.1, 0.05, 0.05, 0.05, 0.05]
+
+STAGES = ('walk', 'parse', 'embed', 'add', 'save', 'load', 'search', 'compress')
+
+
+def generate_codebase(root: Path, num_files: int, seed: int = 0, files_per_dir: int = 100) -> Path:
+    """Write a synthetic multi-language codebase of num_files files under root
+
+    Files hold 5-60 definitions each, numbered so no two files share
+    content. A tree already generated with the same parameters is reused.
+    """
+    root = Path(root)
+    marker = root / '.synthetic.json'
+    params = {'num_files': num_files, 'seed': seed, 'files_per_dir': files_per_dir}
+    if marker.exists() and json.loads(marker.read_text()) == params:
+        return root
+    if root.exists():
+        shutil.rmtree(root)
+
+    rng = np.random.default_rng(seed)
+    languages = rng.choice(list(LANGUAGE_EXTENSIONS), size=num_files, p=_LANGUAGE_WEIGHTS)
+    sizes = rng.integers(5, 61, size=num_files)
+    start = 0
+    for i, (language, size) in enumerate(zip(languages, sizes.tolist())):
+        directory = root / f"pkg_{i // files_per_dir:05d}"
+        directory.mkdir(parents=True, exist_ok=True)
+        if language == 'python':
+            content = generate_python_module(size, start)
+        else:
+            content = generate_source(language, size, start)
+        (directory / f"module_{i}{LANGUAGE_EXTENSIONS[language]}").write_text(content)
+        start += size
+
+    marker.write_text(json.dumps(params))
+    return root
+
+
+def _rss_bytes() -> int:
+    """Current resident set size, or the peak so far where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class _PeakMemory:
+    """Sample RSS on a background thread while a stage runs
+
+    Unlike tracemalloc this also sees FAISS's native allocations.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.start = 0
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, _rss_bytes())
+
+    def __enter__(self) -> "_PeakMemory":
+        self.start = self.peak = _rss_bytes()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _rss_bytes())
+
+
+class PipelineBenchmark:
+    """Time each stage of indexing and retrieval on synthetic codebases
+
+    Runs offline against a FakeEmbeddingGenerator and reports, per stage,
+    total seconds, throughput, p50/p95/p99 latency of its unit of work
+    (file, embedding batch, query, ...) and peak RSS. Stages run one after
+    another rather than through IndexingPipeline, so each is measured on
+    its own; results are JSON-serializable for comparison across commits.
+    """
+
+    def __init__(self,
+                 workdir: str,
+                 dimension: int = 256,
+                 embed_batch_size: int = 64,
+                 embed_latency: float = 0.0,
+                 num_queries: int = 200,
+                 num_errors: int = 50,
+                 k: int = 10,
+                 max_tokens: int = 3000,
+                 seed: int = 0):
+        self.workdir = Path(workdir)
+        self.dimension = dimension
+        self.embed_batch_size = embed_batch_size
+        self.embed_latency = embed_latency
+        self.num_queries = num_queries
+        self.num_errors = num_errors
+        self.k = k
+        self.max_tokens = max_tokens
+        self.seed = seed
+
+    def run(self, sizes: Optional[List[int]] = None) -> Dict:
+        """Benchmark each codebase size (in files) and return the full report
+
+        Import times and cold start to first retrieve (on the smallest
+        codebase's saved index) are reported under 'startup'.
+        """
+        sizes = sizes or [1000]
+        runs = [self.run_size(num_files) for num_files in sizes]
+        smallest = min(sizes)
+        startup = StartupBenchmark().run(str(self.workdir / f"codebase_{smallest}"),
+                                         str(self.workdir / f"index_{smallest}" / 'vector_store.index'),
+                                         self.dimension)
+        return {
+            'environment': self.environment(),
+            'parameters': {
+                'dimension': self.dimension,
+                'embed_batch_size': self.embed_batch_size, 'embed_latency': self.embed_latency,
+                'num_queries': self.num_queries, 'num_errors': self.num_errors,
+                'k': self.k, 'max_tokens': self.max_tokens, 'seed': self.seed,
+            },
+            'runs': runs,
+            'startup': startup,
+        }
+
+    def run_size(self, num_files: int) -> Dict:
+        codebase = generate_codebase(self.workdir / f"codebase_{num_files}", num_files, self.seed)
+        index_dir = self.workdir / f"index_{num_files}"
+        if index_dir.exists():
+            shutil.rmtree(index_dir)
+        index_dir.mkdir(parents=True)
+
+        engine = MemoryEngine(
+            str(codebase),
+            vector_store_path=str(index_dir / 'vector_store.index'),
+            embedding_generator=FakeEmbeddingGenerator(self.dimension, latency=self.embed_latency),
+            metric='cosine',
+            # Every query and error is timed cold
+            query_cache_size=0,
+            context_cache_size=0
+        )
+        rng = np.random.default_rng(self.seed)
+        stages: Dict[str, Dict] = {}
+        state: Dict = {}
+
+        def walk():
+            state['files'] = list(engine._iter_source_files(list(LANGUAGE_EXTENSIONS.values())))
+            return len(state['files']), []
+
+        def parse():
+            chunks, latencies = [], []
+            for file_path in state['files']:
+                start = time.perf_counter()
+                chunks.extend(engine.parser.parse_file(file_path))
+                latencies.append(time.perf_counter() - start)
+            state['chunks'] = chunks
+            return len(state['files']), latencies
+
+        def embed():
+            latencies = []
+            for batch in self._batches(state['chunks']):
+                start = time.perf_counter()
+                embeddings = engine.embedding_generator.generate_embeddings_batch([chunk.content for chunk in batch])
+                for chunk, embedding in zip(batch, embeddings):
+                    chunk.embedding = embedding
+                latencies.append(time.perf_counter() - start)
+            return len(state['chunks']), latencies
+
+        def add():
+            latencies = []
+            for batch in self._batches(state['chunks']):
+                start = time.perf_counter()
+                engine.vector_store.add_chunks(batch)
+                latencies.append(time.perf_counter() - start)
+            return len(state['chunks']), latencies
+
+        def save():
+            engine.vector_store.save()
+            return 1, []
+
+        def load():
+            store = SimpleVectorStore(dimension=self.dimension, index_path=engine.vector_store.index_path)
+            if not store.load():
+                raise RuntimeError("Saved vector store could not be loaded")
+            return store.ntotal, []
+
+        def search():
+            named = [chunk for chunk in state['chunks'] if chunk.name]
+            sample = rng.choice(len(named), size=min(self.num_queries, len(named)), replace=False)
+            latencies = []
+            for i in sample.tolist():
+                start = time.perf_counter()
+                engine.retrieve(f"where is {named[i].name} implemented", k=self.k, min_similarity=-1.0)
+                latencies.append(time.perf_counter() - start)
+            return len(latencies), latencies
+
+        def compress():
+            errors = self._errors(state['chunks'], rng)
+            retrieved = engine.retrieve_many([engine._error_query(error) for error in errors],
+                                             k=self.k, min_similarity=-1.0)
+            latencies = []
+            for error, chunks in zip(errors, retrieved):
+                start = time.perf_counter()
+                engine._compress_error_context(error, chunks, self.max_tokens)
+                latencies.append(time.perf_counter() - start)
+            return len(latencies), latencies
+
+        for name, work in zip(STAGES, (walk, parse, embed, add, save, load, search, compress)):
+            stages[name] = self._measure(work)
+
+        return {
+            'files': len(state['files']),
+            'chunks': len(state['chunks']),
+            'total_seconds': sum(stage['seconds'] for stage in stages.values()),
+            'stages': stages,
+        }
+
+    def _batches(self, chunks: List) -> List[List]:
+        return [chunks[start:start + self.embed_batch_size] for start in range(0, len(chunks), self.embed_batch_size)]
+
+    def _errors(self, chunks: List, rng: np.random.Generator) -> List[Dict]:
+        """Errors raised inside randomly chosen definitions"""
+        named = [chunk for chunk in chunks if chunk.name and chunk.end_line > chunk.start_line]
+        sample = rng.choice(len(named), size=min(self.num_errors, len(named)), replace=False)
+        return [
+            {
+                'type': 'ValueError',
+                'message': f"invalid value in {named[i].name}",
+                'file': named[i].file_path,
+                'line': named[i].start_line + 1,
+                'function': named[i].name,
+            }
+            for i in sample.tolist()
+        ]
+
+    @staticmethod
+    def _measure(work: Callable[[], Tuple[int, List[float]]]) -> Dict:
+        """Run one stage, returning its totals, latency percentiles and memory"""
+        with _PeakMemory() as memory:
+            start = time.perf_counter()
+            count, latencies = work()
+            seconds = time.perf_counter() - start
+
+        row = {
+            'seconds': seconds,
+            'items': count,
+            'items_per_second': count / seconds if seconds > 0 else 0.0,
+            'peak_rss_mb': memory.peak / 2 ** 20,
+            'rss_growth_mb': (memory.peak - memory.start) / 2 ** 20,
+        }
+        if latencies:
+            p50, p95, p99 = np.percentile(np.asarray(latencies) * 1000, [50, 95, 99]).tolist()
+            row.update({'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p99})
+        return row
+
+    @staticmethod
+    def environment() -> Dict:
+        """Where and on which commit the benchmark ran"""
+        try:
+            commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                    cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            # "bytes" when tiktoken's encoding could not be loaded; chunk and
+            # batch sizes then differ from runs that used it
+            'tokenizer': get_encoding().name,
+        }
+
+    @staticmethod
+    def format_report(report: Dict, baseline: Optional[Dict] = None) -> str:
+        """Render the report as fixed-width tables, with the time change versus a baseline report"""
+        previous = {run['files']: run for run in (baseline or {}).get('runs', [])}
+        lines = []
+        for run in report['runs']:
+            lines.append(f"{run['files']} files, {run['chunks']} chunks, {run['total_seconds']:.2f}s")
+            lines.append(f"{'stage':<10} {'seconds':>9} {'items/s':>10} {'p50 ms':>8} {'p95 ms':>8} "
+                         f"{'p99 ms':>8} {'peak MB':>8} {'vs base':>8}")
+            for name, stage in run['stages'].items():
+                change = ''
+                before = previous.get(run['files'], {}).get('stages', {}).get(name)
+                if before and before['seconds'] > 0:
+                    change = f"{(stage['seconds'] / before['seconds'] - 1) * 100:+.0f}%"
+                percentiles = " ".join(
+                    f"{stage[key]:>8.2f}" if key in stage else f"{'-':>8}" for key in ('p50_ms', 'p95_ms', 'p99_ms')
+                )
+                lines.append(
+                    f"{name:<10} {stage['seconds']:>9.3f} {stage['items_per_second']:>10.1f} {percentiles} "
+                    f"{stage['peak_rss_mb']:>8.0f} {change:>8}"
+                )
+            lines.append("")
+        if 'startup' in report:
+            lines.append(StartupBenchmark.format_report(report['startup'], (baseline or {}).get('startup')))
+        return "\n".join(lines).rstrip()
@@ -0,0 +1,130 @@
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.core.vector_store import VECTORS_DIR, SimpleVectorStore, CodeChunk, saved_index_file
+
+# Storage modes compared by default; 'rerank' re-scores that many candidates
+# against the float32 side file
+DEFAULT_CONFIGS = [
+    {'index_type': 'flat', 'quantization': 'none'},
+    {'index_type': 'flat', 'quantization': 'sqfp16'},
+    {'index_type': 'flat', 'quantization': 'sq8'},
+    {'index_type': 'flat', 'quantization': 'sq8', 'rerank': 50},
+    {'index_type': 'hnsw', 'quantization': 'none'},
+    {'index_type': 'hnsw', 'quantization': 'sq8'},
+    {'index_type': 'hnsw', 'quantization': 'sq8', 'rerank': 50},
+    {'index_type': 'ivfpq', 'quantization': 'none'},
+    {'index_type': 'ivfpq', 'quantization': 'none', 'rerank': 50},
+]
+
+
+def clustered_vectors(num_vectors: int, dimension: int = 256, clusters: int = 100, seed: int = 0) -> np.ndarray:
+    """Gaussian clusters around random centers, closer to real embeddings than uniform noise"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dimension))
+    assignment = rng.integers(0, clusters, num_vectors)
+    return (centers[assignment] + 0.5 * rng.standard_normal((num_vectors, dimension))).astype(np.float32)
+
+
+class QuantizationBenchmark:
+    """Compare vector storage modes of SimpleVectorStore on the same vectors
+
+    Each configuration is built, saved and searched through the store, so
+    re-ranking runs as it does in production. Rows report bytes per vector
+    of the saved index and of the float32 side file, recall@k against an
+    exact float32 search, and per-query latency. Queries are stored vectors
+    with a little noise added.
+    """
+
+    def __init__(self, k: int = 10, num_queries: int = 200, seed: int = 0):
+        self.k = k
+        self.num_queries = num_queries
+        self.seed = seed
+
+    def run(self, vectors: np.ndarray, metric: str = 'cosine', configs: Optional[List[Dict]] = None) -> List[Dict]:
+        """Return one report row per storage configuration"""
+        rng = np.random.default_rng(self.seed)
+        sample = rng.choice(len(vectors), size=min(self.num_queries, len(vectors)), replace=False)
+        queries = vectors[sample] + 0.1 * rng.standard_normal((len(sample), vectors.shape[1])).astype(np.float32)
+        k = min(self.k, len(vectors))
+
+        chunks = [
+            CodeChunk(content=f"def function_{i}():\n    pass\n", file_path=f"module_{i // 20}.py",
+                      start_line=1, end_line=2, chunk_type='function', language='python',
+                      embedding=vector, chunk_id=f"chunk_{i}")
+            for i, vector in enumerate(vectors)
+        ]
+        exact = SimpleVectorStore(dimension=vectors.shape[1], metric=metric)
+        exact.add_chunks(chunks)
+        _, truth = exact.search_batch(queries, k)
+        del exact
+
+        # Default IVF sizing for the store at hand (~4 * sqrt(n) lists)
+        nlist = max(1, min(int(4 * np.sqrt(len(vectors))), len(vectors) // 39 or 1))
+
+        workdir = Path(tempfile.mkdtemp(prefix='quantization_benchmark_'))
+        try:
+            report = []
+            for number, config in enumerate(configs or DEFAULT_CONFIGS):
+                index_path = workdir / str(number) / 'vector_store.index'
+                index_path.parent.mkdir()
+                store = SimpleVectorStore(dimension=vectors.shape[1], index_path=str(index_path), metric=metric,
+                                          nlist=nlist, **config)
+
+                build_start = time.perf_counter()
+                store.add_chunks(chunks)
+                store.save()
+                build_seconds = time.perf_counter() - build_start
+
+                row = self._measure(store, queries, truth, k)
+                side_file = store.saved_dir / VECTORS_DIR
+                side_bytes = sum(path.stat().st_size for path in side_file.iterdir()) if side_file.exists() else 0
+                row.update({
+                    'index_type': config['index_type'],
+                    'quantization': config.get('quantization', 'none'),
+                    'rerank': config.get('rerank', 0),
+                    'bytes_per_vector': saved_index_file(str(index_path)).stat().st_size / len(vectors),
+                    'side_bytes_per_vector': side_bytes / len(vectors),
+                    'build_seconds': build_seconds,
+                })
+                report.append(row)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        return report
+
+    def _measure(self, store: SimpleVectorStore, queries: np.ndarray, truth: np.ndarray, k: int) -> Dict:
+        """Per-query latency and recall@k of one configured store"""
+        latencies = []
+        hits = 0
+        for query, expected in zip(queries, truth):
+            start = time.perf_counter()
+            _, found = store.search_batch(query[np.newaxis, :], k)
+            latencies.append(time.perf_counter() - start)
+            hits += len(np.intersect1d(found[0], expected))
+
+        latencies_ms = np.array(latencies) * 1000
+        return {
+            f'recall@{k}': hits / (len(queries) * k),
+            'p50_ms': float(np.percentile(latencies_ms, 50)),
+            'p95_ms': float(np.percentile(latencies_ms, 95)),
+            'p99_ms': float(np.percentile(latencies_ms, 99)),
+        }
+
+    @staticmethod
+    def format_report(report: List[Dict]) -> str:
+        """Render report rows as a fixed-width text table"""
+        lines = [f"{'index':<8} {'storage':<8} {'rerank':>6} {'B/vec':>8} {'side B':>8} "
+                 f"{'recall':>8} {'p50 ms':>8} {'p95 ms':>8} {'build s':>8}"]
+        for row in report:
+            recall = next(value for key, value in row.items() if key.startswith('recall@'))
+            lines.append(
+                f"{row['index_type']:<8} {row['quantization']:<8} {row['rerank']:>6} "
+                f"{row['bytes_per_vector']:>8.0f} {row['side_bytes_per_vector']:>8.0f} {recall:>8.3f} "
+                f"{row['p50_ms']:>8.3f} {row['p95_ms']:>8.3f} {row['build_seconds']:>8.2f}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,99 @@
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from src.core.segmented_store import SegmentedVectorStore
+from src.core.vector_store import SimpleVectorStore, CodeChunk
+
+
+def _file_chunks(rng: np.random.Generator, file_number: int, dimension: int, version: int = 0,
+                 chunks_per_file: int = 10) -> List[CodeChunk]:
+    return [
+        CodeChunk(content=f"def function_{i}():\n    return {version}\n", file_path=f"module_{file_number}.py",
+                  start_line=i * 3 + 1, end_line=i * 3 + 2, chunk_type='function', language='python',
+                  embedding=rng.standard_normal(dimension).astype(np.float32),
+                  chunk_id=f"module_{file_number}:{i}")
+        for i in range(chunks_per_file)
+    ]
+
+
+class SegmentBenchmark:
+    """Cost of committing small edits to a large store, whole-file vs segmented
+
+    Both stores are built from the same `num_files` files and saved once;
+    then `updates` single-file edits are each followed by save(), as
+    MemoryEngine.update_chunk does. Rows report the initial save, the
+    median and worst save after an edit, and search latency after the
+    edits, when the segmented store searches several segments.
+    """
+
+    def __init__(self, num_files: int = 10000, dimension: int = 256, updates: int = 20,
+                 num_queries: int = 100, k: int = 10, seed: int = 0):
+        self.num_files = num_files
+        self.dimension = dimension
+        self.updates = updates
+        self.num_queries = num_queries
+        self.k = k
+        self.seed = seed
+
+    def run(self) -> List[Dict]:
+        workdir = Path(tempfile.mkdtemp(prefix='segment_benchmark_'))
+        try:
+            return [self._measure(name, store_class, workdir / name / 'vector_store.index')
+                    for name, store_class in (('whole-file', SimpleVectorStore),
+                                              ('segmented', SegmentedVectorStore))]
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def _measure(self, name: str, store_class, index_path: Path) -> Dict:
+        index_path.parent.mkdir(parents=True)
+        rng = np.random.default_rng(self.seed)
+        store = store_class(dimension=self.dimension, index_path=str(index_path), metric='cosine')
+        for start in range(0, self.num_files, 1000):
+            store.add_chunks([chunk for file_number in range(start, min(start + 1000, self.num_files))
+                              for chunk in _file_chunks(rng, file_number, self.dimension)])
+        start_time = time.perf_counter()
+        store.save()
+        initial_save = time.perf_counter() - start_time
+
+        saves = []
+        for update in range(self.updates):
+            file_number = int(rng.integers(self.num_files))
+            store.upsert_file(f"module_{file_number}.py",
+                              _file_chunks(rng, file_number, self.dimension, version=update + 1))
+            start_time = time.perf_counter()
+            store.save()
+            saves.append(time.perf_counter() - start_time)
+
+        latencies = []
+        for query in rng.standard_normal((self.num_queries, self.dimension)).astype(np.float32):
+            start_time = time.perf_counter()
+            store.search_batch(query[np.newaxis, :], self.k)
+            latencies.append(time.perf_counter() - start_time)
+
+        return {
+            'store': name,
+            'vectors': store.ntotal,
+            'segments': len(getattr(store, 'segments', [None])),
+            'initial_save_seconds': initial_save,
+            'update_save_p50_seconds': float(np.percentile(saves, 50)),
+            'update_save_max_seconds': float(np.max(saves)),
+            'search_p50_ms': float(np.percentile(latencies, 50) * 1000),
+        }
+
+    @staticmethod
+    def format_report(rows: List[Dict]) -> str:
+        """Render benchmark rows as a fixed-width text table"""
+        lines = [f"{'store':<12} {'vectors':>9} {'segments':>8} {'save s':>8} "
+                 f"{'edit p50 ms':>12} {'edit max ms':>12} {'search ms':>10}"]
+        for row in rows:
+            lines.append(
+                f"{row['store']:<12} {row['vectors']:>9} {row['segments']:>8} {row['initial_save_seconds']:>8.2f} "
+                f"{row['update_save_p50_seconds'] * 1000:>12.1f} {row['update_save_max_seconds'] * 1000:>12.1f} "
+                f"{row['search_p50_ms']:>10.3f}"
+            )
+        return "\n".join(lines)
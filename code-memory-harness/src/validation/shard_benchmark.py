@@ -0,0 +1,95 @@
+import os
+import time
+from typing import Dict, Optional, Sequence
+
+import faiss
+import numpy as np
+
+from src.core.sharded_store import ShardedVectorStore
+from src.core.vector_store import CodeChunk
+
+
+class ShardBenchmark:
+    """Search latency of ShardedVectorStore as shard and thread counts grow
+
+    One store per shard count holds the same random vectors; each is
+    searched with 1 up to the machine's core count of search threads.
+    FAISS's own OpenMP threads are pinned to 1 while measuring, so the
+    fan-out threads are the only parallelism. Rows report single-query
+    p50/p95 latency and the throughput of one batched search.
+    """
+
+    def __init__(self,
+                 num_vectors: int = 200_000,
+                 dimension: int = 256,
+                 shard_counts: Sequence[int] = (1, 2, 4, 8),
+                 worker_counts: Optional[Sequence[int]] = None,
+                 index_type: str = 'flat',
+                 num_queries: int = 200,
+                 k: int = 10,
+                 seed: int = 0):
+        self.num_vectors = num_vectors
+        self.dimension = dimension
+        self.shard_counts = shard_counts
+        cores = os.cpu_count() or 1
+        self.worker_counts = worker_counts or sorted({1, 2, 4, 8, cores} & set(range(1, cores + 1)))
+        self.index_type = index_type
+        self.num_queries = num_queries
+        self.k = k
+        self.seed = seed
+
+    def run(self) -> Dict:
+        rng = np.random.default_rng(self.seed)
+        vectors = rng.standard_normal((self.num_vectors, self.dimension)).astype(np.float32)
+        queries = rng.standard_normal((self.num_queries, self.dimension)).astype(np.float32)
+        chunks = [
+            CodeChunk(content=f"def function_{i}():\n    pass\n", file_path=f"module_{i // 10}.py",
+                      start_line=(i % 10) * 3 + 1, end_line=(i % 10) * 3 + 2, chunk_type='function',
+                      language='python', embedding=vector, chunk_id=f"chunk_{i}")
+            for i, vector in enumerate(vectors)
+        ]
+
+        omp_threads = faiss.omp_get_max_threads()
+        faiss.omp_set_num_threads(1)
+        rows = []
+        try:
+            for num_shards in self.shard_counts:
+                store = ShardedVectorStore(dimension=self.dimension, num_shards=num_shards,
+                                           index_type=self.index_type, metric='cosine')
+                store.add_chunks(chunks)
+                for workers in self.worker_counts:
+                    store.close()
+                    store.search_workers = min(workers, num_shards)
+                    rows.append({'shards': num_shards, 'workers': workers, **self._measure(store, queries)})
+                store.close()
+        finally:
+            faiss.omp_set_num_threads(omp_threads)
+        return {'cpu_count': os.cpu_count(), 'num_vectors': self.num_vectors, 'rows': rows}
+
+    def _measure(self, store: ShardedVectorStore, queries: np.ndarray) -> Dict:
+        store.search_batch(queries[:1], self.k)
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            store.search_batch(query[np.newaxis, :], self.k)
+            latencies.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        store.search_batch(queries, self.k)
+        batch_seconds = time.perf_counter() - start
+
+        latencies_ms = np.array(latencies) * 1000
+        return {
+            'p50_ms': float(np.percentile(latencies_ms, 50)),
+            'p95_ms': float(np.percentile(latencies_ms, 95)),
+            'batch_queries_per_second': len(queries) / batch_seconds if batch_seconds > 0 else 0.0,
+        }
+
+    @staticmethod
+    def format_report(report: Dict) -> str:
+        """Render benchmark rows as a fixed-width text table"""
+        lines = [f"sharded search ({report['num_vectors']} vectors, {report['cpu_count']} cores)",
+                 f"{'shards':>6} {'threads':>7} {'p50 ms':>8} {'p95 ms':>8} {'batch q/s':>10}"]
+        for row in report['rows']:
+            lines.append(f"{row['shards']:>6} {row['workers']:>7} {row['p50_ms']:>8.3f} "
+                         f"{row['p95_ms']:>8.3f} {row['batch_queries_per_second']:>10.0f}")
+        return "\n".join(lines)
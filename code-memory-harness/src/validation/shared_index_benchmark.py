@@ -0,0 +1,167 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+
+import numpy as np
+
+from src.core.vector_store import SimpleVectorStore, CodeChunk, saved_index_file
+
+# Repository root, put on PYTHONPATH of the worker processes
+_ROOT = Path(__file__).resolve().parents[2]
+
+_SMAPS_FIELDS = {'Rss': 'rss', 'Pss': 'pss', 'Shared_Clean': 'shared', 'Shared_Dirty': 'shared',
+                 'Private_Clean': 'private', 'Private_Dirty': 'private'}
+
+# One serving worker: load the index, answer queries, then hold still until
+# every worker is loaded so shared pages are counted while all map them
+_WORKER = """
+import json, sys, time
+import faiss
+import numpy as np
+from src.core.vector_store import SimpleVectorStore
+from src.validation.shared_index_benchmark import memory_usage
+
+index_path, dimension, mmap, queries, k = sys.argv[1], int(sys.argv[2]), sys.argv[3] == '1', int(sys.argv[4]), int(sys.argv[5])
+before = memory_usage()
+start = time.perf_counter()
+store = SimpleVectorStore(dimension=dimension, index_path=index_path, mmap=mmap)
+store.load()
+load_seconds = time.perf_counter() - start
+after_load = memory_usage()
+
+rng = np.random.default_rng(int(sys.argv[6]))
+_, ids = store.search_batch(rng.standard_normal((queries, dimension)).astype(np.float32), k)
+for idx in ids[:, 0].tolist():
+    store.get_chunk(idx)
+
+print('ready', flush=True)
+sys.stdin.readline()
+print(json.dumps({'load_seconds': load_seconds, 'before': before, 'after_load': after_load,
+                  'after_search': memory_usage()}), flush=True)
+"""
+
+
+def memory_usage() -> Dict[str, int]:
+    """Bytes resident (rss), proportional (pss), shared and private for this process
+
+    Shared pages, such as a memory-mapped index other processes also map,
+    count fully in rss but are split between the processes in pss. Only
+    rss is available where /proc/self/smaps_rollup is not.
+    """
+    usage = {'rss': 0, 'pss': 0, 'shared': 0, 'private': 0}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            for line in f:
+                field, _, value = line.partition(':')
+                if field in _SMAPS_FIELDS:
+                    usage[_SMAPS_FIELDS[field]] += int(value.split()[0]) * 1024
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        usage['rss'] = peak if sys.platform == 'darwin' else peak * 1024
+    return usage
+
+
+def build_store(index_path: str, num_vectors: int, dimension: int = 256, index_type: str = 'flat', seed: int = 0):
+    """Save a store of random unit vectors with small chunks, reusing a matching one"""
+    marker = Path(f"{index_path}.synthetic.json")
+    spec = {'num_vectors': num_vectors, 'dimension': dimension, 'index_type': index_type, 'seed': seed}
+    if marker.exists() and json.loads(marker.read_text()) == spec and saved_index_file(index_path):
+        return
+    Path(index_path).parent.mkdir(parents=True, exist_ok=True)
+
+    store = SimpleVectorStore(dimension=dimension, index_path=index_path, index_type=index_type, metric='cosine')
+    rng = np.random.default_rng(seed)
+    for start in range(0, num_vectors, 10000):
+        count = min(10000, num_vectors - start)
+        vectors = rng.standard_normal((count, dimension)).astype(np.float32)
+        store.add_chunks([
+            CodeChunk(content=f"def function_{i}():\n    return {i}\n", file_path=f"module_{i // 20}.py",
+                      start_line=(i % 20) * 3 + 1, end_line=(i % 20) * 3 + 2, chunk_type='function',
+                      language='python', embedding=vector, chunk_id=f"chunk_{i}", name=f"function_{i}")
+            for i, vector in zip(range(start, start + count), vectors)
+        ])
+    store.save()
+    marker.write_text(json.dumps(spec))
+
+
+class SharedIndexBenchmark:
+    """Per-worker load time and memory of N processes serving one saved index
+
+    Each mode starts `workers` fresh interpreters that load the index,
+    with a normal read ('read') or memory-mapped read-only ('mmap'), and
+    answer `queries` queries. Memory is sampled once every worker has
+    searched, while all of them are alive: a normal read gives each
+    worker a private copy, while mapped pages stay in the page cache and
+    show up as shared rss and a pss that shrinks as workers are added.
+    """
+
+    def __init__(self, workers: int = 4, queries: int = 200, k: int = 10, seed: int = 0):
+        self.workers = workers
+        self.queries = queries
+        self.k = k
+        self.seed = seed
+
+    def _start_worker(self, index_path: str, dimension: int, mmap: bool, worker: int) -> subprocess.Popen:
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(_ROOT), env.get('PYTHONPATH')]))
+        args = [str(index_path), str(dimension), '1' if mmap else '0', str(self.queries), str(self.k),
+                str(self.seed + worker)]
+        return subprocess.Popen([sys.executable, '-c', _WORKER] + args, stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, cwd=_ROOT, env=env)
+
+    def run_mode(self, index_path: str, dimension: int, mmap: bool) -> Dict:
+        processes = [self._start_worker(index_path, dimension, mmap, worker) for worker in range(self.workers)]
+        try:
+            for process in processes:
+                if process.stdout.readline().strip() != 'ready':
+                    raise RuntimeError(f"benchmark worker exited with {process.wait()}")
+            for process in processes:
+                process.stdin.write('\n')
+                process.stdin.flush()
+            samples = [json.loads(process.stdout.readline()) for process in processes]
+        finally:
+            # A closed stdin also releases workers still waiting after a failure
+            for process in processes:
+                process.stdin.close()
+            for process in processes:
+                process.wait()
+
+        def mean(stage: str, field: str) -> float:
+            return float(np.mean([sample[stage][field] - sample['before'][field] for sample in samples]))
+
+        return {
+            'mode': 'mmap' if mmap else 'read',
+            'workers': self.workers,
+            'load_seconds': float(np.mean([sample['load_seconds'] for sample in samples])),
+            # Growth over each worker's own interpreter and imports
+            'rss_after_load_bytes': mean('after_load', 'rss'),
+            'rss_after_search_bytes': mean('after_search', 'rss'),
+            'pss_bytes': mean('after_search', 'pss'),
+            'private_bytes': mean('after_search', 'private'),
+            'total_private_bytes': mean('after_search', 'private') * self.workers,
+        }
+
+    def run(self, index_path: str, dimension: int = 256) -> Dict:
+        start = time.perf_counter()
+        index_bytes = saved_index_file(index_path).stat().st_size
+        rows = [self.run_mode(index_path, dimension, mmap) for mmap in (False, True)]
+        return {'index_bytes': index_bytes, 'rows': rows, 'seconds': time.perf_counter() - start}
+
+    @staticmethod
+    def format_report(report: Dict) -> str:
+        """Render per-worker load time and memory growth, in MB, per load mode"""
+        mb = 1 / (1024 * 1024)
+        lines = [f"shared index ({report['index_bytes'] * mb:.0f} MB, {report['rows'][0]['workers']} workers)",
+                 f"{'mode':<6} {'load ms':>9} {'rss load':>9} {'rss srch':>9} {'pss':>9} {'private':>9} {'all priv':>9}"]
+        for row in report['rows']:
+            lines.append(
+                f"{row['mode']:<6} {row['load_seconds'] * 1000:>9.1f} {row['rss_after_load_bytes'] * mb:>9.1f} "
+                f"{row['rss_after_search_bytes'] * mb:>9.1f} {row['pss_bytes'] * mb:>9.1f} "
+                f"{row['private_bytes'] * mb:>9.1f} {row['total_private_bytes'] * mb:>9.1f}"
+            )
+        return "\n".join(lines)
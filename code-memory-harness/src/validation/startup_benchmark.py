@@ -0,0 +1,115 @@
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Repository root, put on PYTHONPATH of the measured interpreters
+_ROOT = Path(__file__).resolve().parents[2]
+
+# Entry points whose import cost is tracked
+DEFAULT_MODULES = ('src.core.memory_engine', 'src.core.async_memory_engine', 'src.indexing.embedding_generator')
+
+_IMPORTTIME_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)')
+
+# Run in a fresh interpreter: import, load the saved index and answer one query
+_COLD_RETRIEVE = """
+import sys, time
+start = time.perf_counter()
+from src.core.memory_engine import MemoryEngine
+from src.testing.fake_embeddings import FakeEmbeddingGenerator
+engine = MemoryEngine(sys.argv[1], vector_store_path=sys.argv[2],
+                      embedding_generator=FakeEmbeddingGenerator(int(sys.argv[3])))
+engine.retrieve("where is the configuration loaded", min_similarity=-1.0)
+print(time.perf_counter() - start)
+"""
+
+
+class StartupBenchmark:
+    """Track import cost and cold start to first retrieve, each in a fresh interpreter
+
+    Import times come from `python -X importtime` (cumulative microseconds
+    of the module, best of `repeats`), along with the heaviest imports it
+    pulls in, so a dependency that starts loading eagerly again shows up
+    by name when reports are compared across commits.
+    """
+
+    def __init__(self, modules=DEFAULT_MODULES, repeats: int = 3, heaviest: int = 10):
+        self.modules = tuple(modules)
+        self.repeats = repeats
+        self.heaviest = heaviest
+
+    def _run(self, args: List[str]) -> subprocess.CompletedProcess:
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(_ROOT), env.get('PYTHONPATH')]))
+        return subprocess.run([sys.executable] + args, capture_output=True, text=True, cwd=_ROOT, env=env, check=True)
+
+    def _import_profile(self, statement: str) -> Dict[str, int]:
+        """Cumulative import microseconds per module for one statement"""
+        stderr = self._run(['-X', 'importtime', '-c', statement]).stderr
+        return {match.group(4): int(match.group(2)) for match in _IMPORTTIME_LINE.finditer(stderr)}
+
+    def import_times(self) -> Dict[str, Dict]:
+        """Seconds to import each module, and its heaviest dependencies, in a fresh interpreter"""
+        # Modules the interpreter loads at startup (site, .pth hooks) are not ours
+        startup = set(self._import_profile('pass'))
+        results = {}
+        for module in self.modules:
+            best: Optional[Dict[str, int]] = None
+            for _ in range(self.repeats):
+                cumulative = self._import_profile(f'import {module}')
+                if module in cumulative and (best is None or cumulative[module] < best[module]):
+                    best = cumulative
+            if best is None:
+                continue
+            dependencies = sorted(
+                ((name, us) for name, us in best.items()
+                 if name != module and name not in startup and not name.startswith('src.')),
+                key=lambda item: item[1], reverse=True
+            )
+            # Nested modules repeat their parent's cost; keep top-level packages
+            top_level = {}
+            for name, us in dependencies:
+                top_level.setdefault(name.split('.')[0], us)
+            results[module] = {
+                'seconds': best[module] / 1e6,
+                'heaviest': {name: us / 1e6 for name, us in list(top_level.items())[:self.heaviest]},
+            }
+        return results
+
+    def cold_retrieve(self, codebase: str, index_path: str, dimension: int) -> float:
+        """Best seconds from interpreter start to the first answered query on a saved index"""
+        best = float('inf')
+        for _ in range(self.repeats):
+            output = self._run(['-c', _COLD_RETRIEVE, str(codebase), str(index_path), str(dimension)]).stdout
+            best = min(best, float(output.strip().splitlines()[-1]))
+        return best
+
+    def run(self, codebase: Optional[str] = None, index_path: Optional[str] = None, dimension: int = 256) -> Dict:
+        start = time.perf_counter()
+        report = {'imports': self.import_times()}
+        if codebase and index_path:
+            report['cold_retrieve_seconds'] = self.cold_retrieve(codebase, index_path, dimension)
+        report['seconds'] = time.perf_counter() - start
+        return report
+
+    @staticmethod
+    def format_report(report: Dict, baseline: Optional[Dict] = None) -> str:
+        """Render import and cold start times, with changes against a baseline report"""
+        def change(now: float, before: Optional[float]) -> str:
+            return f"{(now / before - 1) * 100:+.0f}%" if before else ''
+
+        baseline = baseline or {}
+        lines = [f"{'startup':<40} {'ms':>9} {'vs base':>8}"]
+        for module, row in report['imports'].items():
+            before = baseline.get('imports', {}).get(module, {}).get('seconds')
+            lines.append(f"import {module:<33} {row['seconds'] * 1000:>9.1f} {change(row['seconds'], before):>8}")
+            heaviest = ", ".join(f"{name} {seconds * 1000:.0f}" for name, seconds in list(row['heaviest'].items())[:5])
+            lines.append(f"  heaviest: {heaviest}")
+        if 'cold_retrieve_seconds' in report:
+            seconds = report['cold_retrieve_seconds']
+            lines.append(f"{'cold start to first retrieve':<40} {seconds * 1000:>9.1f} "
+                         f"{change(seconds, baseline.get('cold_retrieve_seconds')):>8}")
+        return "\n".join(lines)